@@ -65,6 +65,17 @@ class UserUpdateForm(forms.ModelForm):
         for field in self.fields.values():
             field.widget.attrs.update({'class': 'form-control'})
 
+class ProfileUpdateForm(UserUpdateForm):
+    class Meta(UserUpdateForm.Meta):
+        fields = UserUpdateForm.Meta.fields + ['notification_digest']
+        labels = {
+            'notification_digest': 'Send registration notifications as a periodic summary',
+        }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['notification_digest'].widget.attrs.update({'class': 'form-check-input'})
+
 class PlayerProfileUpdateForm(forms.ModelForm):
     class Meta:
         model = TennisPlayer
@@ -1,7 +1,8 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from core.models import ProtectedFieldsMixin
 
-class User(AbstractUser):
+class User(ProtectedFieldsMixin, AbstractUser):
     USER_TYPES = (
         ('PLAYER', 'Tennis Player'),
         ('REFEREE', 'Referee'),
@@ -9,6 +10,14 @@ class User(AbstractUser):
     )
 
     user_type = models.CharField(max_length=10, choices=USER_TYPES, null=False, blank=False)
+    # Coalesce registration notifications into periodic summaries
+    notification_digest = models.BooleanField(default=False)
+    # Unread notifications, kept in step by the Notification model and
+    # queryset so the navbar badge needs no query of its own
+    unread_notifications = models.PositiveIntegerField(default=0, editable=False)
+
+    # The counter only moves through adjust_unread_counts()
+    protected_fields = ('unread_notifications',)
 
     def is_player(self):
         return self.user_type == 'PLAYER'
@@ -12,7 +12,7 @@ from .models import User, TennisPlayer, Referee
 from django.contrib.auth.views import PasswordChangeView
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views.generic import UpdateView, DetailView
-from .forms import UserUpdateForm, PlayerProfileUpdateForm, RefereeProfileUpdateForm, CustomPasswordChangeForm
+from .forms import UserUpdateForm, ProfileUpdateForm, PlayerProfileUpdateForm, RefereeProfileUpdateForm, CustomPasswordChangeForm
 from django.shortcuts import get_object_or_404, redirect
 from django.urls import reverse
 from django.views.generic import ListView
@@ -153,10 +153,7 @@ class ProfileView(LoginRequiredMixin, DetailView):
         user = self.request.user
 
         from apps.notifications.models import Notification
-        context['unread_notifications_count'] = Notification.objects.filter(
-            user=user,
-            is_read=False
-        ).count()
+        context['unread_notifications_count'] = user.unread_notifications
         
         context['action_required_count'] = Notification.objects.filter(
             user=user,
@@ -255,7 +252,7 @@ class PlayerProfileView(LoginRequiredMixin, OwnershipRequiredMixin, DetailView):
 
 class UserUpdateView(LoginRequiredMixin, UpdateView):
     model = User
-    form_class = UserUpdateForm
+    form_class = ProfileUpdateForm
     template_name = 'accounts/edit_profile.html'
     success_url = reverse_lazy('accounts:profile')
 
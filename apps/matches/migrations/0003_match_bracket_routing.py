@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('matches', '0002_match_players_nullable'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='match',
+            name='bracket',
+            field=models.CharField(choices=[('WINNERS', 'Winners Bracket'), ('LOSERS', 'Losers Bracket'), ('FINAL', 'Grand Final')], default='WINNERS', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='match',
+            name='loser_next_match',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='loser_feeders', to='matches.match'),
+        ),
+        migrations.AddField(
+            model_name='match',
+            name='loser_next_slot',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='match',
+            name='winner_next_match',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='winner_feeders', to='matches.match'),
+        ),
+        migrations.AddField(
+            model_name='match',
+            name='winner_next_slot',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:36
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_referee_certification_level_and_more'),
+        ('matches', '0003_match_bracket_routing'),
+        ('tournaments', '0006_tournament_type_double_elimination'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='match',
+            name='bracket_position',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='match',
+            index=models.Index(fields=['tournament', 'bracket', 'round_number', 'bracket_position'], name='matches_mat_tournam_10eec3_idx'),
+        ),
+    ]
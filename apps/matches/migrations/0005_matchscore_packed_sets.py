@@ -0,0 +1,59 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+def pack_existing_scores(apps, schema_editor):
+    # Historical models have no pack(), so the packing is repeated here
+    MatchScore = apps.get_model('matches', 'MatchScore')
+    batch = []
+    for score in MatchScore.objects.select_related('match').iterator(chunk_size=1000):
+        sets = []
+        for i in range(1, 6):
+            p1_score = getattr(score, f'player1_set{i}')
+            p2_score = getattr(score, f'player2_set{i}')
+            if p1_score is not None and p2_score is not None:
+                sets.append([p1_score, p2_score])
+        score.sets = sets
+        score.player1_sets_won = sum(1 for p1_score, p2_score in sets if p1_score > p2_score)
+        score.player2_sets_won = sum(1 for p1_score, p2_score in sets if p2_score > p1_score)
+        if score.player1_sets_won != score.player2_sets_won:
+            score.winner_side = 1 if score.player1_sets_won > score.player2_sets_won else 2
+        elif score.winner_id is not None:
+            score.winner_side = 1 if score.winner_id == score.match.player1_id else 2
+        batch.append(score)
+        if len(batch) >= 1000:
+            MatchScore.objects.bulk_update(batch, ['sets', 'player1_sets_won', 'player2_sets_won', 'winner_side'])
+            batch = []
+    MatchScore.objects.bulk_update(batch, ['sets', 'player1_sets_won', 'player2_sets_won', 'winner_side'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('matches', '0004_match_bracket_position'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='matchscore',
+            name='player1_sets_won',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='matchscore',
+            name='player2_sets_won',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='matchscore',
+            name='sets',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='matchscore',
+            name='winner_side',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(pack_existing_scores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:41
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_user_unread_notifications'),
+        ('matches', '0007_match_version'),
+        ('tournaments', '0009_backfill_standings'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='match',
+            name='matches_mat_tournam_10eec3_idx',
+        ),
+        migrations.AddIndex(
+            model_name='match',
+            index=models.Index(fields=['tournament', '-bracket', 'round_number', 'bracket_position', 'id'], name='match_bracket_order'),
+        ),
+    ]
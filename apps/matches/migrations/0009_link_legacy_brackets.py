@@ -0,0 +1,71 @@
+from django.db import migrations
+
+
+def link_legacy_brackets(apps, schema_editor):
+    # Elimination matches written before brackets were materialized have no
+    # bracket position or winner route, and winners used to be moved on by
+    # looking up the match's place in its round by id. Record that same
+    # layout as links: match X of a round feeds slot X % 2 + 1 of match
+    # X // 2 in the next one. Later rounds were only created once both
+    # feeding matches had a winner, so the missing ones are added empty.
+    Match = apps.get_model('matches', 'Match')
+    MatchScore = apps.get_model('matches', 'MatchScore')
+
+    legacy = Match.objects.filter(
+        tournament__tournament_type='SINGLE_ELIMINATION',
+        bracket_position__isnull=True
+    )
+    for tournament_id in legacy.values_list('tournament_id', flat=True).distinct().order_by():
+        matches = list(Match.objects.filter(tournament_id=tournament_id).order_by('round_number', 'id'))
+        rounds = {}
+        for match in matches:
+            rounds.setdefault(match.round_number, []).append(match)
+
+        round_number = min(rounds)
+        while len(rounds[round_number]) > 1:
+            current = rounds[round_number]
+            following = rounds.setdefault(round_number + 1, [])
+            while len(following) < (len(current) + 1) // 2:
+                following.append(Match.objects.create(
+                    tournament_id=tournament_id,
+                    round_number=round_number + 1,
+                    status='SCHEDULED'
+                ))
+            for position, match in enumerate(current):
+                match.bracket_position = position
+                match.winner_next_match = following[position // 2]
+                match.winner_next_slot = position % 2 + 1
+            round_number += 1
+        for position, match in enumerate(rounds[round_number]):
+            match.bracket_position = position
+
+        # Winners decided since the old lookup went away are still waiting
+        winners = dict(MatchScore.objects.filter(
+            match__tournament_id=tournament_id,
+            winner__isnull=False
+        ).values_list('match_id', 'winner_id'))
+        for match in matches:
+            target = match.winner_next_match
+            if target is None or match.id not in winners:
+                continue
+            attname = f'player{match.winner_next_slot}_id'
+            if getattr(target, attname) is None:
+                setattr(target, attname, winners[match.id])
+
+        linked = [match for round_matches in rounds.values() for match in round_matches]
+        Match.objects.bulk_update(
+            linked,
+            ['bracket_position', 'winner_next_match', 'winner_next_slot', 'player1', 'player2']
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('matches', '0008_match_bracket_order_index'),
+        ('tournaments', '0009_backfill_standings'),
+    ]
+
+    operations = [
+        migrations.RunPython(link_legacy_brackets, migrations.RunPython.noop),
+    ]
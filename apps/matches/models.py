@@ -1,8 +1,12 @@
-from django.db import models
+from collections import namedtuple
+
+from django.db import models, transaction, IntegrityError
 from apps.accounts.models import User, Referee
-from apps.tournaments.models import Tournament
+from apps.tournaments.models import Tournament, Standing
+from .scoring import load_state, store_state, forget_state
+from core.models import ProtectedFieldsMixin
 
-class Match(models.Model):
+class Match(ProtectedFieldsMixin, models.Model):
     STATUS_CHOICES = [
         ('SCHEDULED', 'Scheduled'),
         ('IN_PROGRESS', 'In Progress'),
@@ -10,9 +14,17 @@ class Match(models.Model):
         ('CANCELED', 'Canceled')
     ]
     
+    BRACKET_CHOICES = [
+        ('WINNERS', 'Winners Bracket'),
+        ('LOSERS', 'Losers Bracket'),
+        ('FINAL', 'Grand Final'),
+    ]
+    
     tournament = models.ForeignKey(Tournament, on_delete=models.CASCADE, related_name='matches')
-    player1 = models.ForeignKey(User, on_delete=models.CASCADE, related_name='matches_as_player1')
-    player2 = models.ForeignKey(User, on_delete=models.CASCADE, related_name='matches_as_player2')
+    # Players are empty for bracket slots that are still waiting on an earlier
+    # round, and player2 is empty for a first-round bye
+    player1 = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='matches_as_player1')
+    player2 = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='matches_as_player2')
     referee = models.ForeignKey(Referee, on_delete=models.SET_NULL, null=True, blank=True, related_name='officiated_matches')
     
     round_number = models.PositiveIntegerField()
@@ -20,14 +32,39 @@ class Match(models.Model):
     scheduled_time = models.DateTimeField(null=True, blank=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='SCHEDULED')
     
+    # Bracket routing, fixed when the draw is generated: which match and
+    # slot (1 or 2) the winner and the loser of this match move on to
+    bracket = models.CharField(max_length=10, choices=BRACKET_CHOICES, default='WINNERS')
+    bracket_position = models.PositiveIntegerField(null=True, blank=True)
+    winner_next_match = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, related_name='winner_feeders')
+    winner_next_slot = models.PositiveSmallIntegerField(null=True, blank=True)
+    loser_next_match = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, related_name='loser_feeders')
+    loser_next_slot = models.PositiveSmallIntegerField(null=True, blank=True)
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    # Goes up by one on every score, status or player change, for snapshot ETags
+    version = models.PositiveIntegerField(default=0)
+    
+    # Only the locked scoring paths move the version
+    protected_fields = ('version',)
+    
+    # Bracket listing order, as covered by the match_bracket_order index
+    BRACKET_ORDER = ['-bracket', 'round_number', 'bracket_position', 'id']
+    
     def __str__(self):
-        return f"{self.player1.username} vs {self.player2.username} - Round {self.round_number}"
+        player1 = self.player1.username if self.player1 else "TBD"
+        player2 = self.player2.username if self.player2 else "TBD"
+        return f"{player1} vs {player2} - Round {self.round_number}"
     
     class Meta:
         verbose_name_plural = "Matches"
+        # Serves BRACKET_ORDER within a tournament: winners, losers, then the final
+        indexes = [
+            models.Index(fields=['tournament', '-bracket', 'round_number', 'bracket_position', 'id'],
+                         name='match_bracket_order'),
+        ]
     
     # Helper methods for score access
     def get_player1_set1(self):
@@ -85,6 +122,120 @@ class Match(models.Model):
             return self.score.winner
         return None
     
+    def record_score(self, score):
+        """Save a score, settle the match status and advance the winner
+
+        Meant to run inside the caller's transaction with this match row
+        locked, so the three writes land together or not at all.
+        """
+        score.match = self
+        score.winner = score.determine_winner()
+        score.save()
+        
+        # The row is locked, so the version can be bumped in memory
+        self.status = 'COMPLETED' if score.winner else 'IN_PROGRESS'
+        self.version += 1
+        self.save(update_fields=['status', 'updated_at', 'version'])
+        Tournament.bump_version(self.tournament_id)
+        
+        if score.winner:
+            self.advance(score.winner)
+            if self.tournament.tournament_type == 'ROUND_ROBIN':
+                self.update_standings(score)
+                Standing.rerank(self.tournament_id)
+        return score.winner
+    
+    def record_point(self, side, recorded_by=None):
+        """Append one point to the live score and return ``(state, winner)``
+
+        Like ``record_score`` this expects the match row to be locked by the
+        caller. The cached state is advanced by the single point; once the
+        state machine finishes the match, the ``MatchScore`` is built from
+        its sets and recorded the normal way. ``winner`` stays None until then.
+        """
+        state = load_state(self)
+        state.point_won(side)
+        try:
+            with transaction.atomic():
+                PointEvent.objects.create(match=self, sequence=state.sequence, winner_side=side, recorded_by=recorded_by)
+        except IntegrityError:
+            # The cached state was behind the log, rebuild it from the events
+            forget_state(self)
+            state = load_state(self)
+            state.point_won(side)
+            PointEvent.objects.create(match=self, sequence=state.sequence, winner_side=side, recorded_by=recorded_by)
+        transaction.on_commit(lambda: store_state(self, state))
+        
+        if not state.is_finished:
+            self.status = 'IN_PROGRESS'
+            self.version += 1
+            self.save(update_fields=['status', 'updated_at', 'version'])
+            # The tournament snapshot shows live scores too, so its ETag moves with them
+            Tournament.bump_version(self.tournament_id)
+            return state, None
+        
+        score = MatchScore.objects.filter(match=self).first() or MatchScore(match=self)
+        for i in range(1, 6):
+            games = state.sets[i - 1] if i <= len(state.sets) else (None, None)
+            setattr(score, f'player1_set{i}', games[0])
+            setattr(score, f'player2_set{i}', games[1])
+        return state, self.record_score(score)
+    
+    def update_standings(self, score):
+        """Fold a finished round-robin result into the players' table rows"""
+        player1_sets, player2_sets, player1_games, player2_games = score.get_totals()
+        if score.winner_id == self.player1_id:
+            Standing.apply_result(self.tournament_id, self.player1_id, self.player2_id,
+                                  player1_sets, player2_sets, player1_games, player2_games)
+        else:
+            Standing.apply_result(self.tournament_id, self.player2_id, self.player1_id,
+                                  player2_sets, player1_sets, player2_games, player1_games)
+    
+    def advance(self, winner):
+        """Move the winner and loser into the slots this match feeds
+
+        Costs one indexed UPDATE per link whatever the size of the draw.
+        Matches without links (round robin, Swiss, finals) are left alone.
+        """
+        winner_id = winner.pk
+        loser_id = self.player2_id if winner_id == self.player1_id else self.player1_id
+        
+        if self.winner_next_match_id:
+            Match.objects.filter(pk=self.winner_next_match_id).update(
+                version=models.F('version') + 1,
+                **{f'player{self.winner_next_slot}': winner_id}
+            )
+        if self.loser_next_match_id and loser_id:
+            Match.objects.filter(pk=self.loser_next_match_id).update(
+                version=models.F('version') + 1,
+                **{f'player{self.loser_next_slot}': loser_id}
+            )
+    
+    @classmethod
+    def advance_many(cls, results):
+        """Batch form of ``advance`` for ``(match, winner_id)`` pairs
+
+        The matches fed by the batch are locked and loaded in one query,
+        and all slots are written back with one ``bulk_update``.
+        """
+        assignments = {}
+        for match, winner_id in results:
+            loser_id = match.player2_id if winner_id == match.player1_id else match.player1_id
+            if match.winner_next_match_id:
+                assignments.setdefault(match.winner_next_match_id, {})[f'player{match.winner_next_slot}_id'] = winner_id
+            if match.loser_next_match_id and loser_id:
+                assignments.setdefault(match.loser_next_match_id, {})[f'player{match.loser_next_slot}_id'] = loser_id
+        
+        if not assignments:
+            return
+        
+        targets = cls.objects.select_for_update().in_bulk(list(assignments))
+        for target_id, slots in assignments.items():
+            for attname, player_id in slots.items():
+                setattr(targets[target_id], attname, player_id)
+            targets[target_id].version += 1
+        cls.objects.bulk_update(list(targets.values()), ['player1', 'player2', 'version'])
+    
     def is_completed(self):
         return self.status == 'COMPLETED'
     
@@ -97,6 +248,51 @@ class Match(models.Model):
     def is_canceled(self):
         return self.status == 'CANCELED'
 
+    def is_visible_to(self, user):
+        """Whether ``user`` may follow this match
+
+        Completed matches are open to everyone. Until then only the players,
+        the referee (or any referee while none is assigned) and the
+        tournament's organizer or a superuser admin may see them.
+        """
+        if self.status == 'COMPLETED':
+            return True
+        if not user.is_authenticated:
+            return False
+        if user.id in (self.player1_id, self.player2_id):
+            return True
+        # Referee rows are keyed by their user
+        if user.is_referee() and (self.referee_id is None or self.referee_id == user.id):
+            return True
+        return user.is_admin() and (user.is_superuser or user.id == self.tournament.organizer_id)
+
+    def is_bye(self):
+        """A walkover in any round: completed, with nobody in the second slot and a winner recorded
+
+        Uses the ``score_line`` attached by list views (see
+        ``MatchScore.lines_for``) when there is one, so a page of byes does
+        not load their scores one by one.
+        """
+        if self.player1_id is None or self.player2_id is not None or not self.is_completed():
+            return False
+        if hasattr(self, 'score_line'):
+            return self.score_line is not None and self.score_line.winner_side is not None
+        try:
+            return self.score.winner_id is not None
+        except MatchScore.DoesNotExist:
+            return False
+
+class ScoreLine(namedtuple('ScoreLine', ['sets', 'player1_sets_won', 'player2_sets_won', 'winner_side'])):
+    """Everything needed to show a result, read in one access
+
+    ``sets`` is a list of ``[player1 games, player2 games]`` pairs and
+    ``winner_side`` is 1 or 2, or None while the match is undecided.
+    """
+    __slots__ = ()
+    
+    def __str__(self):
+        return " ".join(f"{p1_score}-{p2_score}" for p1_score, p2_score in self.sets)
+
 class MatchScore(models.Model):
     match = models.OneToOneField(Match, on_delete=models.CASCADE, related_name='score')
     
@@ -118,42 +314,115 @@ class MatchScore(models.Model):
     
     winner = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='matches_won')
     
+    # Packed copy of the set columns, refreshed by pack() on every save
+    sets = models.JSONField(default=list, blank=True)
+    player1_sets_won = models.PositiveSmallIntegerField(default=0)
+    player2_sets_won = models.PositiveSmallIntegerField(default=0)
+    winner_side = models.PositiveSmallIntegerField(null=True, blank=True)
+    
+    # Everything pack() writes, for bulk_create/bulk_update callers
+    PACKED_FIELDS = ['sets', 'player1_sets_won', 'player2_sets_won', 'winner_side']
+    
     def __str__(self):
-        result = []
+        return str(self.line)
+    
+    def save(self, *args, **kwargs):
+        self.pack()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | set(self.PACKED_FIELDS)
+        super().save(*args, **kwargs)
+    
+    def pack(self):
+        """Fold the ten set columns into ``sets``, the set counts and the winner side
+
+        Called by save(); bulk_create and bulk_update skip save(), so code
+        using them has to call it first.
+        """
+        sets = []
         for i in range(1, 6):
             p1_score = getattr(self, f'player1_set{i}')
             p2_score = getattr(self, f'player2_set{i}')
             if p1_score is not None and p2_score is not None:
-                result.append(f"{p1_score}-{p2_score}")
-        return " ".join(result)
+                sets.append([p1_score, p2_score])
+        
+        self.sets = sets
+        self.player1_sets_won = sum(1 for p1_score, p2_score in sets if p1_score > p2_score)
+        self.player2_sets_won = sum(1 for p1_score, p2_score in sets if p2_score > p1_score)
+        
+        if self.player1_sets_won != self.player2_sets_won:
+            self.winner_side = 1 if self.player1_sets_won > self.player2_sets_won else 2
+        elif self.winner_id is not None:
+            # Byes and walkovers have a winner but no sets
+            self.winner_side = 1 if self.winner_id == self.match.player1_id else 2
+        else:
+            self.winner_side = None
+        return self
+    
+    @property
+    def line(self):
+        return ScoreLine(self.sets, self.player1_sets_won, self.player2_sets_won, self.winner_side)
+    
+    @classmethod
+    def lines_for(cls, matches):
+        """Score lines keyed by match id, in one query and without loading the set columns"""
+        rows = cls.objects.filter(match__in=matches).values_list('match_id', *cls.PACKED_FIELDS)
+        return {row[0]: ScoreLine(*row[1:]) for row in rows}
     
     def get_player1_sets_won(self):
         """Count sets won by player 1"""
-        sets_won = 0
-        for i in range(1, 6):
-            p1_score = getattr(self, f'player1_set{i}')
-            p2_score = getattr(self, f'player2_set{i}')
-            if p1_score is not None and p2_score is not None and p1_score > p2_score:
-                sets_won += 1
-        return sets_won
+        return self.player1_sets_won
     
     def get_player2_sets_won(self):
         """Count sets won by player 2"""
-        sets_won = 0
-        for i in range(1, 6):
-            p1_score = getattr(self, f'player1_set{i}')
-            p2_score = getattr(self, f'player2_set{i}')
-            if p1_score is not None and p2_score is not None and p2_score > p1_score:
-                sets_won += 1
-        return sets_won
+        return self.player2_sets_won
+    
+    def get_totals(self):
+        """Sets and games won by each player, as (p1 sets, p2 sets, p1 games, p2 games)"""
+        return (
+            self.player1_sets_won,
+            self.player2_sets_won,
+            sum(p1_score for p1_score, _ in self.sets),
+            sum(p2_score for _, p2_score in self.sets)
+        )
     
     def determine_winner(self):
         """Determine the winner based on sets won"""
-        player1_sets = self.get_player1_sets_won()
-        player2_sets = self.get_player2_sets_won()
+        self.pack()
         
-        if player1_sets > player2_sets:
+        if self.player1_sets_won > self.player2_sets_won:
             return self.match.player1
-        elif player2_sets > player1_sets:
+        elif self.player2_sets_won > self.player1_sets_won:
             return self.match.player2
-        return None
\ No newline at end of file
+        return None
+
+class PointEvent(models.Model):
+    """One point of a live match, in the order it was played
+
+    The table is an append-only log: rows are never updated, and the live
+    score can always be rebuilt by replaying them by ``sequence``.
+    """
+    SIDE_CHOICES = [
+        (1, 'Player 1'),
+        (2, 'Player 2'),
+    ]
+    
+    match = models.ForeignKey(Match, on_delete=models.CASCADE, related_name='point_events')
+    sequence = models.PositiveIntegerField()
+    winner_side = models.PositiveSmallIntegerField(choices=SIDE_CHOICES)
+    recorded_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['match', 'sequence']
+        constraints = [
+            models.UniqueConstraint(fields=['match', 'sequence'], name='unique_point_sequence'),
+        ]
+    
+    def __str__(self):
+        return f"Match {self.match_id} point {self.sequence}: player {self.winner_side}"
+    
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Point events cannot be changed once recorded.")
+        super().save(*args, **kwargs)
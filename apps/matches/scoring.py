@@ -0,0 +1,133 @@
+"""Point-by-point scoring for live matches
+
+The score of a match is a small state machine fed one point at a time.
+Points are stored as ``PointEvent`` rows, which are never changed once
+written, and the current state is kept in the cache so recording a point
+only has to apply that one point. On a cache miss, the events are replayed.
+"""
+from django.core.cache import cache
+
+POINT_NAMES = ['0', '15', '30', '40']
+
+
+class ScoreState:
+    """Current score of a match: finished sets, games in the set, points in the game
+
+    Sides are 1 and 2, matching ``player1`` and ``player2``. Sets go to six
+    games with a two-game margin, and a tiebreak to seven points (also by
+    two) is played at six all, including in the deciding set.
+    """
+    __slots__ = ('best_of', 'sequence', 'sets', 'games', 'points', 'tiebreak', 'winner_side')
+
+    def __init__(self, best_of=3, sequence=0, sets=None, games=None, points=None, tiebreak=False, winner_side=None):
+        self.best_of = best_of
+        self.sequence = sequence
+        self.sets = sets if sets is not None else []
+        self.games = games if games is not None else [0, 0]
+        self.points = points if points is not None else [0, 0]
+        self.tiebreak = tiebreak
+        self.winner_side = winner_side
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @property
+    def is_finished(self):
+        return self.winner_side is not None
+
+    def sets_won(self, side):
+        return sum(1 for games in self.sets if games[side - 1] > games[2 - side])
+
+    def point_won(self, side):
+        """Apply one point won by ``side`` (1 or 2)"""
+        if self.is_finished:
+            raise ValueError("The match is already finished.")
+        if side not in (1, 2):
+            raise ValueError("A point must be won by side 1 or 2.")
+
+        self.sequence += 1
+        won, lost = side - 1, 2 - side
+        self.points[won] += 1
+
+        # Regular games need four points and a two-point lead, tiebreaks seven
+        target = 7 if self.tiebreak else 4
+        if self.points[won] >= target and self.points[won] - self.points[lost] >= 2:
+            self._game_won(side)
+        return self
+
+    def _game_won(self, side):
+        won, lost = side - 1, 2 - side
+        self.points = [0, 0]
+        self.games[won] += 1
+
+        if self.tiebreak or (self.games[won] >= 6 and self.games[won] - self.games[lost] >= 2):
+            self._set_won(side)
+        elif self.games == [6, 6]:
+            self.tiebreak = True
+
+    def _set_won(self, side):
+        self.sets.append(self.games)
+        self.games = [0, 0]
+        self.tiebreak = False
+
+        if self.sets_won(side) > self.best_of // 2:
+            self.winner_side = side
+
+    def display(self):
+        """Point score as shown on a scoreboard, e.g. ``('40', 'AD')``"""
+        if self.tiebreak:
+            return str(self.points[0]), str(self.points[1])
+        p1, p2 = self.points
+        if p1 >= 3 and p2 >= 3:
+            if p1 == p2:
+                return '40', '40'
+            return ('AD', '40') if p1 > p2 else ('40', 'AD')
+        return POINT_NAMES[p1], POINT_NAMES[p2]
+
+    def as_json(self):
+        return {
+            'sequence': self.sequence,
+            'sets': self.sets,
+            'games': self.games,
+            'points': list(self.display()),
+            'tiebreak': self.tiebreak,
+            'winner_side': self.winner_side,
+        }
+
+
+def replay(winner_sides, best_of=3):
+    """Rebuild a state from the sides that won each point, in order"""
+    state = ScoreState(best_of=best_of)
+    for side in winner_sides:
+        state.point_won(side)
+    return state
+
+
+def state_cache_key(match_id):
+    return f'match:{match_id}:score_state'
+
+
+def load_state(match, best_of=3):
+    """Current state from the cache, replaying the point log on a miss"""
+    from .models import PointEvent
+
+    data = cache.get(state_cache_key(match.pk))
+    if data is not None:
+        return ScoreState.from_dict(data)
+
+    sides = PointEvent.objects.filter(match=match).order_by('sequence').values_list('winner_side', flat=True)
+    state = replay(sides, best_of=best_of)
+    cache.set(state_cache_key(match.pk), state.to_dict(), None)
+    return state
+
+
+def store_state(match, state):
+    cache.set(state_cache_key(match.pk), state.to_dict(), None)
+
+
+def forget_state(match):
+    cache.delete(state_cache_key(match.pk))
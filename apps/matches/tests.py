@@ -1,12 +1,31 @@
-from django.test import TestCase
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+from importlib import import_module
+from unittest.mock import patch
+
+from django.apps import apps as django_apps
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, Client
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from datetime import timedelta
 
 from apps.accounts.models import TennisPlayer, Referee
-from apps.tournaments.models import Tournament
-from apps.matches.models import Match, MatchScore
+from apps.tournaments.models import Tournament, Standing
+from apps.matches.models import Match, MatchScore, PointEvent
+from apps.matches.scoring import ScoreState, replay
+from apps.notifications.models import Notification, OutboxEvent
+from apps.notifications.outbox import dispatch_outbox
+from core.strategies.match_generator import SingleEliminationStrategy, RoundRobinStrategy
+from core.broadcast import event_stream, publish_match
+from core.tiebreaks import TiebreakEngine
 
 User = get_user_model()
 
@@ -162,6 +181,30 @@ class MatchScoreModelTest(TestCase):
         self.score.save()
         
         self.assertEqual(self.score.get_winner(), self.player2)
+    
+    def test_save_packs_sets(self):
+        score = MatchScore.objects.get(pk=self.score.pk)
+        self.assertEqual(score.sets, [[6, 4], [6, 2]])
+        self.assertEqual((score.player1_sets_won, score.player2_sets_won, score.winner_side), (2, 0, 1))
+        self.assertEqual(str(score), "6-4 6-2")
+        
+        score.player1_set3, score.player2_set3 = 3, 6
+        score.save(update_fields=['player1_set3', 'player2_set3'])
+        score.refresh_from_db()
+        self.assertEqual(score.line.sets, [[6, 4], [6, 2], [3, 6]])
+        self.assertEqual(score.line.player2_sets_won, 1)
+    
+    def test_lines_for_reads_packed_columns_only(self):
+        with self.assertNumQueries(1):
+            lines = MatchScore.lines_for([self.match])
+        self.assertEqual(str(lines[self.match.id]), "6-4 6-2")
+        self.assertEqual(lines[self.match.id].winner_side, 1)
+    
+    def test_winner_without_sets_sets_side(self):
+        match = Match.objects.create(tournament=self.tournament, player1=self.player2, round_number=1)
+        score = MatchScore.objects.create(match=match, winner=self.player2)
+        self.assertEqual(score.winner_side, 1)
+        self.assertEqual(score.sets, [])
 
 class MatchViewsTest(TestCase):
     def setUp(self):
@@ -240,3 +283,604 @@ class MatchViewsTest(TestCase):
         # Verify match status updated to completed
         self.match.refresh_from_db()
         self.assertEqual(self.match.status, 'COMPLETED')
+
+class ConcurrentScoreSubmissionTest(TransactionTestCase):
+    def setUp(self):
+        self.organizer = User.objects.create_user(username='organizer', password='testpass')
+        self.tournament = Tournament.objects.create(
+            name='Stress Tournament',
+            organizer=self.organizer,
+            start_date=timezone.now().date(),
+            end_date=timezone.now().date() + timedelta(days=5),
+            status='IN_PROGRESS'
+        )
+        self.referee_user = User.objects.create_user(
+            username='referee', password='testpass', user_type='REFEREE'
+        )
+        self.referee = Referee.objects.create(user=self.referee_user)
+        players = [
+            User.objects.create_user(username=f'player{i}', password='testpass')
+            for i in range(32)
+        ]
+        SingleEliminationStrategy().generate_matches(self.tournament, players)
+        Match.objects.filter(tournament=self.tournament).update(referee=self.referee)
+
+    def test_simultaneous_submissions_advance_every_winner_once(self):
+        first_round = list(Match.objects.filter(tournament=self.tournament, round_number=1))
+        # Every match is submitted twice at once, as if by a double click
+        submissions = first_round * 2
+        barrier = threading.Barrier(len(submissions), timeout=30)
+        errors = []
+
+        clients = []
+        for _ in submissions:
+            client = Client()
+            client.force_login(self.referee_user)
+            clients.append(client)
+
+        def submit(client, match):
+            try:
+                barrier.wait()
+                response = client.post(
+                    reverse('matches:update_score', args=[match.id]),
+                    {'player1_set1': 6, 'player2_set1': 3, 'player1_set2': 6, 'player2_set2': 4}
+                )
+                if response.status_code != 302:
+                    errors.append(response.status_code)
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        with patch('core.observers.EmailNotifier._send_email'):
+            threads = [
+                threading.Thread(target=submit, args=(client, match))
+                for client, match in zip(clients, submissions)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(MatchScore.objects.filter(match__round_number=1).count(), 16)
+        self.assertFalse(
+            Match.objects.filter(tournament=self.tournament, round_number=1).exclude(status='COMPLETED').exists()
+        )
+
+        # Both slots of every second-round match were filled exactly once
+        for match in Match.objects.filter(tournament=self.tournament, round_number=2):
+            self.assertIsNotNone(match.player1_id)
+            self.assertIsNotNone(match.player2_id)
+
+        # Winner and loser notified once per match despite the duplicates
+        self.assertEqual(OutboxEvent.objects.count(), 16)
+        with patch('core.observers.EmailNotifier._send_email'):
+            dispatch_outbox(workers=1)
+        self.assertEqual(Notification.objects.filter(notification_type='MATCH').count(), 32)
+
+class BatchScoreEntryTest(TestCase):
+    def setUp(self):
+        self.organizer = User.objects.create_user(username='organizer', password='testpass', user_type='ADMIN')
+        self.tournament = Tournament.objects.create(
+            name='Desk Tournament',
+            organizer=self.organizer,
+            start_date=timezone.now().date(),
+            end_date=timezone.now().date() + timedelta(days=5),
+            status='IN_PROGRESS'
+        )
+        self.players = [User.objects.create(username=f'player{i}') for i in range(16)]
+        SingleEliminationStrategy().generate_matches(self.tournament, self.players)
+        self.first_round = list(
+            Match.objects.filter(tournament=self.tournament, round_number=1).order_by('bracket_position')
+        )
+        self.client.force_login(self.organizer)
+        self.url = reverse('matches:batch_scores', args=[self.tournament.id])
+
+    def sheet(self, matches):
+        data = {}
+        for match in matches:
+            prefix = f'match-{match.id}'
+            data.update({
+                f'{prefix}-player1_set1': 6, f'{prefix}-player2_set1': 2,
+                f'{prefix}-player1_set2': 6, f'{prefix}-player2_set2': 3,
+            })
+        return data
+
+    def test_get_lists_open_matches(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['rows']), 8)
+
+    def test_batch_records_scores_and_advances(self):
+        with patch('core.observers.EmailNotifier._send_email'), self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.url, self.sheet(self.first_round[:4]))
+        self.assertEqual(response.status_code, 302)
+
+        for match in self.first_round[:4]:
+            match.refresh_from_db()
+            self.assertEqual(match.status, 'COMPLETED')
+            self.assertEqual(match.score.winner_id, match.player1_id)
+        self.assertFalse(MatchScore.objects.filter(match__in=self.first_round[4:]).exists())
+
+        round2 = Match.objects.filter(tournament=self.tournament, round_number=2).order_by('bracket_position')
+        self.assertEqual(round2[0].player1_id, self.first_round[0].player1_id)
+        self.assertEqual(round2[0].player2_id, self.first_round[1].player1_id)
+        self.assertEqual(round2[1].player2_id, self.first_round[3].player1_id)
+
+        # One outbox event for the whole sheet, delivered by the worker
+        self.assertEqual(OutboxEvent.objects.get().payload['match_ids'], [match.id for match in self.first_round[:4]])
+        with patch('core.observers.EmailNotifier._send_email'):
+            dispatch_outbox(workers=1)
+        self.assertEqual(Notification.objects.filter(notification_type='MATCH').count(), 8)
+        self.assertContains(self.client.get(response.url), "6-2 6-3", count=4)
+
+    def test_batch_query_count_does_not_grow_with_results(self):
+        def post_and_count(matches):
+            with patch('core.observers.EmailNotifier._send_email'), CaptureQueriesContext(connection) as queries:
+                self.client.post(self.url, self.sheet(matches))
+            return len(queries)
+
+        self.assertEqual(post_and_count(self.first_round[:2]), post_and_count(self.first_round[2:8]))
+
+    def test_invalid_row_saves_nothing(self):
+        data = self.sheet(self.first_round[:2])
+        data[f'match-{self.first_round[1].id}-player1_set1'] = 'abc'
+
+        response = self.client.post(self.url, data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(MatchScore.objects.filter(match__round_number=1, match__player2__isnull=False).exists())
+
+class LegacyBracketTest(TestCase):
+    def setUp(self):
+        self.organizer = User.objects.create_user(username='organizer', password='testpass')
+        self.tournament = Tournament.objects.create(
+            name='Legacy Tournament',
+            organizer=self.organizer,
+            start_date=timezone.now().date(),
+            end_date=timezone.now().date() + timedelta(days=5),
+            status='IN_PROGRESS'
+        )
+        self.players = [User.objects.create(username=f'player{i}') for i in range(8)]
+        # As written before brackets were materialized: first round only, no links
+        self.first_round = [
+            Match.objects.create(
+                tournament=self.tournament,
+                player1=self.players[i],
+                player2=self.players[i + 1],
+                round_number=1,
+                status='SCHEDULED'
+            )
+            for i in range(0, 8, 2)
+        ]
+        for match in self.first_round[:2]:
+            MatchScore.objects.create(match=match, player1_set1=6, player2_set1=2, winner=match.player2)
+            match.status = 'COMPLETED'
+            match.save()
+
+    def test_migration_links_and_fills_the_bracket(self):
+        link = import_module('apps.matches.migrations.0009_link_legacy_brackets').link_legacy_brackets
+        link(django_apps, None)
+
+        round2 = list(Match.objects.filter(tournament=self.tournament, round_number=2).order_by('bracket_position'))
+        final = Match.objects.get(tournament=self.tournament, round_number=3)
+        self.assertEqual(len(round2), 2)
+        for position, match in enumerate(self.first_round):
+            match.refresh_from_db()
+            self.assertEqual(match.bracket_position, position)
+            self.assertEqual(match.winner_next_match_id, round2[position // 2].id)
+            self.assertEqual(match.winner_next_slot, position % 2 + 1)
+        self.assertEqual((round2[0].player1, round2[0].player2), (self.players[1], self.players[3]))
+        self.assertEqual(round2[1].winner_next_match, final)
+
+        # Results entered afterwards move on through the links
+        self.first_round[3].advance(self.players[6])
+        round2[1].refresh_from_db()
+        self.assertEqual(round2[1].player2, self.players[6])
+
+class RoundRobinStandingsTest(TestCase):
+    def setUp(self):
+        self.organizer = User.objects.create_user(username='organizer', password='testpass', user_type='ADMIN')
+        self.tournament = Tournament.objects.create(
+            name='League',
+            organizer=self.organizer,
+            start_date=timezone.now().date(),
+            end_date=timezone.now().date() + timedelta(days=5),
+            tournament_type='ROUND_ROBIN',
+            status='IN_PROGRESS'
+        )
+        self.players = [User.objects.create(username=f'player{i}') for i in range(6)]
+        RoundRobinStrategy().generate_matches(self.tournament, self.players)
+        self.matches = list(Match.objects.filter(tournament=self.tournament).order_by('id'))
+
+    def play(self, match, winner_id, sets=((6, 3), (6, 4))):
+        score = MatchScore(match=match)
+        for i, (winner_games, loser_games) in enumerate(sets, start=1):
+            p1, p2 = (winner_games, loser_games) if winner_id == match.player1_id else (loser_games, winner_games)
+            setattr(score, f'player1_set{i}', p1)
+            setattr(score, f'player2_set{i}', p2)
+        return match.record_score(score)
+
+    def test_generation_creates_empty_table(self):
+        standings = Standing.objects.filter(tournament=self.tournament)
+        self.assertEqual(standings.count(), 6)
+        self.assertFalse(standings.exclude(played=0).exists())
+
+    def test_result_updates_both_rows(self):
+        match = self.matches[0]
+        self.play(match, match.player2_id, sets=((6, 4), (3, 6), (7, 5)))
+
+        winner = Standing.objects.get(tournament=self.tournament, player_id=match.player2_id)
+        loser = Standing.objects.get(tournament=self.tournament, player_id=match.player1_id)
+        self.assertEqual((winner.played, winner.wins, winner.losses), (1, 1, 0))
+        self.assertEqual((winner.sets_for, winner.sets_against, winner.games_for, winner.games_against), (2, 1, 16, 15))
+        self.assertEqual((loser.played, loser.wins, loser.losses), (1, 0, 1))
+        self.assertEqual((loser.sets_for, loser.sets_against, loser.games_for, loser.games_against), (1, 2, 15, 16))
+        self.assertEqual(winner.rank, 1)
+
+    def test_table_matches_full_recount(self):
+        rng = random.Random(7)
+        for match in self.matches:
+            self.play(match, rng.choice([match.player1_id, match.player2_id]))
+
+        wins = dict.fromkeys([player.id for player in self.players], 0)
+        for score in MatchScore.objects.filter(match__tournament=self.tournament):
+            wins[score.winner_id] += 1
+
+        standings = list(Standing.objects.filter(tournament=self.tournament).order_by('rank'))
+        self.assertEqual({standing.player_id: standing.wins for standing in standings}, wins)
+        self.assertEqual([standing.rank for standing in standings], list(range(1, 7)))
+        self.assertEqual([standing.wins for standing in standings], sorted(wins.values(), reverse=True))
+
+    def test_rerank_agrees_with_tiebreak_engine(self):
+        rng = random.Random(3)
+        for match in self.matches:
+            self.play(match, rng.choice([match.player1_id, match.player2_id]), sets=((6, rng.randint(0, 4)), (7, 6)))
+            expected = TiebreakEngine.for_tournament(self.tournament.id, [player.id for player in self.players]).ranking()
+            ranked = list(Standing.objects.filter(tournament=self.tournament).order_by('rank').values_list('player_id', flat=True))
+            self.assertEqual(ranked, expected)
+
+    def test_rerank_loads_only_tied_head_to_heads(self):
+        # player0 beats everyone; the rest are level on no wins
+        first = self.players[0].id
+        for match in self.matches:
+            if first in (match.player1_id, match.player2_id):
+                self.play(match, first)
+
+        with CaptureQueriesContext(connection) as queries:
+            Standing.rerank(self.tournament.id)
+
+        score_query = next(query['sql'] for query in queries.captured_queries if 'matches_matchscore' in query['sql'])
+        loaded = re.search(r'"player1_id" IN \(([^)]*)\)', score_query).group(1)
+        self.assertEqual({int(player_id) for player_id in loaded.split(',')}, {player.id for player in self.players[1:]})
+
+    def test_backfill_rebuilds_tables_from_scores(self):
+        backfill = import_module('apps.tournaments.migrations.0009_backfill_standings').backfill_standings
+        rng = random.Random(11)
+        for match in self.matches[:9]:
+            self.play(match, rng.choice([match.player1_id, match.player2_id]), sets=((6, rng.randint(0, 4)), (7, 6)))
+        fields = ['player_id', 'played', 'wins', 'losses', 'sets_for', 'sets_against', 'games_for', 'games_against', 'rank']
+        expected = list(Standing.objects.filter(tournament=self.tournament).order_by('rank').values_list(*fields))
+
+        # As left by an upgrade mid-tournament: no rows, or rows missing earlier results
+        Standing.objects.filter(tournament=self.tournament).delete()
+        Standing.objects.create(tournament=self.tournament, player=self.players[0], played=1, wins=1)
+        backfill(django_apps, None)
+
+        self.assertEqual(list(Standing.objects.filter(tournament=self.tournament).order_by('rank').values_list(*fields)), expected)
+
+    def test_recording_cost_does_not_grow_with_results(self):
+        def record_and_count(match):
+            with CaptureQueriesContext(connection) as queries:
+                self.play(match, match.player1_id)
+            return len(queries)
+
+        # The rank write is skipped when nobody moves, so allow for it either way
+        first = record_and_count(self.matches[0])
+        for match in self.matches[1:-1]:
+            self.play(match, match.player1_id)
+        self.assertLessEqual(abs(record_and_count(self.matches[-1]) - first), 1)
+
+    def test_batch_entry_updates_table(self):
+        self.client.force_login(self.organizer)
+        data = {}
+        for match in self.matches[:3]:
+            prefix = f'match-{match.id}'
+            data.update({
+                f'{prefix}-player1_set1': 6, f'{prefix}-player2_set1': 2,
+                f'{prefix}-player1_set2': 6, f'{prefix}-player2_set2': 3,
+            })
+        with patch('core.observers.EmailNotifier._send_email'):
+            self.client.post(reverse('matches:batch_scores', args=[self.tournament.id]), data)
+
+        standings = Standing.objects.filter(tournament=self.tournament)
+        self.assertEqual(sum(standings.values_list('played', flat=True)), 6)
+        self.assertEqual(sum(standings.values_list('games_for', flat=True)), 3 * 17)
+        self.assertEqual(standings.get(rank=1).wins, 1)
+
+    def test_standings_page(self):
+        match = self.matches[0]
+        self.play(match, match.player1_id)
+
+        response = self.client.get(reverse('tournaments:tournament_standings', args=[self.tournament.id]))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['standings'][0].player_id, match.player1_id)
+
+class ScoreStateTest(TestCase):
+    def test_deuce_and_advantage(self):
+        state = replay([1, 1, 1, 2, 2, 2])
+        self.assertEqual(state.display(), ('40', '40'))
+        state.point_won(2)
+        self.assertEqual(state.display(), ('40', 'AD'))
+        state.point_won(1)
+        state.point_won(1)
+        self.assertEqual(state.display(), ('AD', '40'))
+        state.point_won(1)
+        self.assertEqual(state.games, [1, 0])
+
+    def test_tiebreak_at_six_all(self):
+        # Hold serve alternately to 6-6, then win the tiebreak 7-5
+        state = replay([1] * 4 * 5 + [2] * 4 * 6 + [1] * 4)
+        self.assertTrue(state.tiebreak)
+        for side in [1, 2] * 5 + [1, 1]:
+            state.point_won(side)
+        self.assertEqual(state.sets, [[7, 6]])
+        self.assertFalse(state.tiebreak)
+
+    def test_best_of_three_finishes(self):
+        state = replay([1] * 48)
+        self.assertEqual(state.winner_side, 1)
+        self.assertEqual(state.sets, [[6, 0], [6, 0]])
+        with self.assertRaises(ValueError):
+            state.point_won(2)
+
+    def test_round_trips_through_dict(self):
+        state = replay([1, 2, 2, 1, 1])
+        self.assertEqual(ScoreState.from_dict(state.to_dict()).as_json(), state.as_json())
+
+class RecordPointViewTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.referee_user = User.objects.create_user(username='referee', password='testpass', user_type='REFEREE')
+        self.referee = Referee.objects.create(user=self.referee_user)
+        self.organizer = User.objects.create_user(username='organizer', password='testpass')
+        self.tournament = Tournament.objects.create(
+            name='Centre Court',
+            organizer=self.organizer,
+            start_date=timezone.now().date(),
+            end_date=timezone.now().date() + timedelta(days=5),
+            status='IN_PROGRESS'
+        )
+        self.player1 = User.objects.create(username='player1')
+        self.player2 = User.objects.create(username='player2')
+        self.match = Match.objects.create(
+            tournament=self.tournament,
+            player1=self.player1,
+            player2=self.player2,
+            round_number=1,
+            referee=self.referee,
+            status='SCHEDULED'
+        )
+        self.url = reverse('matches:record_point', args=[self.match.id])
+        self.client.force_login(self.referee_user)
+
+    def point(self, side):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(self.url, {'winner': side})
+
+    def test_point_updates_live_state(self):
+        response = self.point(1)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['points'], ['15', '0'])
+        self.match.refresh_from_db()
+        self.assertEqual(self.match.status, 'IN_PROGRESS')
+        self.assertEqual(list(PointEvent.objects.values_list('sequence', 'winner_side')), [(1, 1)])
+
+    def test_point_moves_tournament_version(self):
+        self.point(1)
+        self.point(2)
+        self.tournament.refresh_from_db()
+        self.assertEqual(self.tournament.version, 2)
+
+    def test_only_assigned_referee_can_score(self):
+        self.client.force_login(self.player1)
+        self.assertEqual(self.client.post(self.url, {'winner': 1}).status_code, 403)
+        self.assertFalse(PointEvent.objects.exists())
+
+    def test_point_cost_is_constant(self):
+        for _ in range(40):
+            self.point(1)
+        with CaptureQueriesContext(connection) as early:
+            self.point(2)
+        for _ in range(40):
+            self.point(2)
+        with CaptureQueriesContext(connection) as late:
+            self.point(1)
+        self.assertEqual(len(early), len(late))
+
+    def test_cache_miss_replays_log(self):
+        for side in [1, 1, 2]:
+            self.point(side)
+        cache.clear()
+        self.assertEqual(self.client.get(self.url).json()['points'], ['30', '15'])
+        self.assertEqual(self.point(1).json()['points'], ['40', '15'])
+
+    def test_stale_cache_is_rebuilt_from_log(self):
+        self.point(1)
+        cached = cache.get(f'match:{self.match.id}:score_state')
+        self.point(1)
+        cache.set(f'match:{self.match.id}:score_state', cached, None)
+        self.assertEqual(self.point(1).json()['points'], ['40', '0'])
+
+    def test_finished_match_records_score(self):
+        with patch('core.observers.EmailNotifier._send_email'):
+            for side in [2] * 4 * 6 + [1] * 4 * 6 + [2] * 4 * 6:
+                response = self.point(side)
+        self.assertEqual(response.json()['winner_side'], 2)
+
+        self.match.refresh_from_db()
+        self.assertEqual(self.match.status, 'COMPLETED')
+        self.assertEqual(self.match.score.sets, [[0, 6], [6, 0], [0, 6]])
+        self.assertEqual(self.match.score.winner, self.player2)
+        self.assertEqual(self.point(1).status_code, 400)
+
+class MatchStreamViewTest(TransactionTestCase):
+    def setUp(self):
+        organizer = User.objects.create_user(username='organizer', password='testpass')
+        tournament = Tournament.objects.create(
+            name='Streamed',
+            organizer=organizer,
+            start_date=timezone.now().date(),
+            end_date=timezone.now().date() + timedelta(days=5),
+            status='IN_PROGRESS'
+        )
+        self.match = Match.objects.create(
+            tournament=tournament,
+            player1=User.objects.create(username='player1'),
+            player2=User.objects.create(username='player2'),
+            round_number=1,
+            status='IN_PROGRESS'
+        )
+
+    async def test_stream_sends_current_state_then_updates(self):
+        await self.async_client.aforce_login(self.match.player1)
+        response = await self.async_client.get(reverse('matches:match_stream', args=[self.match.id]))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+
+        first = await asyncio.wait_for(anext(stream), 5)
+        self.assertEqual(json.loads(first.decode().split('data: ')[1])['status'], 'IN_PROGRESS')
+
+        self.match.status = 'COMPLETED'
+        await asyncio.to_thread(publish_match, self.match)
+        update = await asyncio.wait_for(anext(stream), 5)
+        self.assertEqual(json.loads(update.decode().split('data: ')[1])['status'], 'COMPLETED')
+        await stream.aclose()
+
+    async def test_unknown_match_is_404(self):
+        response = await self.async_client.get(reverse('matches:match_stream', args=[999999]))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_unfinished_match_is_hidden_from_outsiders(self):
+        url = reverse('matches:match_stream', args=[self.match.id])
+        self.assertEqual((await self.async_client.get(url)).status_code, 404)
+        outsider = await User.objects.acreate(username='outsider')
+        await self.async_client.aforce_login(outsider)
+        self.assertEqual((await self.async_client.get(url)).status_code, 404)
+
+    async def test_stream_ends_after_max_age(self):
+        frames = []
+        async def read():
+            async for frame in event_stream(f'match:{self.match.id}', initial={'status': 'IN_PROGRESS'}, heartbeat=0.05, max_age=0.2):
+                frames.append(frame)
+        await asyncio.wait_for(read(), 5)
+        self.assertTrue(frames[0].startswith('event: score'))
+        self.assertIn(': keep-alive\n\n', frames)
+
+    def test_no_stream_under_wsgi(self):
+        # A WSGI worker would be held for as long as the page stays open
+        self.assertEqual(self.client.get(reverse('matches:match_stream', args=[self.match.id])).status_code, 204)
+        self.client.force_login(self.match.player1)
+        response = self.client.get(reverse('matches:match_detail', args=[self.match.id]))
+        self.assertNotContains(response, 'data-stream-url')
+        self.assertEqual(
+            self.client.get(reverse('tournaments:tournament_stream', args=[self.match.tournament_id])).status_code, 204
+        )
+
+    async def test_detail_page_streams_under_asgi(self):
+        await self.async_client.aforce_login(self.match.player1)
+        response = await self.async_client.get(reverse('matches:match_detail', args=[self.match.id]))
+        self.assertContains(response, 'data-stream-url')
+
+class SnapshotViewTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.referee_user = User.objects.create_user(username='referee', password='testpass', user_type='REFEREE')
+        referee = Referee.objects.create(user=self.referee_user)
+        organizer = User.objects.create_user(username='organizer', password='testpass')
+        self.tournament = Tournament.objects.create(
+            name='Polled',
+            organizer=organizer,
+            start_date=timezone.now().date(),
+            end_date=timezone.now().date() + timedelta(days=5),
+            status='IN_PROGRESS'
+        )
+        self.match = Match.objects.create(
+            tournament=self.tournament,
+            player1=User.objects.create(username='player1'),
+            player2=User.objects.create(username='player2'),
+            round_number=1,
+            referee=referee,
+            status='SCHEDULED'
+        )
+        self.match_url = reverse('matches:match_snapshot', args=[self.match.id])
+        self.tournament_url = reverse('tournaments:tournament_snapshot', args=[self.tournament.id])
+        self.client.force_login(self.referee_user)
+
+    def test_unchanged_snapshot_is_not_modified(self):
+        for url in (self.match_url, self.tournament_url):
+            first = self.client.get(url)
+            self.assertEqual(first.status_code, 200)
+            again = self.client.get(url, headers={'If-None-Match': first['ETag']})
+            self.assertEqual(again.status_code, 304)
+            self.assertEqual(again['ETag'], first['ETag'])
+
+    def test_recorded_score_changes_versions(self):
+        match_etag = self.client.get(self.match_url)['ETag']
+        tournament_etag = self.client.get(self.tournament_url)['ETag']
+
+        self.client.force_login(self.referee_user)
+        with patch('core.observers.EmailNotifier._send_email'):
+            self.client.post(reverse('matches:update_score', args=[self.match.id]), {
+                'player1_set1': 6, 'player2_set1': 1, 'player1_set2': 6, 'player2_set2': 2,
+            })
+
+        response = self.client.get(self.match_url, headers={'If-None-Match': match_etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['version'], 1)
+        self.assertEqual(response.json()['score'], '6-1 6-2')
+        response = self.client.get(self.tournament_url, headers={'If-None-Match': tournament_etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['matches'][0]['status'], 'COMPLETED')
+
+    def test_full_save_does_not_wind_version_back(self):
+        stale = Match.objects.get(pk=self.match.pk)
+        Match.objects.filter(pk=self.match.pk).update(version=5)
+        stale.court_number = 3
+        stale.save()
+        self.match.refresh_from_db()
+        self.assertEqual((self.match.version, self.match.court_number), (5, 3))
+
+    def test_unfinished_match_is_hidden_from_outsiders(self):
+        self.client.force_login(User.objects.create(username='outsider'))
+        self.assertEqual(self.client.get(self.match_url).status_code, 404)
+        self.assertEqual(self.client.get(reverse('matches:record_point', args=[self.match.id])).status_code, 404)
+        self.client.force_login(self.match.player2)
+        self.assertEqual(self.client.get(self.match_url).status_code, 200)
+
+    async def test_long_poll_waits_for_change(self):
+        await self.async_client.aforce_login(self.referee_user)
+        etag = (await self.async_client.get(self.match_url))['ETag']
+
+        def record_point():
+            time.sleep(0.2)
+            with transaction.atomic():
+                match = Match.objects.select_for_update().get(pk=self.match.pk)
+                match.record_point(1)
+                transaction.on_commit(lambda: publish_match(match))
+
+        started = time.perf_counter()
+        response, _ = await asyncio.gather(
+            self.async_client.get(self.match_url, {'wait': 5}, headers={'If-None-Match': etag}),
+            asyncio.to_thread(record_point)
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['live']['points'], ['15', '0'])
+        self.assertLess(time.perf_counter() - started, 4)
+
+    async def test_long_poll_times_out_with_not_modified(self):
+        etag = (await self.async_client.get(self.tournament_url))['ETag']
+        response = await self.async_client.get(self.tournament_url, {'wait': 0.2}, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
@@ -9,6 +9,10 @@ urlpatterns = [
     path('<int:pk>/', views.MatchDetailView.as_view(), name='match_detail'),
     path('<int:pk>/referee-signup/', views.RefereeSignupView.as_view(), name='referee_signup'),
     path('<int:pk>/update-score/', views.UpdateScoreView.as_view(), name='update_score'),
+    path('<int:pk>/points/', views.RecordPointView.as_view(), name='record_point'),
+    path('<int:pk>/stream/', views.MatchStreamView.as_view(), name='match_stream'),
+    path('<int:pk>/snapshot/', views.MatchSnapshotView.as_view(), name='match_snapshot'),
+    path('tournament/<int:tournament_id>/batch-scores/', views.BatchScoreEntryView.as_view(), name='batch_scores'),
     path('export/csv/', views.export_matches_csv, name='export_csv'),
     path('export/txt/', views.export_matches_txt, name='export_txt'),
     path('players/filter/', views.PlayerFilterView.as_view(), name='player_filter'),
@@ -3,25 +3,25 @@ from django.views.generic import ListView, DetailView, View
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.urls import reverse
 from django.contrib import messages
-from django.http import Http404, HttpResponseRedirect
+from django.http import Http404, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
 import csv
 from django.http import HttpResponse
 import datetime
+from asgiref.sync import sync_to_async
+from django.db import transaction
 from django.db.models import Q, F
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 
-from .models import Match, MatchScore
+from .models import Match, MatchScore, ScoreLine
+from apps.tournaments.models import Tournament, Standing
 from .forms import MatchScoreForm
+from .scoring import load_state
 
-from core.observers import TournamentNotificationSubject, EmailNotifier, DatabaseNotifier
+from core.observers import event_bus
+from core.broadcast import event_stream, is_async_request, match_event, publish_match, LongPollSnapshotView
 from core.mixins import PlayerRequiredMixin, RefereeRequiredMixin
 
-tournament_notifier = TournamentNotificationSubject()
-email_observer = EmailNotifier()
-db_observer = DatabaseNotifier()
-
-tournament_notifier.attach(email_observer)
-tournament_notifier.attach(db_observer)
 
 class MatchListView(ListView):
     model = Match
@@ -77,12 +77,8 @@ def export_matches_csv(request):
         try:
             if hasattr(match, 'score'):
                 score = match.score
-                if score.player1_set1 is not None and score.player2_set1 is not None:
-                    set1_score = f"{score.player1_set1}-{score.player2_set1}"
-                if score.player1_set2 is not None and score.player2_set2 is not None:
-                    set2_score = f"{score.player1_set2}-{score.player2_set2}"
-                if score.player1_set3 is not None and score.player2_set3 is not None:
-                    set3_score = f"{score.player1_set3}-{score.player2_set3}"
+                set_scores = [f"{p1_score}-{p2_score}" for p1_score, p2_score in score.sets[:3]]
+                set1_score, set2_score, set3_score = set_scores + ["N/A"] * (3 - len(set_scores))
                 if score.winner:
                     winner_name = score.winner.get_full_name()
         except Match.score.RelatedObjectDoesNotExist:
@@ -153,12 +149,8 @@ def export_matches_txt(request):
         try:
             if hasattr(match, 'score'):
                 score = match.score
-                if score.player1_set1 is not None and score.player2_set1 is not None:
-                    response.write(f"  Set 1: {score.player1_set1}-{score.player2_set1}\n")
-                if score.player1_set2 is not None and score.player2_set2 is not None:
-                    response.write(f"  Set 2: {score.player1_set2}-{score.player2_set2}\n")
-                if score.player1_set3 is not None and score.player2_set3 is not None:
-                    response.write(f"  Set 3: {score.player1_set3}-{score.player2_set3}\n")
+                for set_number, (p1_score, p2_score) in enumerate(score.sets[:3], start=1):
+                    response.write(f"  Set {set_number}: {p1_score}-{p2_score}\n")
                 
                 if score.winner:
                     response.write(f"Winner: {score.winner.get_full_name()}\n")
@@ -178,15 +170,9 @@ class MatchDetailView(LoginRequiredMixin, DetailView):
     
     def get_object(self, queryset=None):
         match = super().get_object(queryset)
-        user = self.request.user
-        
-        # Check permissions to see the match
-        is_participant = user == match.player1 or user == match.player2
-        is_referee = user.is_referee() and (match.referee is None or match.referee.user == user)
-        is_tournament_admin = user.is_admin() and (user == match.tournament.organizer or user.is_superuser)
         
         # For non-completed matches, only participants, referees, and admins should see
-        if match.status != 'COMPLETED' and not (is_participant or is_referee or is_tournament_admin):
+        if not match.is_visible_to(self.request.user):
             raise Http404("Match not found")
             
         return match
@@ -209,6 +195,9 @@ class MatchDetailView(LoginRequiredMixin, DetailView):
             context['is_match_referee'] = user == match.referee.user
         else:
             context['is_match_referee'] = False
+        
+        # Live updates are only pushed when the page is served under ASGI
+        context['live_stream'] = is_async_request(self.request)
             
         return context
 
@@ -246,123 +235,238 @@ class RefereeSignupView(LoginRequiredMixin, RefereeRequiredMixin, View):
 
 class UpdateScoreView(LoginRequiredMixin, View):
     def post(self, request, *args, **kwargs):
-        match = get_object_or_404(Match, pk=kwargs['pk'])
-        
-        # Check if user is the assigned referee
-        if not request.user.is_referee() or not match.referee or match.referee.user != request.user:
-            messages.error(request, "Only the assigned referee can update match scores.")
-            return HttpResponseRedirect(reverse('matches:match_detail', kwargs={'pk': match.pk}))
-        
-        # Check if match is in progress
-        if match.is_completed() or match.is_canceled():
-            messages.error(request, "Cannot update scores for completed or cancelled matches.")
-            return HttpResponseRedirect(reverse('matches:match_detail', kwargs={'pk': match.pk}))
-        
-        # Get or create the score object
-        try:
-            score_instance = match.score
-        except Match.score.RelatedObjectDoesNotExist:
-            # Create a new score instance if it doesn't exist
-            score_instance = MatchScore(match=match)
-            score_instance.save()
-        
-        # Now use the score instance with the form
-        form = MatchScoreForm(request.POST, instance=score_instance)
-        
-        if form.is_valid():
-            score = form.save(commit=False)
+        # Score, status and advancement commit as one unit. The match row is
+        # locked first, so simultaneous submissions are applied one at a time
+        # and the second one sees the match already completed.
+        with transaction.atomic():
+            match = get_object_or_404(Match.objects.select_for_update(), pk=kwargs['pk'])
             
-            # Determine winner
-            winner = score.determine_winner()
-            score.winner = winner
-            score.save()
+            # Check if user is the assigned referee
+            if not request.user.is_referee() or not match.referee or match.referee.user != request.user:
+                messages.error(request, "Only the assigned referee can update match scores.")
+                return HttpResponseRedirect(reverse('matches:match_detail', kwargs={'pk': match.pk}))
             
-            # Update match status if a winner is determined
-            if winner:
-                match.status = 'COMPLETED'
-                match.save()
-                tournament_notifier.match_result_recorded(match)
+            # Later-round slots can only be scored once both players are known
+            if match.player1_id is None or match.player2_id is None:
+                messages.error(request, "Both players must be known before scores can be recorded.")
+                return HttpResponseRedirect(reverse('matches:match_detail', kwargs={'pk': match.pk}))
+            
+            # Check if match is in progress
+            if match.is_completed() or match.is_canceled():
+                messages.error(request, "Cannot update scores for completed or cancelled matches.")
+                return HttpResponseRedirect(reverse('matches:match_detail', kwargs={'pk': match.pk}))
+            
+            # Get the score object, it is only written once the form is valid
+            score_instance = MatchScore.objects.filter(match=match).first() or MatchScore(match=match)
+            form = MatchScoreForm(request.POST, instance=score_instance)
+            
+            if form.is_valid():
+                score = form.save(commit=False)
+                winner = match.record_score(score)
+                transaction.on_commit(lambda: publish_match(match, score.line))
                 
-                # Generate next round match if applicable
-                self.advance_winner_to_next_round(match, winner)
+                if winner:
+                    # Recorded in the outbox, so it commits or rolls back with the result
+                    event_bus.match_result_recorded(match)
+                    messages.success(request, "Match score updated and match completed.")
+                else:
+                    messages.success(request, "Match score updated. No winner determined yet.")
                 
-                messages.success(request, "Match score updated and match completed.")
-            else:
-                match.status = 'IN_PROGRESS'
-                match.save()
-                messages.success(request, "Match score updated. No winner determined yet.")
+                return HttpResponseRedirect(reverse('matches:match_detail', kwargs={'pk': match.pk}))
+        
+        messages.error(request, "Error updating match score. Please check the form.")
+        return render(request, 'matches/match_detail.html', {
+            'match': match,
+            'score_form': form,
+            'is_referee': request.user.is_referee(),
+            'is_match_referee': match.referee and match.referee.user == request.user
+        })
+    
+class RecordPointView(LoginRequiredMixin, View):
+    """Live scoring endpoint: GET returns the current score, POST adds one point
+
+    The point is posted as ``winner=1`` or ``winner=2``. Each point is one
+    appended event plus a cached state update, so the cost does not grow
+    with the length of the match.
+    """
+    def get(self, request, *args, **kwargs):
+        match = get_object_or_404(Match.objects.select_related('tournament'), pk=kwargs['pk'])
+        if not match.is_visible_to(request.user):
+            raise Http404("Match not found")
+        return JsonResponse(load_state(match).as_json())
+    
+    def post(self, request, *args, **kwargs):
+        with transaction.atomic():
+            match = get_object_or_404(Match.objects.select_for_update(), pk=kwargs['pk'])
             
-            return HttpResponseRedirect(reverse('matches:match_detail', kwargs={'pk': match.pk}))
-        else:
-            messages.error(request, "Error updating match score. Please check the form.")
-            return render(request, 'matches/match_detail.html', {
-                'match': match,
-                'score_form': form,
-                'is_referee': request.user.is_referee(),
-                'is_match_referee': match.referee and match.referee.user == request.user
-            })
-    
-    def advance_winner_to_next_round(self, match, winner):
-        """Create or update next round match with the winner"""
-        tournament = match.tournament
-        next_round = match.round_number + 1
-        
-        # Find potential matches in the next round
-        # Logic: In a bracket, match X in round N feeds into match X//2 in round N+1
-        next_matches = Match.objects.filter(
-            tournament=tournament,
-            round_number=next_round
-        ).order_by('id')
-        
-        # Get the match index in current round (0-based)
-        current_round_matches = list(Match.objects.filter(
-            tournament=tournament,
-            round_number=match.round_number
-        ).order_by('id'))
-        
-        match_index = current_round_matches.index(match)
-        next_match_index = match_index // 2
+            # Referee rows are keyed by their user, so no join is needed here
+            if match.referee_id is None or match.referee_id != request.user.id:
+                return JsonResponse({'error': "Only the assigned referee can record points."}, status=403)
+            
+            if match.player1_id is None or match.player2_id is None:
+                return JsonResponse({'error': "Both players must be known before points can be recorded."}, status=400)
+            
+            if match.is_completed() or match.is_canceled():
+                return JsonResponse({'error': "Cannot record points for completed or cancelled matches."}, status=400)
+            
+            try:
+                state, winner = match.record_point(int(request.POST.get('winner', 0)), recorded_by=request.user)
+            except ValueError as e:
+                return JsonResponse({'error': str(e)}, status=400)
+            
+            score_line = match.score.line if winner else None
+            transaction.on_commit(lambda: publish_match(match, score_line, live=state.as_json()))
+            if winner:
+                event_bus.match_result_recorded(match)
         
-        # If the next round match already exists, update it
-        if next_match_index < len(next_matches):
-            next_match = next_matches[next_match_index]
+        return JsonResponse(state.as_json())
+
+async def aget_visible_match(request, pk):
+    """The match, or Http404 if it does not exist or the user may not see it"""
+    try:
+        match = await Match.objects.select_related('tournament').aget(pk=pk)
+    except Match.DoesNotExist:
+        raise Http404("Match not found")
+    if not match.is_visible_to(await request.auser()):
+        raise Http404("Match not found")
+    return match
+
+class MatchStreamView(View):
+    """Server-Sent Events stream of one match's score and status
+
+    Served asynchronously under ASGI. The first event is the current
+    state, later ones arrive as results are recorded. Under WSGI a stream
+    would tie up a worker thread, so the client is told (with a 204, which
+    EventSource does not retry) to do without.
+    """
+    async def get(self, request, *args, **kwargs):
+        if not is_async_request(request):
+            return HttpResponse(status=204)
+        match = await aget_visible_match(request, kwargs['pk'])
+        packed = await MatchScore.objects.filter(match=match).values_list(*MatchScore.PACKED_FIELDS).afirst()
+        score_line = ScoreLine(*packed) if packed else None
+        
+        response = StreamingHttpResponse(
+            event_stream(f'match:{match.pk}', initial=match_event(match, score_line)),
+            content_type='text/event-stream'
+        )
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+class MatchSnapshotView(LongPollSnapshotView):
+    """Versioned JSON snapshot of one match, see ``LongPollSnapshotView``"""
+    etag_prefix = 'match-'
+    
+    async def get(self, request, *args, **kwargs):
+        await aget_visible_match(request, kwargs['pk'])
+        return await super().get(request, *args, **kwargs)
+    
+    def get_channel(self):
+        return f"match:{self.kwargs['pk']}"
+    
+    async def get_version(self):
+        version = await Match.objects.filter(pk=self.kwargs['pk']).values_list('version', flat=True).afirst()
+        if version is None:
+            raise Http404("Match not found")
+        return version
+    
+    async def get_snapshot(self):
+        match = await Match.objects.aget(pk=self.kwargs['pk'])
+        packed = await MatchScore.objects.filter(match=match).values_list(*MatchScore.PACKED_FIELDS).afirst()
+        live = None
+        if match.status == 'IN_PROGRESS':
+            live = (await sync_to_async(load_state)(match)).as_json()
+        return match.version, match_event(match, ScoreLine(*packed) if packed else None, live)
+
+class BatchScoreEntryView(LoginRequiredMixin, View):
+    """Lets a tournament desk enter many results from paper sheets at once
+
+    Every filled-in row is validated before anything is written. Scores,
+    statuses and advancement are then stored with bulk queries in one
+    transaction, and the players are notified in a single batch.
+    """
+    template_name = 'matches/batch_scores.html'
+    
+    def dispatch(self, request, *args, **kwargs):
+        self.tournament = get_object_or_404(Tournament, pk=kwargs['tournament_id'])
+        user = request.user
+        if not user.is_authenticated or not (user.is_admin() and (user == self.tournament.organizer or user.is_superuser)):
+            messages.error(request, "Only the tournament organizer can enter results in bulk.")
+            return HttpResponseRedirect(reverse('tournaments:tournament_detail', kwargs={'pk': self.tournament.pk}))
+        return super().dispatch(request, *args, **kwargs)
+    
+    def get_open_matches(self):
+        return Match.objects.filter(
+            tournament=self.tournament,
+            status__in=['SCHEDULED', 'IN_PROGRESS'],
+            player1__isnull=False,
+            player2__isnull=False
+        ).select_related('player1', 'player2', 'score').order_by(*Match.BRACKET_ORDER)
+    
+    def get_rows(self, matches, data=None):
+        rows = []
+        for match in matches:
+            instance = getattr(match, 'score', None) or MatchScore(match=match)
+            rows.append((match, MatchScoreForm(data, instance=instance, prefix=f'match-{match.pk}')))
+        return rows
+    
+    def render_rows(self, request, rows):
+        return render(request, self.template_name, {
+            'tournament': self.tournament,
+            'rows': rows,
+        })
+    
+    def get(self, request, *args, **kwargs):
+        return self.render_rows(request, self.get_rows(self.get_open_matches()))
+    
+    def post(self, request, *args, **kwargs):
+        with transaction.atomic():
+            matches = self.get_open_matches().select_for_update(of=('self',))
+            rows = self.get_rows(matches, request.POST)
+            
+            # Rows left untouched on the sheet are skipped
+            submitted = [(match, form) for match, form in rows if form.has_changed()]
+            if not submitted:
+                messages.info(request, "No results were entered.")
+                return HttpResponseRedirect(reverse('matches:batch_scores', kwargs={'tournament_id': self.tournament.pk}))
+            
+            # Validate every row before writing any of them
+            if not all([form.is_valid() for _, form in submitted]):
+                messages.error(request, "Some results could not be saved. Please check the highlighted rows.")
+                return self.render_rows(request, rows)
             
-            # Determine if this winner should be player1 or player2
-            if match_index % 2 == 0:  # Even index goes to player1
-                next_match.player1 = winner
-            else:  # Odd index goes to player2
-                next_match.player2 = winner
+            new_scores, changed_scores, completed = [], [], []
+            now = timezone.now()
+            for match, form in submitted:
+                score = form.save(commit=False)
+                score.winner = score.determine_winner()
+                (changed_scores if score.pk else new_scores).append(score)
                 
-            next_match.save()
+                match.status = 'COMPLETED' if score.winner else 'IN_PROGRESS'
+                match.updated_at = now
+                match.version += 1
+                if score.winner:
+                    completed.append(match)
             
-        # If the next round match doesn't exist yet but we have both winners, create it
-        elif next_match_index >= len(next_matches):
-            # Find the paired match
-            paired_index = match_index + 1 if match_index % 2 == 0 else match_index - 1
+            MatchScore.objects.bulk_create(new_scores)
+            MatchScore.objects.bulk_update(changed_scores, MatchScoreForm.Meta.fields + ['winner'] + MatchScore.PACKED_FIELDS)
+            Match.objects.bulk_update([match for match, _ in submitted], ['status', 'updated_at', 'version'])
+            Tournament.bump_version(self.tournament.pk)
+            Match.advance_many([(match, match.score.winner_id) for match in completed])
             
-            # Check if the paired match exists and is completed
-            paired_matches = [m for m in current_round_matches if current_round_matches.index(m) == paired_index]
+            # Round-robin tables only need re-numbering once for the whole sheet
+            if self.tournament.tournament_type == 'ROUND_ROBIN' and completed:
+                for match in completed:
+                    match.update_standings(match.score)
+                Standing.rerank(self.tournament.pk)
             
-            if paired_matches and hasattr(paired_matches[0], 'score') and paired_matches[0].score.winner:
-                paired_match = paired_matches[0]
-                paired_winner = paired_match.score.winner
-                
-                # Create the next round match
-                if match_index % 2 == 0:
-                    player1, player2 = winner, paired_winner
-                else:
-                    player1, player2 = paired_winner, winner
-                
-                new_match = Match.objects.create(
-                    tournament=tournament,
-                    player1=player1,
-                    player2=player2,
-                    round_number=next_round,
-                    status='SCHEDULED'
-                )
-                
-                # Create empty score object
-                MatchScore.objects.create(match=new_match)
+            transaction.on_commit(lambda: [publish_match(match, match.score.line) for match, _ in submitted])
+            if completed:
+                event_bus.match_results_recorded(completed)
+        
+        messages.success(request, f"{len(submitted)} results recorded, {len(completed)} matches completed.")
+        return HttpResponseRedirect(reverse('tournaments:tournament_matches', kwargs={'tournament_id': self.tournament.pk}))
 
 class PlayerFilterView(LoginRequiredMixin, RefereeRequiredMixin, ListView):
     model = get_user_model()
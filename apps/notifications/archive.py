@@ -0,0 +1,60 @@
+"""Moving old read notifications out of the main table
+
+``archive_read_notifications`` works in short transactions of at most
+``batch_size`` rows: it reads the oldest read rows, packs them into one
+``NotificationArchive`` per user, and deletes them by primary key. Writers
+are only ever blocked for one batch, and an interrupted run simply
+resumes where it stopped.
+"""
+import time
+from datetime import timedelta
+from itertools import groupby
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Notification, NotificationArchive, render_message
+
+
+def archive_read_notifications(older_than=timedelta(days=90), batch_size=1000, pause=0.0, limit=None):
+    """Archive read notifications created before ``older_than`` ago
+
+    Returns ``(archived, batches)``. ``pause`` seconds are slept between
+    batches to leave room for other writers, and ``limit`` caps the rows
+    handled in one run.
+    """
+    cutoff = timezone.now() - older_than
+    archived = batches = 0
+
+    while limit is None or archived < limit:
+        size = batch_size if limit is None else min(batch_size, limit - archived)
+        with transaction.atomic():
+            rows = list(
+                Notification.objects.filter(is_read=True, created_at__lt=cutoff)
+                .order_by('created_at', 'id')
+                .values_list('user_id', *NotificationArchive.FIELDS, 'message_key', 'params')[:size]
+            )
+            if not rows:
+                break
+
+            # The archive keeps the text itself, not the key it was built from
+            rows = [
+                (user_id, pk, render_message(message_key, params, message), *rest)
+                for user_id, pk, message, *rest, message_key, params in rows
+            ]
+
+            rows.sort(key=lambda row: row[0])
+            NotificationArchive.objects.bulk_create([
+                NotificationArchive.pack(user_id, [row[1:] for row in user_rows])
+                for user_id, user_rows in groupby(rows, key=lambda row: row[0])
+            ])
+            Notification.objects.filter(id__in=[row[1] for row in rows]).delete()
+
+        archived += len(rows)
+        batches += 1
+        if len(rows) < size:
+            break
+        if pause:
+            time.sleep(pause)
+
+    return archived, batches
@@ -1,10 +1,12 @@
 def notification_count(request):
-    """Add unread notification count to context for all templates"""
+    """Add unread notification count to context for all templates
+    
+    The count is kept on the user row, which the authentication middleware
+    has already loaded, so the badge costs no query.
+    """
     count = 0
     if request.user.is_authenticated:
-        # Import here to avoid circular imports
-        from apps.notifications.models import Notification
-        count = Notification.objects.filter(user=request.user, is_read=False).count()
+        count = request.user.unread_notifications
     
     return {
         'unread_notification_count': count
@@ -0,0 +1,95 @@
+"""Coalescing of registration events into periodic summaries
+
+Users who set ``notification_digest`` do not get a notification and an
+email for every registration to their tournaments. ``DigestNotifier``
+stores a ``DigestEntry`` instead, and ``flush_digests`` later turns each
+group of entries into one ``notification_digest`` outbox event, which the
+notification worker delivers like any other.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Min, Max
+from django.utils import timezone
+
+from .models import DigestEntry
+
+# Events that can be held back, and the way their summary reads
+DIGEST_EVENTS = {
+    'player_registered': "{players} registered for tournament '{tournament}'",
+    'registration_needs_approval': "ACTION REQUIRED: {players} requested to join '{tournament}'",
+}
+
+
+def wants_digest(user, event_type):
+    return event_type in DIGEST_EVENTS and bool(user) and user.notification_digest
+
+
+class Digest:
+    """The held-back events of one user, type and tournament"""
+
+    def __init__(self, user, event_type, tournament, players):
+        self.user = user
+        self.event_type = event_type
+        self.tournament = tournament
+        self.players = players
+
+    @property
+    def requires_action(self):
+        return self.event_type == 'registration_needs_approval'
+
+    def player_names(self, limit=3):
+        """``"Ann Lee, Bo Park and 4 others"``, short enough for a notification"""
+        names = [player.get_full_name() or player.username for player in self.players]
+        if len(names) == 1:
+            return names[0]
+        if len(names) <= limit:
+            return f"{', '.join(names[:-1])} and {names[-1]}"
+        return f"{', '.join(names[:limit])} and {len(names) - limit} others"
+
+    @property
+    def message(self):
+        return DIGEST_EVENTS[self.event_type].format(players=self.player_names(), tournament=self.tournament.name)
+
+
+def add_entry(user, event_type, tournament, player):
+    return DigestEntry.objects.create(user=user, event_type=event_type, tournament=tournament, player=player)
+
+
+def flush_digests(force=False):
+    """Queue every group whose window has closed (every group if ``force``)
+
+    Each digest is recorded in the outbox in the transaction that deletes
+    its entries, so no email is sent while the entries are locked and a
+    failed delivery is retried by the worker. Returns the number of
+    digests queued.
+    """
+    from core.observers import event_bus
+
+    groups = DigestEntry.objects.values('user', 'event_type', 'tournament').annotate(
+        opened_at=Min('created_at'), last_id=Max('id')
+    ).order_by()
+    if not force:
+        cutoff = timezone.now() - timedelta(seconds=settings.NOTIFICATION_DIGEST_WINDOW)
+        groups = groups.filter(opened_at__lte=cutoff)
+
+    queued = 0
+    for group in list(groups):
+        with transaction.atomic():
+            # Entries added after the grouping query wait for the next window
+            entries = list(
+                DigestEntry.objects.select_for_update(skip_locked=True)
+                .select_related('user', 'tournament', 'player')
+                .filter(
+                    user_id=group['user'], event_type=group['event_type'],
+                    tournament_id=group['tournament'], id__lte=group['last_id']
+                )
+            )
+            if not entries:
+                continue
+            digest = Digest(entries[0].user, group['event_type'], entries[0].tournament, [entry.player for entry in entries])
+            event_bus.digest_ready(digest)
+            DigestEntry.objects.filter(id__in=[entry.id for entry in entries]).delete()
+        queued += 1
+    return queued
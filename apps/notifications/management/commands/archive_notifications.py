@@ -0,0 +1,24 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from apps.notifications.archive import archive_read_notifications
+
+
+class Command(BaseCommand):
+    help = "Move read notifications older than a number of days into the archive table"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=90, help="Archive read notifications older than this")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Rows moved per transaction")
+        parser.add_argument('--pause', type=float, default=0.1, help="Seconds to sleep between batches")
+        parser.add_argument('--limit', type=int, default=None, help="Stop after this many rows")
+
+    def handle(self, *args, **options):
+        archived, batches = archive_read_notifications(
+            older_than=timedelta(days=options['days']),
+            batch_size=options['batch_size'],
+            pause=options['pause'],
+            limit=options['limit'],
+        )
+        self.stdout.write(f"{archived} notifications archived in {batches} batches")
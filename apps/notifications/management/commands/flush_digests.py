@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from apps.notifications.digest import flush_digests
+
+
+class Command(BaseCommand):
+    help = "Queue notification digests whose window has closed for the notification worker"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help="Queue every pending digest, even if its window is still open")
+
+    def handle(self, *args, **options):
+        queued = flush_digests(force=options['all'])
+        self.stdout.write(f"{queued} digests queued")
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:46
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def count_unread(apps, schema_editor):
+    # Same as Notification.recount_unread, which historical models lack
+    User = apps.get_model('accounts', 'User')
+    Notification = apps.get_model('notifications', 'Notification')
+    unread = Notification.objects.filter(user=models.OuterRef('pk'), is_read=False).values('user').annotate(
+        count=models.Count('id')
+    ).values('count')
+    User.objects.update(unread_notifications=Coalesce(models.Subquery(unread), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_user_unread_notifications'),
+        ('notifications', '0004_digestentry'),
+    ]
+
+    operations = [
+        migrations.RunPython(count_unread, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:00
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def move_queued_jobs(apps, schema_editor):
+    # Jobs the old queue had not delivered yet become outbox events
+    NotificationJob = apps.get_model('notifications', 'NotificationJob')
+    OutboxEvent = apps.get_model('notifications', 'OutboxEvent')
+    OutboxEvent.objects.bulk_create([
+        OutboxEvent(event_type=job.event_type, payload=job.payload, created_at=job.created_at)
+        for job in NotificationJob.objects.filter(status__in=['PENDING', 'RUNNING']).order_by('id')
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0007_notificationarchive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConsumerCursor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('consumer', models.CharField(max_length=50, unique=True)),
+                ('last_event_id', models.BigIntegerField(default=0)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('retry_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='OutboxEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_type', models.CharField(max_length=50)),
+                ('payload', models.JSONField(default=dict)),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+        migrations.RunPython(move_queued_jobs, migrations.RunPython.noop),
+        migrations.DeleteModel(
+            name='NotificationJob',
+        ),
+    ]
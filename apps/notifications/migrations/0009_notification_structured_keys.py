@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def link_existing_rows(apps, schema_editor):
+    # Tournament notifications already carry the tournament id in related_id
+    Notification = apps.get_model('notifications', 'Notification')
+    Tournament = apps.get_model('tournaments', 'Tournament')
+    existing = Notification.objects.filter(related_id__in=Tournament.objects.values('id'))
+    existing.filter(notification_type='REGISTRATION_APPROVAL').update(
+        kind='registration_needs_approval', tournament_id=models.F('related_id')
+    )
+    existing.filter(notification_type='TOURNAMENT').update(tournament_id=models.F('related_id'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0008_outbox'),
+        ('tournaments', '0008_tournament_version'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='kind',
+            field=models.CharField(blank=True, choices=[('tournament_status_change', 'Tournament status changed'), ('player_registered', 'Player registered'), ('registration_needs_approval', 'Registration needs approval'), ('registration_approved', 'Registration approved'), ('registration_rejected', 'Registration rejected'), ('match_scheduled', 'Match scheduled'), ('match_result', 'Match result')], max_length=50),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='subject_user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='tournament',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='tournaments.tournament'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', 'kind', 'tournament', 'subject_user'], name='notification_lookup'),
+        ),
+        migrations.RunPython(link_existing_rows, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,93 @@
-from django.db import models
+import json
+import zlib
+from collections import Counter, defaultdict
+from functools import lru_cache
+
+from django.db import models, transaction
+from django.db.models import Count, F
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
 from apps.accounts.models import User
 
+
+def adjust_unread_counts(deltas, chunk_size=1000):
+    """Apply ``{user_id: change}`` to the users' unread counters
+
+    Users with the same change share one UPDATE, so a fan-out that gives
+    thousands of users one new notification each costs a statement per
+    ``chunk_size`` users.
+    """
+    by_delta = defaultdict(list)
+    for user_id, delta in deltas.items():
+        if delta:
+            by_delta[delta].append(user_id)
+    
+    for delta, user_ids in by_delta.items():
+        for start in range(0, len(user_ids), chunk_size):
+            User.objects.filter(pk__in=user_ids[start:start + chunk_size]).update(
+                unread_notifications=Greatest(F('unread_notifications') + delta, 0)
+            )
+
+
+@lru_cache(maxsize=4096)
+def _format_message(message_key, params):
+    return Notification.MESSAGES[message_key].format(**dict(params))
+
+
+def render_message(message_key, params, message=''):
+    """The text of a notification: ``MESSAGES[message_key]`` filled in from ``params``
+
+    Rows written without a key (or with one no longer known) keep their
+    text in ``message``. A fan-out gives thousands of rows the same key and
+    parameters, so each distinct text is formatted once per process.
+    """
+    if not message_key:
+        return message
+    try:
+        return _format_message(message_key, tuple(sorted(params.items())))
+    except (KeyError, TypeError):
+        return message
+
+
+class NotificationQuerySet(models.QuerySet):
+    """Keeps ``User.unread_notifications`` right for bulk inserts, updates and deletes"""
+    
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        with transaction.atomic(using=self.db, savepoint=False):
+            created = super().bulk_create(objs, *args, **kwargs)
+            adjust_unread_counts(Counter(obj.user_id for obj in objs if not obj.is_read))
+        return created
+    
+    def _unread_by_user(self):
+        return dict(self.filter(is_read=False).values_list('user').annotate(count=Count('id')).order_by())
+    
+    def update(self, **kwargs):
+        if 'is_read' not in kwargs:
+            return super().update(**kwargs)
+        
+        with transaction.atomic(using=self.db, savepoint=False):
+            # Only rows whose read state actually changes move the counters
+            if kwargs['is_read']:
+                counts = self._unread_by_user()
+            else:
+                counts = dict(self.filter(is_read=True).values_list('user').annotate(count=Count('id')).order_by())
+            rows = super().update(**kwargs)
+            sign = -1 if kwargs['is_read'] else 1
+            adjust_unread_counts({user_id: sign * count for user_id, count in counts.items()})
+        return rows
+    
+    def delete(self):
+        with transaction.atomic(using=self.db, savepoint=False):
+            counts = self._unread_by_user()
+            deleted = super().delete()
+            adjust_unread_counts({user_id: -count for user_id, count in counts.items()})
+        return deleted
+    
+    delete.alters_data = True
+    delete.queryset_only = True
+
+
 class Notification(models.Model):
     """Model for storing user notifications"""
     NOTIFICATION_TYPES = [
@@ -10,17 +97,212 @@ class Notification(models.Model):
         ('SYSTEM', 'System'),
     ]
     
+    # The event a notification was written for
+    KINDS = [
+        ('tournament_status_change', 'Tournament status changed'),
+        ('player_registered', 'Player registered'),
+        ('registration_needs_approval', 'Registration needs approval'),
+        ('registration_approved', 'Registration approved'),
+        ('registration_rejected', 'Registration rejected'),
+        ('match_scheduled', 'Match scheduled'),
+        ('match_result', 'Match result'),
+    ]
+    
+    # Message texts by key, filled in from ``params`` when displayed
+    MESSAGES = {
+        'status_changed': "Tournament '{tournament}' status changed to {status}",
+        'registered': "You have successfully registered for tournament '{tournament}'",
+        'player_registered': "{player} has registered for tournament '{tournament}'",
+        'pending_approval': "Your registration for '{tournament}' is pending approval",
+        'approval_requested': "ACTION REQUIRED: {player} has requested to join '{tournament}'",
+        'approved': "Your registration for '{tournament}' has been approved",
+        'rejected': "Your registration for '{tournament}' has been rejected",
+        'match_scheduled': "You have a match scheduled in '{tournament}'",
+        'referee_assigned': "You are assigned to referee a match in '{tournament}'",
+        'match_won': "Congratulations! You won your match in '{tournament}'",
+        'match_lost': "Match result: You were defeated in '{tournament}'",
+    }
+    
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications')
-    message = models.CharField(max_length=255)
+    # Free text, for rows without a message_key (digests, older rows)
+    message = models.CharField(max_length=255, blank=True)
+    message_key = models.CharField(max_length=30, blank=True)
+    params = models.JSONField(default=dict, blank=True)
     notification_type = models.CharField(max_length=30, choices=NOTIFICATION_TYPES)
     related_id = models.IntegerField(null=True, blank=True)
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     requires_action = models.BooleanField(default=False)
     
+    # Typed references, so a notification can be found by what it is about
+    # rather than by its message text. Empty on rows written before they existed.
+    kind = models.CharField(max_length=50, choices=KINDS, blank=True)
+    tournament = models.ForeignKey(
+        'tournaments.Tournament', on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+    subject_user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    
+    objects = NotificationQuerySet.as_manager()
     
     class Meta:
         ordering = ['-created_at']
+        # Newest-first listing, all or unread only, walked by (created_at, id)
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='notification_user_recent'),
+            models.Index(fields=['user', 'is_read', '-created_at', '-id'], name='notification_user_unread'),
+            # Read rows by age, for archive_notifications
+            models.Index(fields=['is_read', 'created_at', 'id'], name='notification_read_age'),
+            # "This user's <kind> notification about <tournament> and <player>"
+            models.Index(fields=['user', 'kind', 'tournament', 'subject_user'], name='notification_lookup'),
+        ]
     
     def __str__(self):
-        return f"{self.notification_type} notification for {self.user.username}"
\ No newline at end of file
+        return f"{self.notification_type} notification for {self.user.username}"
+    
+    @property
+    def text(self):
+        return render_message(self.message_key, self.params, self.message)
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored read state, so save() knows whether it changed
+        instance._stored_is_read = instance.__dict__.get('is_read')
+        return instance
+    
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        stored = getattr(self, '_stored_is_read', None)
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+            update_fields = kwargs.get('update_fields')
+            if adding:
+                delta = 0 if self.is_read else 1
+            elif stored is None or (update_fields is not None and 'is_read' not in update_fields):
+                delta = 0
+            else:
+                delta = int(stored) - int(self.is_read)
+            adjust_unread_counts({self.user_id: delta})
+        self._stored_is_read = self.is_read
+    
+    def delete(self, *args, **kwargs):
+        with transaction.atomic(savepoint=False):
+            deleted = super().delete(*args, **kwargs)
+            if not self.is_read:
+                adjust_unread_counts({self.user_id: -1})
+        return deleted
+    
+    @classmethod
+    def recount_unread(cls, user_ids=None):
+        """Recompute the unread counters from the notification rows"""
+        users = User.objects.all() if user_ids is None else User.objects.filter(pk__in=user_ids)
+        unread = cls.objects.filter(user=models.OuterRef('pk'), is_read=False).values('user').annotate(
+            count=Count('id')
+        ).values('count')
+        return users.update(
+            unread_notifications=Coalesce(models.Subquery(unread), 0)
+        )
+
+
+class OutboxEvent(models.Model):
+    """A notification event, written in the same transaction as the change it reports
+
+    Rows are only ever appended. Each consumer (email, database, digest)
+    reads them in id order from its own ``ConsumerCursor``, so an event is
+    delivered once the change is committed and never lost if a process dies
+    before delivering it.
+    """
+    event_type = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+    
+    class Meta:
+        ordering = ['id']
+    
+    def __str__(self):
+        return f"{self.event_type} event #{self.pk}"
+
+
+class ConsumerCursor(models.Model):
+    """How far one consumer has got through the outbox
+
+    ``attempts`` counts failed tries at the event after ``last_event_id``,
+    which is retried with a growing delay and skipped after the dispatcher's
+    ``max_attempts``.
+    """
+    consumer = models.CharField(max_length=50, unique=True)
+    last_event_id = models.BigIntegerField(default=0)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    retry_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.consumer} at event #{self.last_event_id}"
+
+
+class DigestEntry(models.Model):
+    """One event held back for a user who receives digests
+
+    Entries are grouped by user, event type and tournament, and
+    ``flush_digests`` turns each group into a single notification and email
+    once its oldest entry is ``NOTIFICATION_DIGEST_WINDOW`` seconds old.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='digest_entries')
+    event_type = models.CharField(max_length=50)
+    tournament = models.ForeignKey('tournaments.Tournament', on_delete=models.CASCADE, related_name='+')
+    player = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['created_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.event_type} digest entry for {self.user.username}"
+
+
+class NotificationArchive(models.Model):
+    """Read notifications moved out of the main table, packed per user
+
+    Each row holds one user's notifications from one archiving batch as
+    zlib-compressed JSON, so old history costs a few bytes per notification
+    and stays out of the indexes used for the unread badge and the list.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notification_archives')
+    count = models.PositiveIntegerField()
+    oldest = models.DateTimeField()
+    newest = models.DateTimeField()
+    data = models.BinaryField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+    
+    # Notification fields kept in the archive, in order
+    FIELDS = ['id', 'message', 'notification_type', 'related_id', 'requires_action', 'created_at']
+    
+    class Meta:
+        ordering = ['-newest']
+        indexes = [
+            models.Index(fields=['user', '-newest']),
+        ]
+    
+    def __str__(self):
+        return f"{self.count} archived notifications for {self.user.username}"
+    
+    @classmethod
+    def pack(cls, user_id, rows):
+        """Build an (unsaved) archive from ``values_list(*FIELDS)`` rows of one user"""
+        created = [row[-1] for row in rows]
+        payload = [list(row[:-1]) + [row[-1].isoformat()] for row in rows]
+        return cls(
+            user_id=user_id,
+            count=len(rows),
+            oldest=min(created),
+            newest=max(created),
+            data=zlib.compress(json.dumps(payload, separators=(',', ':')).encode(), 9),
+        )
+    
+    def notifications(self):
+        """The archived notifications as dicts, oldest first"""
+        return [dict(zip(self.FIELDS, row)) for row in json.loads(zlib.decompress(bytes(self.data)))]
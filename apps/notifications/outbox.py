@@ -0,0 +1,301 @@
+"""Transactional outbox for notification events
+
+Views publish events on ``core.observers.event_bus``, whose
+``OutboxNotifier`` only calls ``record``: an ``OutboxEvent`` row holding the
+event type, the ids of the objects involved and their status at the time,
+inserted in the view's own transaction. If the change rolls back, so does the event; if it commits,
+the event is there even if the process dies straight after.
+
+``dispatch_outbox`` (run by the ``process_notifications`` worker) replays
+the events to every registered consumer in id order. Each consumer keeps
+its own cursor, so a slow or failing consumer holds up nobody else.
+A consumer's cursor is only claimed, not locked, while its batch runs, so
+a slow SMTP relay never keeps the database's write lock. Delivery is at
+least once for email, which a crash after sending but before the cursor
+is saved repeats, and exactly once for the database consumers.
+"""
+import logging
+import statistics
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from datetime import timedelta
+
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction, close_old_connections
+from django.utils import timezone
+
+from core.observers import TournamentNotificationSubject, EmailNotifier, DatabaseNotifier, DigestNotifier
+from .models import OutboxEvent, ConsumerCursor
+
+logger = logging.getLogger(__name__)
+
+# Objects an event may carry, stored as ``<name>_id`` in the payload
+EVENT_OBJECTS = ('tournament', 'player', 'match')
+
+# Objects whose status is part of the event, stored as ``<name>_status``.
+# Consumers see the status the event was about, not whatever the row holds
+# by the time the worker gets to it.
+EVENT_STATUSES = ('tournament', 'match')
+
+# Every consumer of the outbox, by the name its cursor is stored under
+CONSUMERS = {
+    'email': EmailNotifier(),
+    'database': DatabaseNotifier(),
+    'digest': DigestNotifier(),
+}
+
+# The consumers as one subject, passed to them as the event's source
+delivery = TournamentNotificationSubject()
+for observer in CONSUMERS.values():
+    delivery.attach(observer)
+
+
+def serialize_event(**kwargs):
+    payload = {}
+    for name in EVENT_OBJECTS:
+        if kwargs.get(name) is not None:
+            payload[f'{name}_id'] = kwargs[name].pk
+    for name in EVENT_STATUSES:
+        if kwargs.get(name) is not None:
+            payload[f'{name}_status'] = kwargs[name].status
+    if kwargs.get('matches') is not None:
+        payload['match_ids'] = [match.pk for match in kwargs['matches']]
+    if kwargs.get('digest') is not None:
+        digest = kwargs['digest']
+        payload['digest'] = {
+            'user_id': digest.user.pk,
+            'event_type': digest.event_type,
+            'tournament_id': digest.tournament.pk,
+            'player_ids': [player.pk for player in digest.players],
+        }
+    return payload
+
+
+def load_event(payload):
+    """Turn a stored payload back into the keyword arguments the notifiers expect
+
+    Raises ``ObjectDoesNotExist`` if an object the event is about has been
+    deleted since.
+    """
+    from apps.accounts.models import User
+    from apps.matches.models import Match
+    from apps.tournaments.models import Tournament
+
+    matches = Match.objects.select_related(
+        'tournament__organizer', 'player1', 'player2', 'referee__user', 'score__winner'
+    )
+    kwargs = {}
+    if 'tournament_id' in payload:
+        kwargs['tournament'] = Tournament.objects.select_related('organizer').get(pk=payload['tournament_id'])
+    if 'player_id' in payload:
+        kwargs['player'] = User.objects.get(pk=payload['player_id'])
+    if 'match_id' in payload:
+        kwargs['match'] = matches.get(pk=payload['match_id'])
+    if 'match_ids' in payload:
+        kwargs['matches'] = list(matches.filter(pk__in=payload['match_ids']))
+    for name in EVENT_STATUSES:
+        if f'{name}_status' in payload:
+            kwargs[name].status = payload[f'{name}_status']
+    if 'digest' in payload:
+        from .digest import Digest
+
+        data = payload['digest']
+        players = User.objects.in_bulk(data['player_ids'])
+        kwargs['digest'] = Digest(
+            User.objects.get(pk=data['user_id']),
+            data['event_type'],
+            Tournament.objects.get(pk=data['tournament_id']),
+            [players[player_id] for player_id in data['player_ids'] if player_id in players]
+        )
+    return kwargs
+
+
+def record(event_type, **kwargs):
+    return OutboxEvent.objects.create(event_type=event_type, payload=serialize_event(**kwargs))
+
+
+def pending_events(cursor, batch_size, gap_timeout):
+    """The next events for a cursor, stopping short of a recent gap in the ids
+
+    Ids are handed out when a row is inserted, not when it commits, so a
+    missing id may belong to a transaction that is still open. Events past
+    such a gap wait until the gap is ``gap_timeout`` old; by then the id
+    belonged to a transaction that rolled back.
+    """
+    events = list(OutboxEvent.objects.filter(id__gt=cursor.last_event_id).order_by('id')[:batch_size])
+    settled = timezone.now() - gap_timeout
+    previous = cursor.last_event_id
+    for index, event in enumerate(events):
+        if previous and event.id != previous + 1 and event.created_at > settled:
+            return events[:index]
+        previous = event.id
+    return events
+
+
+def claim(consumer, lease):
+    """Take the consumer's cursor for ``lease``, or return None if it is busy or backing off
+
+    The claim is a short transaction of its own. Until the lease runs out
+    (or the dispatcher releases it) other dispatchers leave the consumer
+    alone, without anyone holding a database lock while the batch runs.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        cursor = ConsumerCursor.objects.select_for_update(skip_locked=True).filter(consumer=consumer).first()
+        if cursor is None or (cursor.retry_at and cursor.retry_at > now):
+            return None
+        cursor.retry_at = now + lease
+        cursor.save(update_fields=['retry_at', 'updated_at'])
+    cursor.retry_at = None
+    return cursor
+
+
+def dispatch(consumer, batch_size=100, max_attempts=5, gap_timeout=timedelta(seconds=5),
+             lease=timedelta(minutes=5)):
+    """Deliver the next batch of events to one consumer
+
+    Returns the delivered events. Only one dispatcher works on a consumer
+    at a time; others find its cursor claimed and return straight away.
+
+    No transaction stays open across the batch. Each event is handled in
+    its own short transaction, and consumers that only write to the
+    database move their cursor inside it, so they see every event exactly
+    once. Email is sent when the batch is done, after those transactions
+    have committed and before the cursor is moved past it; if sending
+    fails, the cursor stays where it was and the batch is retried.
+    """
+    observer = CONSUMERS[consumer]
+    ConsumerCursor.objects.get_or_create(consumer=consumer)
+    cursor = claim(consumer, lease)
+    delivered = []
+    if cursor is None:
+        return delivered
+
+    # Email goes out over one connection for the whole batch
+    batching = hasattr(observer, 'batch')
+    start = cursor.last_event_id
+    try:
+        with observer.batch() if batching else nullcontext():
+            for event in pending_events(cursor, batch_size, gap_timeout):
+                try:
+                    with transaction.atomic():
+                        try:
+                            kwargs = load_event(event.payload)
+                        except ObjectDoesNotExist:
+                            # Deleted since; retrying will not bring it back
+                            logger.info("Consumer %s skipped event %s (%s): object deleted",
+                                        consumer, event.pk, event.event_type)
+                            kwargs = None
+                        if kwargs is not None:
+                            observer.update(delivery, event_type=event.event_type, **kwargs)
+                        if not batching:
+                            advance(cursor, event, error='')
+                            # Keeps the claim: retry_at is only written at the end
+                            cursor.save(update_fields=['last_event_id', 'attempts', 'last_error', 'updated_at'])
+                except Exception as e:
+                    cursor.attempts += 1
+                    cursor.last_error = str(e)
+                    if cursor.attempts < max_attempts:
+                        # Try this event again after 2, 4, 8... seconds
+                        logger.exception("Consumer %s failed on event %s (%s)", consumer, event.pk, event.event_type)
+                        cursor.retry_at = timezone.now() + timedelta(seconds=2 ** cursor.attempts)
+                        break
+                    logger.error("Consumer %s gave up on event %s after %s attempts", consumer, event.pk, cursor.attempts)
+                    advance(cursor, event)
+                else:
+                    if kwargs is not None:
+                        event.lag = timezone.now() - event.created_at
+                        delivered.append(event)
+                    advance(cursor, event, error='')
+    except Exception as e:
+        # The batch could not be sent, so none of it was delivered
+        cursor.attempts += 1
+        cursor.last_error = str(e)
+        if cursor.attempts < max_attempts:
+            logger.exception("Consumer %s failed to deliver events after %s", consumer, start)
+            cursor.last_event_id = start
+            cursor.retry_at = timezone.now() + timedelta(seconds=2 ** cursor.attempts)
+            delivered = []
+        else:
+            logger.error("Consumer %s gave up on events up to %s after %s attempts",
+                         consumer, cursor.last_event_id, cursor.attempts)
+            cursor.attempts = 0
+    finally:
+        # Also releases the claim, unless the consumer is backing off
+        cursor.save()
+
+    return delivered
+
+
+def advance(cursor, event, error=None):
+    """Move ``cursor`` (unsaved) past ``event``"""
+    cursor.last_event_id = event.pk
+    cursor.attempts = 0
+    cursor.retry_at = None
+    if error is not None:
+        cursor.last_error = error
+
+
+def _dispatch_in_thread(consumer, batch_size):
+    try:
+        return consumer, dispatch(consumer, batch_size)
+    finally:
+        close_old_connections()
+
+
+def dispatch_outbox(batch_size=100, workers=None):
+    """Run one batch for every consumer, in parallel threads when ``workers`` > 1
+
+    Returns ``{consumer: delivered events}``.
+    """
+    workers = len(CONSUMERS) if workers is None else workers
+    if workers <= 1:
+        return {consumer: dispatch(consumer, batch_size) for consumer in CONSUMERS}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return dict(pool.map(_dispatch_in_thread, CONSUMERS, [batch_size] * len(CONSUMERS)))
+
+
+def prune_outbox(keep=timedelta(days=1)):
+    """Delete events every consumer has passed, once they are ``keep`` old"""
+    cursors = list(ConsumerCursor.objects.filter(consumer__in=CONSUMERS).values_list('last_event_id', flat=True))
+    if len(cursors) < len(CONSUMERS):
+        return 0
+    deleted, _ = OutboxEvent.objects.filter(id__lte=min(cursors), created_at__lt=timezone.now() - keep).delete()
+    return deleted
+
+
+class DeliveryStats:
+    """Running counts and outbox lag (event creation to delivery) for a worker
+
+    Counts cover every batch added. Lag percentiles, in milliseconds, cover
+    the last ``window`` deliveries only, so a worker that runs for weeks
+    keeps a fixed amount of memory.
+    """
+
+    def __init__(self, window=10000):
+        self.deliveries = 0
+        self.events = 0
+        self.lags = deque(maxlen=window)
+
+    def add(self, results):
+        """Count one ``dispatch_outbox`` round, given as its delivered-event lists"""
+        delivered = [event for events in results for event in events]
+        self.deliveries += len(delivered)
+        self.events += len({event.pk for event in delivered})
+        self.lags.extend(event.lag.total_seconds() * 1000 for event in delivered)
+
+    def summary(self):
+        lags = sorted(self.lags)
+        if not lags:
+            p50 = p95 = 0
+        elif len(lags) == 1:
+            p50 = p95 = lags[0]
+        else:
+            p50, p95 = statistics.median(lags), statistics.quantiles(lags, n=20)[-1]
+        return {
+            'deliveries': self.deliveries,
+            'events': self.events,
+            'lag_p50': p50,
+            'lag_p95': p95,
+        }
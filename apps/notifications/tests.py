@@ -0,0 +1,673 @@
+import math
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.mail import get_connection
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.test import TestCase, TransactionTestCase, RequestFactory, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.tournaments.models import Tournament
+from apps.notifications.models import Notification, OutboxEvent, ConsumerCursor, DigestEntry, NotificationArchive
+from apps.notifications.archive import archive_read_notifications
+from apps.notifications.digest import flush_digests
+from apps.notifications.context_processors import notification_count
+from apps.notifications.outbox import DeliveryStats, dispatch, dispatch_outbox, prune_outbox
+from apps.matches.models import Match, MatchScore
+from core.observers import TournamentNotificationSubject, OutboxNotifier, DatabaseNotifier, EmailNotifier, compiled_template, context_fingerprint
+
+User = get_user_model()
+
+class OutboxTest(TestCase):
+    def setUp(self):
+        self.organizer = User.objects.create_user(username='organizer', email='organizer@example.com', password='testpass')
+        self.tournament = Tournament.objects.create(
+            name='Queued Open',
+            organizer=self.organizer,
+            start_date=timezone.now().date(),
+            end_date=timezone.now().date() + timedelta(days=5),
+            status='IN_PROGRESS'
+        )
+        self.players = [User.objects.create(username=f'player{i}', email=f'player{i}@example.com') for i in range(128)]
+        self.tournament.participants.add(*self.players)
+        
+        self.notifier = TournamentNotificationSubject()
+        self.notifier.attach(OutboxNotifier())
+
+    def test_record_only_stores_ids_and_status(self):
+        with self.assertNumQueries(1):
+            self.notifier.tournament_status_changed(self.tournament)
+        
+        event = OutboxEvent.objects.get()
+        self.assertEqual(event.event_type, 'tournament_status_change')
+        self.assertEqual(event.payload, {'tournament_id': self.tournament.id, 'tournament_status': 'IN_PROGRESS'})
+        self.assertFalse(Notification.objects.exists())
+
+    def test_each_event_keeps_its_own_status(self):
+        self.notifier.tournament_status_changed(self.tournament)
+        self.tournament.status = 'COMPLETED'
+        self.tournament.save()
+        self.notifier.tournament_status_changed(self.tournament)
+        
+        with patch('core.observers.EmailNotifier._send_email'):
+            dispatch_outbox(workers=1)
+        
+        statuses = Notification.objects.filter(user=self.organizer).order_by('id').values_list('params', flat=True)
+        self.assertEqual([params['status'] for params in statuses], ['In Progress', 'Completed'])
+
+    def test_deleted_objects_are_skipped(self):
+        self.notifier.player_registered(self.tournament, self.players[0])
+        self.notifier.player_registered(self.tournament, self.players[1])
+        second = OutboxEvent.objects.last()
+        self.players[0].delete()
+        
+        with patch('core.observers.DatabaseNotifier.update') as update:
+            self.assertEqual(dispatch('database'), [second])
+        self.assertEqual(update.call_count, 1)
+        cursor = ConsumerCursor.objects.get(consumer='database')
+        self.assertEqual((cursor.last_event_id, cursor.attempts, cursor.last_error), (second.pk, 0, ''))
+
+    def test_event_rolls_back_with_the_change(self):
+        try:
+            with transaction.atomic():
+                self.notifier.tournament_created(self.tournament)
+                raise RuntimeError("form failed")
+        except RuntimeError:
+            pass
+        self.assertFalse(OutboxEvent.objects.exists())
+
+    def test_dispatcher_delivers_to_every_consumer(self):
+        self.notifier.tournament_status_changed(self.tournament)
+        
+        with patch('core.observers.EmailNotifier._send_email') as send_email:
+            results = dispatch_outbox(workers=1)
+        
+        event = OutboxEvent.objects.get()
+        self.assertEqual({consumer: [e.pk for e in events] for consumer, events in results.items()},
+                         {'email': [event.pk], 'database': [event.pk], 'digest': [event.pk]})
+        self.assertEqual(Notification.objects.count(), 129)
+        self.assertTrue(send_email.called)
+        self.assertEqual(set(ConsumerCursor.objects.values_list('last_event_id', flat=True)), {event.pk})
+        
+        # Nothing is delivered twice
+        self.assertEqual(dispatch_outbox(workers=1), {'email': [], 'database': [], 'digest': []})
+
+    def test_events_are_delivered_in_order_in_batches(self):
+        for player in self.players[:5]:
+            self.notifier.player_registered(self.tournament, player)
+        
+        with patch('core.observers.DatabaseNotifier.update') as update:
+            self.assertEqual(len(dispatch('database', batch_size=3)), 3)
+            self.assertEqual(len(dispatch('database', batch_size=3)), 2)
+        self.assertEqual([call.kwargs['player'] for call in update.call_args_list], self.players[:5])
+
+    def test_failures_are_retried_then_skipped(self):
+        self.notifier.player_registered(self.tournament, self.players[0])
+        self.notifier.player_registered(self.tournament, self.players[1])
+        first, second = OutboxEvent.objects.all()
+        
+        with patch('core.observers.DatabaseNotifier.update', side_effect=[RuntimeError("database down")] * 2 + [None]):
+            self.assertEqual(dispatch('database', max_attempts=2), [])
+            cursor = ConsumerCursor.objects.get(consumer='database')
+            self.assertEqual((cursor.last_event_id, cursor.attempts, cursor.last_error), (0, 1, "database down"))
+            
+            # Not tried again until the back-off has passed
+            self.assertEqual(dispatch('database', max_attempts=2), [])
+            ConsumerCursor.objects.update(retry_at=timezone.now())
+            delivered = dispatch('database', max_attempts=2)
+        
+        # The first event was given up on, the second still went through
+        self.assertEqual(delivered, [second])
+        cursor.refresh_from_db()
+        self.assertEqual((cursor.last_event_id, cursor.attempts), (second.pk, 0))
+
+    def test_failed_email_batch_is_retried(self):
+        self.notifier.player_registered(self.tournament, self.players[0])
+        self.notifier.player_registered(self.tournament, self.players[1])
+        
+        with patch('core.observers.get_connection') as connect:
+            connect.return_value.send_messages.side_effect = ConnectionRefusedError("relay down")
+            self.assertEqual(dispatch('email'), [])
+        cursor = ConsumerCursor.objects.get(consumer='email')
+        self.assertEqual((cursor.last_event_id, cursor.attempts, cursor.last_error), (0, 1, "relay down"))
+        self.assertIsNotNone(cursor.retry_at)
+        
+        # Once the relay is back the whole batch goes out
+        ConsumerCursor.objects.update(retry_at=timezone.now())
+        self.assertEqual(len(dispatch('email')), 2)
+        self.assertEqual(len(mail.outbox), 4)
+
+    def test_waits_at_a_recent_gap(self):
+        for player in self.players[:3]:
+            self.notifier.player_registered(self.tournament, player)
+        first, middle, last = OutboxEvent.objects.all()
+        
+        with patch('core.observers.DatabaseNotifier.update'):
+            self.assertEqual(dispatch('database', batch_size=1), [first])
+            # An id still missing may be a transaction that has not committed yet
+            middle.delete()
+            self.assertEqual(dispatch('database'), [])
+            self.assertEqual(dispatch('database', gap_timeout=timedelta(0)), [last])
+
+    def test_prune_keeps_events_a_consumer_still_needs(self):
+        self.notifier.tournament_created(self.tournament)
+        OutboxEvent.objects.update(created_at=timezone.now() - timedelta(days=2))
+        with patch('core.observers.EmailNotifier._send_email'):
+            dispatch('email')
+            dispatch('database')
+        self.assertEqual(prune_outbox(), 0)
+        dispatch('digest')
+        self.assertEqual(prune_outbox(), 1)
+
+    def test_command_drains_outbox_and_reports_lag(self):
+        for player in self.players[:3]:
+            self.notifier.player_registered(self.tournament, player)
+        
+        out = StringIO()
+        with patch('core.observers.EmailNotifier._send_email'):
+            call_command('process_notifications', '--once', '--workers', '1', stdout=out)
+        
+        self.assertIn("3 events dispatched, 9 consumer deliveries", out.getvalue())
+        self.assertIn("Outbox lag p50", out.getvalue())
+        self.assertEqual(Notification.objects.count(), 6)
+
+    def test_stats_keep_a_bounded_lag_window(self):
+        stats = DeliveryStats(window=4)
+        for lag in range(10):
+            event = OutboxEvent(pk=lag + 1)
+            event.lag = timedelta(milliseconds=lag)
+            stats.add([[event], [event]])
+        
+        summary = stats.summary()
+        self.assertEqual((summary['events'], summary['deliveries']), (10, 20))
+        self.assertEqual(len(stats.lags), 4)
+        self.assertEqual(summary['lag_p50'], 8.5)
+
+class DatabaseFanOutTest(TestCase):
+    def setUp(self):
+        self.organizer = User.objects.create_user(username='organizer', email='organizer@example.com', password='testpass')
+        self.tournament = Tournament.objects.create(
+            name='League',
+            organizer=self.organizer,
+            start_date=timezone.now().date(),
+            end_date=timezone.now().date() + timedelta(days=30),
+            status='IN_PROGRESS'
+        )
+        User.objects.bulk_create([User(username=f'member{i}', email=f'member{i}@example.com') for i in range(2500)])
+        self.tournament.participants.add(*User.objects.filter(username__startswith='member'))
+        
+        self.notifier = TournamentNotificationSubject()
+        self.notifier.attach(DatabaseNotifier())
+
+    def test_status_change_is_written_in_batches(self):
+        # One read of the participant ids, then per batch of recipients one
+        # insert (split further where the backend caps the parameters per
+        # statement) and one update of their unread counters
+        fields = [field for field in Notification._meta.concrete_fields if not field.primary_key]
+        per_insert = connection.ops.bulk_batch_size(fields, [None] * DatabaseNotifier.batch_size) or DatabaseNotifier.batch_size
+        inserts = sum(math.ceil(size / per_insert) for size in (1000, 1000, 501))
+        with self.assertNumQueries(1 + inserts + 3):
+            self.notifier.tournament_status_changed(self.tournament)
+        
+        self.assertEqual(Notification.objects.count(), 2501)
+        # Rows carry the message key and its parameters, not the formatted text
+        self.assertEqual(list(Notification.objects.values_list('message', 'message_key', 'params').order_by().distinct()),
+                         [('', 'status_changed', {'tournament': self.tournament.name, 'status': self.tournament.get_status_display()})])
+        self.assertTrue(Notification.objects.filter(user=self.organizer, related_id=self.tournament.id).exists())
+
+
+class EmailBatchTest(TestCase):
+    def setUp(self):
+        self.organizer = User.objects.create_user(username='organizer', email='organizer@example.com', password='testpass')
+        self.tournament = Tournament.objects.create(
+            name='Results Day',
+            organizer=self.organizer,
+            start_date=timezone.now().date(),
+            end_date=timezone.now().date() + timedelta(days=1),
+            status='IN_PROGRESS'
+        )
+        players = [User.objects.create(username=f'player{i}', email=f'player{i}@example.com') for i in range(8)]
+        self.matches = []
+        for player1, player2 in zip(players[::2], players[1::2]):
+            match = Match.objects.create(tournament=self.tournament, player1=player1, player2=player2, round_number=1, status='COMPLETED')
+            MatchScore.objects.create(match=match, player1_set1=6, player2_set1=3, player1_set2=6, player2_set2=4, winner=player1)
+            self.matches.append(match)
+        
+        self.notifier = TournamentNotificationSubject()
+        self.notifier.attach(EmailNotifier())
+
+    def test_batch_of_results_uses_one_connection(self):
+        with patch('core.observers.get_connection', wraps=get_connection) as connect:
+            self.notifier.match_results_recorded(self.matches)
+        
+        self.assertEqual(connect.call_count, 1)
+        # Each result still gets its winner, loser and organizer emails
+        self.assertEqual(len(mail.outbox), 3 * len(self.matches))
+        self.assertEqual(mail.outbox[0].to, ['player0@example.com'])
+        self.assertIn('6-3', mail.outbox[0].body)
+
+    def test_nested_batches_deliver_once(self):
+        email_notifier = self.notifier._observers[0]
+        with patch('core.observers.get_connection', wraps=get_connection) as connect:
+            with email_notifier.batch():
+                for match in self.matches:
+                    self.notifier.match_result_recorded(match)
+                self.assertEqual(len(mail.outbox), 0)
+        
+        self.assertEqual(connect.call_count, 1)
+        self.assertEqual(len(mail.outbox), 3 * len(self.matches))
+
+    def test_each_variant_is_rendered_once_per_batch(self):
+        email_notifier = self.notifier._observers[0]
+        match = self.matches[0]
+        with patch('core.observers.compiled_template', wraps=compiled_template) as load:
+            with email_notifier.batch():
+                self.notifier.match_result_recorded(match)
+                self.notifier.match_result_recorded(Match.objects.get(pk=match.pk))
+        
+        # Winner, loser and organizer texts, rendered once however often they are sent
+        self.assertEqual(load.call_count, 3)
+        self.assertEqual(len(mail.outbox), 6)
+        self.assertEqual(mail.outbox[0].body, mail.outbox[3].body)
+        self.assertNotEqual(mail.outbox[0].body, mail.outbox[1].body)
+
+    def test_context_fingerprint(self):
+        match = self.matches[0]
+        same = Match.objects.get(pk=match.pk)
+        self.assertEqual(
+            context_fingerprint({'match': match, 'is_winner': True}),
+            context_fingerprint({'is_winner': True, 'match': same})
+        )
+        self.assertNotEqual(
+            context_fingerprint({'match': match, 'is_winner': True}),
+            context_fingerprint({'match': match, 'is_winner': False})
+        )
+
+
+class NotificationDigestTest(TestCase):
+    def setUp(self):
+        self.organizer = User.objects.create_user(
+            username='organizer', email='organizer@example.com', password='testpass', notification_digest=True
+        )
+        self.tournament = Tournament.objects.create(
+            name='Rush Open',
+            organizer=self.organizer,
+            start_date=timezone.now().date(),
+            end_date=timezone.now().date() + timedelta(days=5),
+            status='REGISTRATION'
+        )
+        self.players = [
+            User.objects.create(username=f'player{i}', email=f'player{i}@example.com', first_name='Player', last_name=str(i))
+            for i in range(20)
+        ]
+        
+        self.notifier = TournamentNotificationSubject()
+        self.notifier.attach(OutboxNotifier())
+        for player in self.players:
+            self.notifier.player_registration_needs_approval(self.tournament, player)
+        dispatch_outbox(workers=1)
+
+    def test_events_are_held_back_for_the_organizer(self):
+        self.assertEqual(DigestEntry.objects.filter(user=self.organizer).count(), 20)
+        self.assertFalse(Notification.objects.filter(user=self.organizer).exists())
+        self.assertFalse([email for email in mail.outbox if 'organizer@example.com' in email.to])
+        # Players still hear about their own registration straight away
+        self.assertEqual(Notification.objects.filter(user__in=self.players).count(), 20)
+
+    def test_flush_waits_for_the_window(self):
+        self.assertEqual(flush_digests(), 0)
+        self.assertEqual(DigestEntry.objects.count(), 20)
+
+    @override_settings(NOTIFICATION_DIGEST_WINDOW=0)
+    def test_flush_sends_one_summary(self):
+        mail.outbox.clear()
+        self.assertEqual(flush_digests(), 1)
+        # Queued with the entries' removal, sent by the worker
+        self.assertFalse(DigestEntry.objects.exists())
+        self.assertEqual(len(mail.outbox), 0)
+        dispatch_outbox(workers=1)
+        
+        notification = Notification.objects.get(user=self.organizer)
+        self.assertTrue(notification.requires_action)
+        self.assertEqual(notification.notification_type, 'REGISTRATION_APPROVAL')
+        self.assertEqual(notification.related_id, self.tournament.id)
+        self.assertIn('Player 0, Player 1, Player 2 and 17 others', notification.message)
+        
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['organizer@example.com'])
+        self.assertIn('player19@example.com', mail.outbox[0].body)
+        self.assertFalse(DigestEntry.objects.exists())
+
+    def test_command_flushes_open_digests(self):
+        out = StringIO()
+        call_command('flush_digests', '--all', stdout=out)
+        self.assertIn('1 digests queued', out.getvalue())
+        dispatch_outbox(workers=1)
+        self.assertEqual(Notification.objects.filter(user=self.organizer).count(), 1)
+
+
+class UnreadCounterTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='reader', email='reader@example.com', password='testpass')
+        self.other = User.objects.create_user(username='other', email='other@example.com', password='testpass')
+
+    def unread(self, user=None):
+        user = user or self.user
+        user.refresh_from_db(fields=['unread_notifications'])
+        return user.unread_notifications
+
+    def notify(self, user=None, **kwargs):
+        return Notification.objects.create(user=user or self.user, message='Hello', notification_type='SYSTEM', **kwargs)
+
+    def test_full_user_save_keeps_the_counter(self):
+        # Loaded before the notification arrives, as a profile form would be
+        stale = User.objects.get(pk=self.user.pk)
+        self.notify()
+        stale.first_name = 'Renamed'
+        stale.save()
+
+        self.assertEqual(self.unread(), 1)
+        self.assertEqual(User.objects.get(pk=self.user.pk).first_name, 'Renamed')
+
+    def test_create_and_bulk_create_count_unread_rows(self):
+        self.notify()
+        self.notify(is_read=True)
+        Notification.objects.bulk_create([
+            Notification(user=user, message='Hi', notification_type='SYSTEM')
+            for user in (self.user, self.user, self.other)
+        ])
+        self.assertEqual(self.unread(), 3)
+        self.assertEqual(self.unread(self.other), 1)
+
+    def test_read_state_changes_move_the_counter(self):
+        first = self.notify()
+        self.notify()
+        self.notify(user=self.other)
+        
+        first.is_read = True
+        first.save()
+        first.save()
+        self.assertEqual(self.unread(), 1)
+        
+        Notification.objects.filter(user=self.user).update(is_read=False)
+        self.assertEqual(self.unread(), 2)
+        Notification.objects.filter(user=self.user).update(is_read=True)
+        self.assertEqual(self.unread(), 0)
+        self.assertEqual(self.unread(self.other), 1)
+
+    def test_deletes_move_the_counter(self):
+        first = self.notify()
+        self.notify()
+        self.notify(is_read=True)
+        
+        first.delete()
+        self.assertEqual(self.unread(), 1)
+        Notification.objects.filter(user=self.user).delete()
+        self.assertEqual(self.unread(), 0)
+
+    def test_views_keep_the_counter(self):
+        first = self.notify()
+        self.notify()
+        self.client.login(username='reader', password='testpass')
+        
+        self.client.post(reverse('notifications:mark_read', kwargs={'pk': first.pk}))
+        self.assertEqual(self.unread(), 1)
+        response = self.client.get(reverse('notifications:list'))
+        self.assertEqual(response.context['unread_count'], 1)
+        self.assertEqual(response.context['unread_notification_count'], 1)
+        
+        self.client.post(reverse('notifications:mark_all_read'))
+        self.assertEqual(self.unread(), 0)
+
+    def test_badge_costs_no_query(self):
+        self.notify()
+        request = RequestFactory().get('/')
+        request.user = User.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(notification_count(request), {'unread_notification_count': 1})
+
+    def test_recount_repairs_drift(self):
+        self.notify()
+        User.objects.filter(pk=self.user.pk).update(unread_notifications=7)
+        Notification.recount_unread()
+        self.assertEqual(self.unread(), 1)
+        self.assertEqual(self.unread(self.other), 0)
+
+
+class KeysetPaginationTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='reader', email='reader@example.com', password='testpass')
+        Notification.objects.bulk_create([
+            Notification(user=self.user, message=f'Note {i}', notification_type='SYSTEM', is_read=i % 3 == 0)
+            for i in range(45)
+        ])
+        self.client.login(username='reader', password='testpass')
+
+    def page(self, **params):
+        response = self.client.get(reverse('notifications:list'), params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_walks_every_notification_once_newest_first(self):
+        expected = list(Notification.objects.filter(user=self.user).order_by('-created_at', '-id').values_list('id', flat=True))
+        seen, params, pages = [], {}, []
+        while True:
+            page_obj = self.page(**params).context['page_obj']
+            pages.append(page_obj)
+            seen.extend(notification.id for notification in page_obj)
+            if not page_obj.has_next():
+                break
+            params = {'after': page_obj.next_cursor}
+        
+        self.assertEqual(seen, expected)
+        self.assertEqual([len(page_obj) for page_obj in pages], [20, 20, 5])
+        self.assertFalse(pages[0].has_previous())
+        
+        # Going back from the last page gives the middle page again
+        back = self.page(before=pages[2].previous_cursor).context['page_obj']
+        self.assertEqual([n.id for n in back], [n.id for n in pages[1]])
+        self.assertTrue(back.has_next())
+
+    def test_unread_filter(self):
+        notifications = self.page(unread=1).context['notifications']
+        self.assertEqual(len(notifications), 20)
+        self.assertTrue(all(not notification.is_read for notification in notifications))
+
+    def test_deep_pages_cost_the_same_as_the_first(self):
+        with CaptureQueriesContext(connection) as first:
+            page_obj = self.page().context['page_obj']
+        cursor = self.page(after=page_obj.next_cursor).context['page_obj'].next_cursor
+        with CaptureQueriesContext(connection) as deep:
+            self.page(after=cursor)
+        self.assertEqual(len(first), len(deep))
+        self.assertNotIn('OFFSET', deep.captured_queries[-1]['sql'])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('notifications:list'), {'after': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+
+class NotificationArchiveTest(TestCase):
+    def setUp(self):
+        self.users = [User.objects.create(username=f'user{i}', email=f'user{i}@example.com') for i in range(3)]
+        for user in self.users:
+            Notification.objects.bulk_create([
+                Notification(user=user, message=f'Old news {i}', notification_type='TOURNAMENT', related_id=i, is_read=i < 8)
+                for i in range(10)
+            ])
+        Notification.objects.update(created_at=timezone.now() - timedelta(days=120))
+        # A recent read notification stays where it is
+        self.recent = Notification.objects.create(user=self.users[0], message='Fresh', notification_type='SYSTEM', is_read=True)
+
+    def test_moves_old_read_rows_in_batches(self):
+        archived, batches = archive_read_notifications(older_than=timedelta(days=90), batch_size=10)
+        
+        self.assertEqual((archived, batches), (24, 3))
+        self.assertEqual(Notification.objects.count(), 7)
+        self.assertFalse(Notification.objects.filter(is_read=True).exclude(pk=self.recent.pk).exists())
+        self.assertEqual(sum(NotificationArchive.objects.values_list('count', flat=True)), 24)
+        
+        restored = [n for archive in NotificationArchive.objects.filter(user=self.users[1]) for n in archive.notifications()]
+        self.assertEqual(sorted(n['message'] for n in restored), [f'Old news {i}' for i in range(8)])
+        self.assertEqual(restored[0]['notification_type'], 'TOURNAMENT')
+        # Unread counters are untouched, only read rows move
+        self.users[1].refresh_from_db()
+        self.assertEqual(self.users[1].unread_notifications, 2)
+
+    def test_limit_and_command(self):
+        self.assertEqual(archive_read_notifications(batch_size=5, limit=7), (7, 2))
+        out = StringIO()
+        call_command('archive_notifications', '--days', '90', '--pause', '0', stdout=out)
+        self.assertIn('17 notifications archived in 1 batches', out.getvalue())
+
+
+class StructuredKeysTest(TestCase):
+    def setUp(self):
+        self.organizer = User.objects.create_user(username='organizer', password='testpass', user_type='ADMIN')
+        self.tournament = Tournament.objects.create(
+            name='Namesake Open',
+            organizer=self.organizer,
+            start_date=timezone.now().date(),
+            end_date=timezone.now().date() + timedelta(days=5),
+            status='REGISTRATION'
+        )
+        # Two players who share a full name
+        self.players = [
+            User.objects.create(username=f'alex{i}', first_name='Alex', last_name='Smith', user_type='PLAYER')
+            for i in range(2)
+        ]
+        self.tournament.pending_registrations.add(*self.players)
+        
+        self.notifier = TournamentNotificationSubject()
+        self.notifier.attach(DatabaseNotifier())
+        for player in self.players:
+            self.notifier.player_registration_needs_approval(self.tournament, player)
+
+    def approvals(self):
+        return Notification.objects.filter(user=self.organizer, kind='registration_needs_approval', tournament=self.tournament)
+
+    def test_notifications_carry_their_references(self):
+        approval = self.approvals().get(subject_user=self.players[0])
+        self.assertTrue(approval.requires_action)
+        pending = Notification.objects.get(user=self.players[0])
+        self.assertEqual((pending.kind, pending.tournament, pending.subject_user), 
+                         ('registration_needs_approval', self.tournament, self.players[0]))
+
+    def test_approval_removes_only_that_players_request(self):
+        self.client.login(username='organizer', password='testpass')
+        url = reverse('tournaments:approve_registration', kwargs={'pk': self.tournament.pk})
+        
+        with patch('core.observers.EmailNotifier._send_email'), CaptureQueriesContext(connection) as queries:
+            self.client.post(url, {'player_id': self.players[0].pk, 'action': 'approve'})
+        
+        self.assertEqual(list(self.approvals().values_list('subject_user', flat=True)), [self.players[1].pk])
+        self.assertFalse([query for query in queries.captured_queries if 'LIKE' in query['sql']])
+        self.assertTrue(Notification.objects.filter(
+            user=self.players[0], kind='registration_approved', tournament=self.tournament
+        ).exists())
+
+    def test_digest_approval_goes_once_nobody_is_waiting(self):
+        self.approvals().update(subject_user=None)
+        self.client.login(username='organizer', password='testpass')
+        url = reverse('tournaments:approve_registration', kwargs={'pk': self.tournament.pk})
+        
+        self.client.post(url, {'player_id': self.players[0].pk, 'action': 'reject'})
+        self.assertEqual(self.approvals().count(), 2)
+        self.client.post(url, {'player_id': self.players[1].pk, 'action': 'reject'})
+        self.assertFalse(self.approvals().exists())
+
+
+class CompactMessageTest(TestCase):
+    def setUp(self):
+        self.organizer = User.objects.create_user(username='organizer', password='testpass')
+        self.tournament = Tournament.objects.create(
+            name='Summer Slam',
+            organizer=self.organizer,
+            start_date=timezone.now().date(),
+            end_date=timezone.now().date() + timedelta(days=5),
+            status='IN_PROGRESS'
+        )
+        self.player = User.objects.create_user(username='player', password='testpass', first_name='Ana', last_name='Ivanovic')
+        self.tournament.participants.add(self.player)
+        
+        self.notifier = TournamentNotificationSubject()
+        self.notifier.attach(DatabaseNotifier())
+
+    def test_list_renders_messages_from_keys(self):
+        self.notifier.tournament_status_changed(self.tournament)
+        self.notifier.player_registered(self.tournament, self.player)
+        # Rows written before message keys existed keep their text
+        Notification.objects.create(user=self.organizer, message='Welcome back', notification_type='SYSTEM')
+        
+        self.client.login(username='organizer', password='testpass')
+        response = self.client.get(reverse('notifications:list'))
+        
+        self.assertContains(response, "Tournament &#x27;Summer Slam&#x27; status changed to In Progress")
+        self.assertContains(response, "Ana Ivanovic has registered for tournament &#x27;Summer Slam&#x27;")
+        self.assertContains(response, 'Welcome back')
+
+    def test_unknown_key_falls_back_to_message(self):
+        notification = Notification(message='Plain text', message_key='retired', params={'tournament': 'x'})
+        self.assertEqual(notification.text, 'Plain text')
+
+    def test_archive_keeps_the_rendered_text(self):
+        self.notifier.tournament_status_changed(self.tournament)
+        Notification.objects.update(is_read=True, created_at=timezone.now() - timedelta(days=120))
+        
+        archive_read_notifications()
+        
+        archived = NotificationArchive.objects.get(user=self.player).notifications()
+        self.assertEqual(archived[0]['message'], "Tournament 'Summer Slam' status changed to In Progress")
+
+
+class NotificationWorkerPoolTest(TransactionTestCase):
+    def test_thread_pool_delivers_batch(self):
+        organizer = User.objects.create_user(username='organizer', password='testpass')
+        tournament = Tournament.objects.create(
+            name='Pooled Open',
+            organizer=organizer,
+            start_date=timezone.now().date(),
+            end_date=timezone.now().date() + timedelta(days=5)
+        )
+        notifier = TournamentNotificationSubject()
+        notifier.attach(OutboxNotifier())
+        for i in range(8):
+            notifier.player_registered(tournament, User.objects.create(username=f'player{i}'))
+        
+        # Each consumer runs on its own thread with its own connection
+        with patch('core.observers.EmailNotifier._send_email'):
+            results = dispatch_outbox(batch_size=8, workers=3)
+        
+        self.assertEqual({consumer: len(events) for consumer, events in results.items()}, {'email': 8, 'database': 8, 'digest': 8})
+        self.assertEqual(Notification.objects.count(), 16)
+
+    def test_email_goes_out_after_the_batch_commits(self):
+        organizer = User.objects.create_user(username='organizer', email='organizer@example.com', password='testpass')
+        tournament = Tournament.objects.create(
+            name='Slow Relay Open',
+            organizer=organizer,
+            start_date=timezone.now().date(),
+            end_date=timezone.now().date() + timedelta(days=5)
+        )
+        notifier = TournamentNotificationSubject()
+        notifier.attach(OutboxNotifier())
+        notifier.player_registered(tournament, User.objects.create(username='player', email='player@example.com'))
+        
+        # No transaction, and so no database write lock, is held while sending
+        sending = []
+        def deliver(messages):
+            sending.append((len(messages), connection.in_atomic_block, ConsumerCursor.objects.get(consumer='email').last_event_id))
+            return len(messages)
+        
+        with patch('core.observers.EmailNotifier._deliver', side_effect=deliver):
+            self.assertEqual(len(dispatch('email')), 1)
+        
+        self.assertEqual(sending, [(2, False, 0)])
+        cursor = ConsumerCursor.objects.get(consumer='email')
+        self.assertEqual((cursor.last_event_id, cursor.retry_at), (OutboxEvent.objects.get().pk, None))
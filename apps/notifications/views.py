@@ -1,23 +1,26 @@
 from django.views.generic import ListView, View
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.shortcuts import redirect, get_object_or_404
+from core.mixins import KeysetPaginationMixin
 from .models import Notification
 
-class NotificationListView(LoginRequiredMixin, ListView):
+class NotificationListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     model = Notification
     template_name = 'notifications/notification_list.html'
     context_object_name = 'notifications'
     paginate_by = 20
     
     def get_queryset(self):
-        return Notification.objects.filter(user=self.request.user).order_by('-created_at')
+        queryset = Notification.objects.filter(user=self.request.user)
+        # ?unread=1 shows only unread notifications
+        if self.request.GET.get('unread'):
+            queryset = queryset.filter(is_read=False)
+        return queryset
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['unread_count'] = Notification.objects.filter(
-            user=self.request.user, 
-            is_read=False
-        ).count()
+        context['unread_count'] = self.request.user.unread_notifications
+        context['unread_only'] = bool(self.request.GET.get('unread'))
         return context
 
 class MarkAsReadView(LoginRequiredMixin, View):
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tournaments', '0004_tournament_pending_registrations'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='tournament',
+            name='tournament_type',
+            field=models.CharField(choices=[('SINGLE_ELIMINATION', 'Single Elimination'), ('ROUND_ROBIN', 'Round Robin'), ('SWISS', 'Swiss System')], default='SINGLE_ELIMINATION', help_text='Format of the tournament', max_length=20),
+        ),
+    ]
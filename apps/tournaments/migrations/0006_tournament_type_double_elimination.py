@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tournaments', '0005_tournament_type_swiss'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='tournament',
+            name='tournament_type',
+            field=models.CharField(choices=[('SINGLE_ELIMINATION', 'Single Elimination'), ('ROUND_ROBIN', 'Round Robin'), ('SWISS', 'Swiss System'), ('DOUBLE_ELIMINATION', 'Double Elimination')], default='SINGLE_ELIMINATION', help_text='Format of the tournament', max_length=20),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:52
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tournaments', '0006_tournament_type_double_elimination'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Standing',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('played', models.PositiveIntegerField(default=0)),
+                ('wins', models.PositiveIntegerField(default=0)),
+                ('losses', models.PositiveIntegerField(default=0)),
+                ('sets_for', models.PositiveIntegerField(default=0)),
+                ('sets_against', models.PositiveIntegerField(default=0)),
+                ('games_for', models.PositiveIntegerField(default=0)),
+                ('games_against', models.PositiveIntegerField(default=0)),
+                ('rank', models.PositiveIntegerField(default=0)),
+                ('player', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='standings', to=settings.AUTH_USER_MODEL)),
+                ('tournament', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='standings', to='tournaments.tournament')),
+            ],
+            options={
+                'ordering': ['rank'],
+                'indexes': [models.Index(fields=['tournament', 'rank'], name='tournaments_tournam_99462d_idx')],
+                'constraints': [models.UniqueConstraint(fields=('tournament', 'player'), name='unique_standing_per_player')],
+            },
+        ),
+    ]
@@ -0,0 +1,89 @@
+from collections import Counter
+
+from django.db import migrations
+
+# Set columns on MatchScore when this migration was written
+SETS = 5
+
+
+def ratio(won, lost):
+    return won / (won + lost) if won + lost else 0.0
+
+
+def backfill_standings(apps, schema_editor):
+    # Round robins started before 0007 have no table rows, and rows added
+    # lazily since then only hold results entered after the upgrade. Rebuild
+    # every round-robin table from its decided scores instead. Rows are
+    # ranked as Standing.rerank does: wins, wins among players on the same
+    # number of wins, set ratio, game ratio, player id.
+    Tournament = apps.get_model('tournaments', 'Tournament')
+    Standing = apps.get_model('tournaments', 'Standing')
+    Match = apps.get_model('matches', 'Match')
+    MatchScore = apps.get_model('matches', 'MatchScore')
+
+    columns = [f'player{side}_set{i}' for side in (1, 2) for i in range(1, SETS + 1)]
+    for tournament in Tournament.objects.filter(tournament_type='ROUND_ROBIN').iterator():
+        # Everyone in the draw gets a row, whether they have played yet or not
+        player_ids = set(tournament.participants.values_list('id', flat=True))
+        for player1_id, player2_id in Match.objects.filter(tournament=tournament).values_list('player1_id', 'player2_id'):
+            player_ids.update((player1_id, player2_id))
+        player_ids.discard(None)
+        rows = {player_id: Standing(tournament=tournament, player_id=player_id) for player_id in sorted(player_ids)}
+        results = []
+
+        scores = MatchScore.objects.filter(
+            match__tournament=tournament,
+            match__player1__isnull=False,
+            match__player2__isnull=False,
+            winner__isnull=False
+        ).values_list('match__player1_id', 'match__player2_id', 'winner_id', *columns)
+        for player1_id, player2_id, winner_id, *games in scores:
+            # Only sets with both scores count, as in MatchScore.pack()
+            sets = [(p1, p2) for p1, p2 in zip(games[:SETS], games[SETS:]) if p1 is not None and p2 is not None]
+            player1_sets = sum(1 for p1, p2 in sets if p1 > p2)
+            player2_sets = sum(1 for p1, p2 in sets if p2 > p1)
+            for player_id, sets_for, sets_against, games_for, games_against in (
+                (player1_id, player1_sets, player2_sets, sum(p1 for p1, _ in sets), sum(p2 for _, p2 in sets)),
+                (player2_id, player2_sets, player1_sets, sum(p2 for _, p2 in sets), sum(p1 for p1, _ in sets)),
+            ):
+                row = rows[player_id]
+                row.played += 1
+                row.wins += int(player_id == winner_id)
+                row.losses += int(player_id != winner_id)
+                row.sets_for += sets_for
+                row.sets_against += sets_against
+                row.games_for += games_for
+                row.games_against += games_against
+            results.append((player1_id, player2_id, winner_id, games))
+
+        if not rows:
+            continue
+
+        tied_wins = Counter(
+            winner_id for player1_id, player2_id, winner_id, _ in results
+            if rows[player1_id].wins == rows[player2_id].wins
+        )
+        ranking = sorted(rows.values(), key=lambda row: (
+            -row.wins,
+            -tied_wins[row.player_id],
+            -ratio(row.sets_for, row.sets_against),
+            -ratio(row.games_for, row.games_against),
+            row.player_id
+        ))
+        for rank, row in enumerate(ranking, start=1):
+            row.rank = rank
+
+        Standing.objects.filter(tournament=tournament).delete()
+        Standing.objects.bulk_create(rows.values())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tournaments', '0008_tournament_version'),
+        ('matches', '0007_match_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_standings, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,12 @@
+from collections import Counter
+
 from django.db import models
+from django.db.models import F
 from apps.accounts.models import User
 from django.utils import timezone
+from core.models import ProtectedFieldsMixin
 
-class Tournament(models.Model):
+class Tournament(ProtectedFieldsMixin, models.Model):
     STATUS_CHOICES = [
         ('UPCOMING', 'Upcoming'),
         ('REGISTRATION', 'Registration Open'),
@@ -14,6 +18,8 @@ class Tournament(models.Model):
     TOURNAMENT_TYPE_CHOICES = [
         ('SINGLE_ELIMINATION', 'Single Elimination'),
         ('ROUND_ROBIN', 'Round Robin'),
+        ('SWISS', 'Swiss System'),
+        ('DOUBLE_ELIMINATION', 'Double Elimination'),
     ]
 
     name = models.CharField(max_length=100, blank=False, null=False)
@@ -38,10 +44,21 @@ class Tournament(models.Model):
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    
+    # Goes up by one whenever any of the tournament's matches change
+    version = models.PositiveIntegerField(default=0)
+
+    # The version only moves through bump_version()
+    protected_fields = ('version',)
 
     def __str__(self):
         return f'{self.name} - {self.start_date} to {self.end_date}'
 
+    @classmethod
+    def bump_version(cls, tournament_id):
+        """Mark the tournament's match list as changed, without reading the row first"""
+        cls.objects.filter(pk=tournament_id).update(version=F('version') + 1)
+
     def is_registration_open(self):
         if self.status != 'REGISTRATION':
             return False
@@ -54,8 +71,122 @@ class Tournament(models.Model):
                 self.participants.count() >= 2 and 
                 (not self.registration_deadline or timezone.now().date() > self.registration_deadline))
 
+    def can_pair_next_round(self):
+        """Swiss rounds are paired one at a time once the previous round is finished"""
+        return (self.tournament_type == 'SWISS' and
+                self.status == 'IN_PROGRESS' and
+                self.matches.exists() and
+                not self.matches.exclude(status__in=['COMPLETED', 'CANCELED']).exists())
+
     def get_tournament_format_display(self):
         for code, name in self.TOURNAMENT_TYPE_CHOICES:
             if code == self.tournament_type:
                 return name
-        return "Unknown Format"
\ No newline at end of file
+        return "Unknown Format"
+
+
+class Standing(models.Model):
+    """One row of a round-robin table, kept up to date as results come in
+
+    Rows are created when the matches are generated and then only adjusted
+    by the result being recorded, so reading the table never has to go back
+    to the individual match scores.
+    """
+    tournament = models.ForeignKey(Tournament, on_delete=models.CASCADE, related_name='standings')
+    player = models.ForeignKey(User, on_delete=models.CASCADE, related_name='standings')
+
+    played = models.PositiveIntegerField(default=0)
+    wins = models.PositiveIntegerField(default=0)
+    losses = models.PositiveIntegerField(default=0)
+    sets_for = models.PositiveIntegerField(default=0)
+    sets_against = models.PositiveIntegerField(default=0)
+    games_for = models.PositiveIntegerField(default=0)
+    games_against = models.PositiveIntegerField(default=0)
+    rank = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['rank']
+        constraints = [
+            models.UniqueConstraint(fields=['tournament', 'player'], name='unique_standing_per_player'),
+        ]
+        indexes = [
+            models.Index(fields=['tournament', 'rank']),
+        ]
+
+    def __str__(self):
+        return f"{self.rank}. {self.player.username} ({self.wins}-{self.losses})"
+
+    @classmethod
+    def apply_result(cls, tournament_id, winner_id, loser_id, winner_sets, loser_sets, winner_games, loser_games):
+        """Add one finished match to both players' rows"""
+        for player_id, won, sets_for, sets_against, games_for, games_against in (
+            (winner_id, True, winner_sets, loser_sets, winner_games, loser_games),
+            (loser_id, False, loser_sets, winner_sets, loser_games, winner_games),
+        ):
+            updated = cls.objects.filter(tournament_id=tournament_id, player_id=player_id).update(
+                played=F('played') + 1,
+                wins=F('wins') + int(won),
+                losses=F('losses') + int(not won),
+                sets_for=F('sets_for') + sets_for,
+                sets_against=F('sets_against') + sets_against,
+                games_for=F('games_for') + games_for,
+                games_against=F('games_against') + games_against
+            )
+            if not updated:
+                cls.objects.create(
+                    tournament_id=tournament_id,
+                    player_id=player_id,
+                    played=1,
+                    wins=int(won),
+                    losses=int(not won),
+                    sets_for=sets_for,
+                    sets_against=sets_against,
+                    games_for=games_for,
+                    games_against=games_against
+                )
+
+    @classmethod
+    def rerank(cls, tournament_id):
+        """Re-number the table with ``TiebreakEngine``
+
+        Wins, set and game totals are already on the rows. Only the
+        head-to-head rule needs match scores, and only those between players
+        on the same number of wins, so nothing is loaded while every win
+        count is different and never more than the tied groups' own matches.
+        """
+        from apps.matches.models import MatchScore
+        from core.tiebreaks import TiebreakEngine
+
+        standings = list(cls.objects.filter(tournament_id=tournament_id))
+        group_sizes = Counter(standing.wins for standing in standings)
+        tied = [standing.player_id for standing in standings if group_sizes[standing.wins] > 1]
+
+        head_to_head = []
+        if tied:
+            head_to_head = list(MatchScore.objects.filter(
+                match__tournament_id=tournament_id,
+                match__player1_id__in=tied,
+                match__player2_id__in=tied,
+                winner__isnull=False
+            ).values_list('match__player1_id', 'match__player2_id', 'winner_id'))
+
+        engine = TiebreakEngine.from_totals(
+            [standing.player_id for standing in standings],
+            [standing.wins for standing in standings],
+            [standing.sets_for for standing in standings],
+            [standing.sets_against for standing in standings],
+            [standing.games_for for standing in standings],
+            [standing.games_against for standing in standings],
+            [row[0] for row in head_to_head],
+            [row[1] for row in head_to_head],
+            [row[2] for row in head_to_head],
+        )
+        by_player = {standing.player_id: standing for standing in standings}
+        standings = [by_player[player_id] for player_id in engine.ranking()]
+
+        changed = []
+        for rank, standing in enumerate(standings, start=1):
+            if standing.rank != rank:
+                standing.rank = rank
+                changed.append(standing)
+        cls.objects.bulk_update(changed, ['rank'])
@@ -11,5 +11,8 @@ urlpatterns = [
     path('<int:pk>/register/', views.PlayerRegistrationView.as_view(), name='tournament_register'),
     path('<int:pk>/generate-matches/', views.GenerateMatchesView.as_view(), name='generate_matches'),
     path('<int:tournament_id>/matches/', views.TournamentMatchesView.as_view(), name='tournament_matches'),
+    path('<int:tournament_id>/standings/', views.TournamentStandingsView.as_view(), name='tournament_standings'),
+    path('<int:tournament_id>/stream/', views.TournamentStreamView.as_view(), name='tournament_stream'),
+    path('<int:tournament_id>/snapshot/', views.TournamentSnapshotView.as_view(), name='tournament_snapshot'),
     path('<int:pk>/approve-registration/', views.ApproveRegistrationView.as_view(), name='approve_registration'),
 ]
\ No newline at end of file
@@ -3,11 +3,16 @@ from django.views.generic import ListView, DetailView, CreateView, UpdateView, V
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.urls import reverse, reverse_lazy
 from django.contrib import messages
-from django.http import HttpResponseRedirect
+from django.http import HttpResponse, HttpResponseRedirect, Http404, StreamingHttpResponse
 from django.utils import timezone
+from django.db import transaction
+from django.conf import settings
+from django.core.mail import send_mail
+import logging
 import random
+from asgiref.sync import sync_to_async
 
-from .models import Tournament
+from .models import Tournament, Standing
 from apps.accounts.models import User
 from apps.matches.models import Match, MatchScore
 from .forms import TournamentForm
@@ -15,19 +20,16 @@ from .forms import TournamentForm
 from core.strategies.match_generator import (
     MatchGeneratorContext, 
     SingleEliminationStrategy,
-    RoundRobinStrategy
+    SeededSingleEliminationStrategy,
+    DoubleEliminationStrategy,
+    RoundRobinStrategy,
+    SwissStrategy
 )
-from core.observers import TournamentNotificationSubject, EmailNotifier, DatabaseNotifier
+from core.observers import event_bus
+from core.broadcast import event_stream, is_async_request, LongPollSnapshotView
 from core.mixins import PlayerRequiredMixin, RefereeRequiredMixin, OwnershipRequiredMixin
 
-# Set up the notification system
-tournament_notifier = TournamentNotificationSubject()
-email_observer = EmailNotifier()
-db_observer = DatabaseNotifier()
-
-# Register both observers
-tournament_notifier.attach(email_observer)
-tournament_notifier.attach(db_observer)
+logger = logging.getLogger(__name__)
 
 class AdminRequiredMixin:
     """Mixin to restrict views to admin users only"""
@@ -62,9 +64,10 @@ class TournamentCreateView(LoginRequiredMixin, AdminRequiredMixin, CreateView):
 
     def form_valid(self, form):
         form.instance.organizer = self.request.user
-        response = super().form_valid(form)
- 
-        tournament_notifier.tournament_created(self.object)
+        # The tournament and its outbox event commit together
+        with transaction.atomic():
+            response = super().form_valid(form)
+            event_bus.tournament_created(self.object)
 
         messages.success(self.request, "Tournament created successfully!")
         return response
@@ -142,12 +145,12 @@ class PlayerRegistrationView(LoginRequiredMixin, PlayerRequiredMixin, View):
             tournament.pending_registrations.remove(request.user)
             messages.success(request, "Your registration request has been withdrawn.")
         else:
-            # Add to pending registrations instead of directly to participants
-            tournament.pending_registrations.add(request.user)
+            # Add to pending registrations instead of directly to participants,
+            # and notify the organizer about the pending approval
+            with transaction.atomic():
+                tournament.pending_registrations.add(request.user)
+                event_bus.player_registration_needs_approval(tournament, request.user)
             messages.success(request, "Your registration request has been submitted and is pending approval.")
-            
-            # Notify tournament organizer about the pending approval
-            tournament_notifier.player_registration_needs_approval(tournament, request.user)
         
         return HttpResponseRedirect(reverse('tournaments:tournament_detail', kwargs={'pk': tournament.pk}))
 
@@ -155,18 +158,20 @@ class GenerateMatchesView(LoginRequiredMixin, AdminRequiredMixin, View):
     def post(self, request, *args, **kwargs):
         tournament = get_object_or_404(Tournament, pk=kwargs['pk'])
         
-        # Check if tournament can generate matches
-        if not tournament.can_generate_matches():
-            messages.error(request, "Cannot generate matches at this time.")
-            return HttpResponseRedirect(reverse('tournaments:tournament_detail', kwargs={'pk': tournament.pk}))
-        
-        # Check if matches already exist
-        if Match.objects.filter(tournament=tournament).exists():
-            messages.error(request, "Matches have already been generated for this tournament.")
-            return HttpResponseRedirect(reverse('tournaments:tournament_detail', kwargs={'pk': tournament.pk}))
+        # Later Swiss rounds are paired while the tournament is running
+        if not tournament.can_pair_next_round():
+            # Check if tournament can generate matches
+            if not tournament.can_generate_matches():
+                messages.error(request, "Cannot generate matches at this time.")
+                return HttpResponseRedirect(reverse('tournaments:tournament_detail', kwargs={'pk': tournament.pk}))
+            
+            # Check if matches already exist
+            if Match.objects.filter(tournament=tournament).exists():
+                messages.error(request, "Matches have already been generated for this tournament.")
+                return HttpResponseRedirect(reverse('tournaments:tournament_detail', kwargs={'pk': tournament.pk}))
         
-        # Get all players
-        players = list(tournament.participants.all())
+        # Strategies only need player ids, not full user rows
+        players = list(tournament.participants.values_list('id', flat=True))
         
         # Use strategy pattern to generate matches
         generator = MatchGeneratorContext()
@@ -174,18 +179,23 @@ class GenerateMatchesView(LoginRequiredMixin, AdminRequiredMixin, View):
         # Choose strategy based on tournament type or request parameter
         if tournament.tournament_type == 'ROUND_ROBIN':
             generator.set_strategy(RoundRobinStrategy())
+        elif tournament.tournament_type == 'SWISS':
+            generator.set_strategy(SwissStrategy())
+        elif tournament.tournament_type == 'DOUBLE_ELIMINATION':
+            generator.set_strategy(DoubleEliminationStrategy())
         else:
-            generator.set_strategy(SingleEliminationStrategy())
+            generator.set_strategy(SeededSingleEliminationStrategy())
             
-        # Generate matches
-        matches = generator.generate_tournament_matches(tournament, players)
+        # Every strategy reports how many matches it created
+        match_count = generator.generate_tournament_matches(tournament, players)
         
         # Update tournament status
         tournament.status = 'IN_PROGRESS'
         tournament.save()
+        Tournament.bump_version(tournament.pk)
         
         # Redirect to tournament detail page
-        messages.success(request, f"{len(matches)} matches have been generated successfully.")
+        messages.success(request, f"{match_count} matches have been generated successfully.")
         return HttpResponseRedirect(reverse('tournaments:tournament_detail', kwargs={'pk': tournament.pk}))
 
 class TournamentMatchesView(ListView):
@@ -194,22 +204,106 @@ class TournamentMatchesView(ListView):
     
     def get_queryset(self):
         self.tournament = get_object_or_404(Tournament, pk=self.kwargs['tournament_id'])
-        return Match.objects.filter(tournament=self.tournament).order_by('round_number', 'id')
+        return Match.objects.filter(tournament=self.tournament).select_related(
+            'player1', 'player2'
+        ).order_by(*Match.BRACKET_ORDER)
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['tournament'] = self.tournament
         
-        # Group matches by round
+        # Packed score lines for the whole page in one query
+        score_lines = MatchScore.lines_for(context['matches'])
+        
+        # Group matches by bracket and round, in the order they were read
         matches_by_round = {}
         for match in context['matches']:
-            if match.round_number not in matches_by_round:
-                matches_by_round[match.round_number] = []
-            matches_by_round[match.round_number].append(match)
+            match.score_line = score_lines.get(match.id)
+            key = (match.bracket, match.round_number)
+            if key not in matches_by_round:
+                matches_by_round[key] = []
+            matches_by_round[key].append(match)
         
-        context['matches_by_round'] = matches_by_round
+        # Only double elimination has more than one bracket to tell apart
+        show_bracket = len({bracket for bracket, _ in matches_by_round}) > 1
+        context['rounds'] = [
+            {
+                'title': f"{round_matches[0].get_bracket_display()} - Round {round_number}" if show_bracket else f"Round {round_number}",
+                'matches': round_matches,
+            }
+            for (bracket, round_number), round_matches in matches_by_round.items()
+        ]
+        return context
+    
+class TournamentStandingsView(ListView):
+    """Round-robin table, read straight from the maintained standings rows"""
+    template_name = 'tournaments/tournament_standings.html'
+    context_object_name = 'standings'
+    
+    def get_queryset(self):
+        self.tournament = get_object_or_404(Tournament, pk=self.kwargs['tournament_id'])
+        return Standing.objects.filter(tournament=self.tournament).select_related('player').order_by('rank')
+    
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['tournament'] = self.tournament
         return context
     
+class TournamentStreamView(View):
+    """Server-Sent Events stream of every score change in a tournament
+
+    All spectators of a tournament share the one ``tournament:<id>``
+    channel of the in-process broadcaster, so a recorded result is pushed
+    to all of them at once instead of each page polling for it. As with
+    ``MatchStreamView``, WSGI clients get a 204 and poll the snapshot.
+    """
+    async def get(self, request, *args, **kwargs):
+        if not is_async_request(request):
+            return HttpResponse(status=204)
+        if not await Tournament.objects.filter(pk=kwargs['tournament_id']).aexists():
+            raise Http404("Tournament not found")
+        
+        response = StreamingHttpResponse(
+            event_stream(f"tournament:{kwargs['tournament_id']}"),
+            content_type='text/event-stream'
+        )
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+    
+class TournamentSnapshotView(LongPollSnapshotView):
+    """Versioned JSON snapshot of a tournament's matches, see ``LongPollSnapshotView``
+
+    Much cheaper to poll than the matches page: one version lookup while
+    nothing has changed, and two plain queries when something has.
+    """
+    etag_prefix = 'tournament-'
+    
+    def get_channel(self):
+        return f"tournament:{self.kwargs['tournament_id']}"
+    
+    async def get_version(self):
+        version = await Tournament.objects.filter(
+            pk=self.kwargs['tournament_id']
+        ).values_list('version', flat=True).afirst()
+        if version is None:
+            raise Http404("Tournament not found")
+        return version
+    
+    async def get_snapshot(self):
+        version = await self.get_version()
+        matches = [
+            match async for match in Match.objects.filter(tournament_id=self.kwargs['tournament_id']).order_by(
+                'round_number', 'bracket_position', 'id'
+            ).values('id', 'round_number', 'bracket', 'bracket_position', 'status', 'player1_id', 'player2_id', 'version')
+        ]
+        score_lines = await sync_to_async(MatchScore.lines_for)([match['id'] for match in matches])
+        for match in matches:
+            score_line = score_lines.get(match['id'])
+            match['score'] = str(score_line) if score_line else ''
+            match['winner_side'] = score_line.winner_side if score_line else None
+        return version, {'tournament': self.kwargs['tournament_id'], 'version': version, 'matches': matches}
+    
 class UpdateTournamentStatusView(LoginRequiredMixin, View):
     def post(self, request, *args, **kwargs):
         tournament = get_object_or_404(Tournament, pk=kwargs['pk'])
@@ -219,12 +313,13 @@ class UpdateTournamentStatusView(LoginRequiredMixin, View):
         new_status = request.POST.get('status')
         
         if new_status and new_status in dict(Tournament.STATUS_CHOICES):
-            tournament.status = new_status
-            tournament.save()
-            
-            # Notify observers about the status change
-            if old_status != new_status:
-                tournament_notifier.tournament_status_changed(tournament)
+            with transaction.atomic():
+                tournament.status = new_status
+                tournament.save()
+                
+                # Notify observers about the status change
+                if old_status != new_status:
+                    event_bus.tournament_status_changed(tournament)
                 
             messages.success(request, "Tournament status updated successfully.")
         else:
@@ -254,22 +349,27 @@ class ApproveRegistrationView(LoginRequiredMixin, AdminRequiredMixin, View):
             player = User.objects.get(pk=player_id)
             
             if action == 'approve':
-                # Add player to tournament participants
-                tournament.participants.add(player)
-                # Add this after getting the player object
-                tournament.pending_registrations.remove(player)
-                
-                # Notify the player that their registration was approved
-                from apps.notifications.models import Notification
-                Notification.objects.create(
-                    user=player,
-                    message=f"Your registration for '{tournament.name}' has been approved",
-                    notification_type='TOURNAMENT',
-                    related_id=tournament.id
-                )
-                
-                # Send email notification
-                tournament_notifier.player_registered(tournament, player)
+                with transaction.atomic():
+                    # Add player to tournament participants
+                    tournament.participants.add(player)
+                    # Add this after getting the player object
+                    tournament.pending_registrations.remove(player)
+                    
+                    # Notify the player that their registration was approved
+                    from apps.notifications.models import Notification
+                    Notification.objects.create(
+                        user=player,
+                        message_key='approved',
+                        params={'tournament': tournament.name},
+                        notification_type='TOURNAMENT',
+                        related_id=tournament.id,
+                        kind='registration_approved',
+                        tournament=tournament,
+                        subject_user=player
+                    )
+                    
+                    # Send email notification
+                    event_bus.player_registered(tournament, player)
                 
                 messages.success(request, f"Registration for {player.get_full_name()} has been approved.")
                 
@@ -281,14 +381,19 @@ class ApproveRegistrationView(LoginRequiredMixin, AdminRequiredMixin, View):
                 # Notify the player that their registration was rejected
                 notify_player_of_rejection(tournament, player)
             
-            # Remove the approval notification for the organizer
+            # Remove the approval notification for the organizer, an indexed
+            # lookup on (user, kind, tournament, subject_user)
             from apps.notifications.models import Notification
-            Notification.objects.filter(
+            approvals = Notification.objects.filter(
                 user=tournament.organizer,
-                notification_type='REGISTRATION_APPROVAL',
-                related_id=tournament.id,
-                message__contains=player.get_full_name()
-            ).delete()
+                kind='registration_needs_approval',
+                tournament=tournament
+            )
+            approvals.filter(subject_user=player).delete()
+            # Digests (and rows from before subjects were recorded) cover
+            # several players, they go once nobody is waiting any more
+            if not tournament.pending_registrations.exists():
+                approvals.filter(subject_user__isnull=True).delete()
             
             # Fix: Replace is_ajax() with the modern way
             if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
@@ -310,13 +415,18 @@ class ApproveRegistrationView(LoginRequiredMixin, AdminRequiredMixin, View):
 
 def notify_player_of_rejection(tournament, player):
     """Notify player that their registration was rejected"""
+    from apps.notifications.models import Notification
     try:
         # Create a notification for the player
         Notification.objects.create(
             user=player,
-            title="Tournament Registration Rejected",
-            message=f"Your registration for {tournament.name} has been rejected.",
-            notification_type='REGISTRATION_REJECTED'
+            message_key='rejected',
+            params={'tournament': tournament.name},
+            notification_type='TOURNAMENT',
+            related_id=tournament.id,
+            kind='registration_rejected',
+            tournament=tournament,
+            subject_user=player
         )
         
         # Optionally send an email if player has an email address
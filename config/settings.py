@@ -85,11 +85,27 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        # SQLite ignores SELECT ... FOR UPDATE, so write transactions take the
+        # database lock when they begin instead, and waiting writers queue
+        # for up to `timeout` seconds rather than failing straight away
+        "OPTIONS": {
+            "transaction_mode": "IMMEDIATE",
+            "timeout": 20,
+        },
+        # The shared-cache in-memory test database fails concurrent writers
+        # with "table is locked" instead of honouring the timeout above
+        "TEST": {
+            "NAME": BASE_DIR / "test_db.sqlite3",
+        },
     }
 }
 
 SITE_URL = "http://127.0.0.1:8000"
 
+# Users with notification_digest set get registration events for their
+# tournaments as one summary per window (in seconds) instead of one each
+NOTIFICATION_DIGEST_WINDOW = 15 * 60
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -0,0 +1,187 @@
+"""In-process fan-out of live score updates to Server-Sent Events streams
+
+Score changes are published once per channel (``match:<id>`` and
+``tournament:<id>``). Every open stream on that channel receives them, with
+no polling and no external broker. Publishing is thread-safe. The
+synchronous views that record scores hand each event to the event loop
+that serves the streams, with one call per loop, however many spectators
+are connected.
+
+``LongPollSnapshotView`` serves the same changes to clients that cannot
+keep a stream open, as versioned JSON snapshots with ETags.
+"""
+import asyncio
+import json
+import threading
+from collections import defaultdict
+from contextlib import asynccontextmanager
+
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, HttpResponseNotModified
+from django.utils.http import parse_etags, quote_etag
+from django.views.generic import View
+
+
+class Broadcaster:
+    """Channel-based publish/subscribe for async listeners
+
+    Each listener gets a bounded queue. A listener that falls too far behind
+    loses its oldest updates rather than holding up everyone else, which
+    is fine for score updates, as each one carries the full current score.
+    """
+
+    def __init__(self, queue_size=32):
+        self.queue_size = queue_size
+        # channel -> event loop -> queues of the listeners running on that loop
+        self._listeners = defaultdict(lambda: defaultdict(set))
+        self._lock = threading.Lock()
+
+    @asynccontextmanager
+    async def subscribe(self, channel):
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._listeners[channel][loop].add(queue)
+        try:
+            yield queue
+        finally:
+            with self._lock:
+                loops = self._listeners[channel]
+                loops[loop].discard(queue)
+                if not loops[loop]:
+                    del loops[loop]
+                if not loops:
+                    del self._listeners[channel]
+
+    def listener_count(self, channel):
+        with self._lock:
+            return sum(len(queues) for queues in self._listeners.get(channel, {}).values())
+
+    def publish(self, channel, event):
+        """Send ``event`` to every listener on ``channel``, from any thread"""
+        with self._lock:
+            targets = [(loop, list(queues)) for loop, queues in self._listeners.get(channel, {}).items()]
+
+        for loop, queues in targets:
+            try:
+                loop.call_soon_threadsafe(_deliver, queues, event)
+            except RuntimeError:
+                # The loop has shut down, its listeners are gone with it
+                pass
+
+
+def _deliver(queues, event):
+    for queue in queues:
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(event)
+
+
+def format_event(event, name='score'):
+    return f"event: {name}\ndata: {json.dumps(event)}\n\n"
+
+
+async def event_stream(channel, initial=None, heartbeat=15, max_age=300):
+    """Async generator of SSE frames for a ``StreamingHttpResponse``
+
+    Starts with ``initial`` (the current state) when given, then relays
+    every published event. A comment line is sent every ``heartbeat``
+    seconds so idle connections are not dropped by proxies. The stream ends
+    after ``max_age`` seconds and the browser's EventSource reconnects, so
+    no request is held open indefinitely.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + max_age
+    async with broadcaster.subscribe(channel) as queue:
+        if initial is not None:
+            yield format_event(initial)
+        while (remaining := deadline - loop.time()) > 0:
+            try:
+                event = await asyncio.wait_for(queue.get(), min(heartbeat, remaining))
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            yield format_event(event)
+
+
+def is_async_request(request):
+    """Whether ``request`` is served under ASGI, where streams cost no worker thread"""
+    return isinstance(request, ASGIRequest)
+
+
+def match_event(match, score_line=None, live=None):
+    """Payload describing a match's current status and score"""
+    return {
+        'match': match.pk,
+        'tournament': match.tournament_id,
+        'version': match.version,
+        'status': match.status,
+        'player1': match.player1_id,
+        'player2': match.player2_id,
+        'score': str(score_line) if score_line else '',
+        'winner_side': score_line.winner_side if score_line else None,
+        'live': live,
+    }
+
+
+def publish_match(match, score_line=None, live=None):
+    """Push a match update to its own stream and its tournament's stream"""
+    event = match_event(match, score_line, live)
+    broadcaster.publish(f'match:{match.pk}', event)
+    broadcaster.publish(f'tournament:{match.tournament_id}', event)
+
+
+# One broadcaster per process, shared by every stream and publisher
+broadcaster = Broadcaster()
+
+
+class LongPollSnapshotView(View):
+    """JSON snapshot with a strong ETag, for clients that cannot keep a stream open
+
+    A request whose ``If-None-Match`` still matches gets a 304. With
+    ``?wait=<seconds>`` (up to ``max_wait``) it is instead held until a
+    change is published on the channel, then answered with the new
+    snapshot. Subclasses provide ``get_channel``, ``get_version`` and
+    ``get_snapshot``; the last two are coroutines, and ``get_version``
+    raises Http404 for unknown objects.
+    """
+    max_wait = 30
+    etag_prefix = ''
+
+    def make_etag(self, version):
+        return quote_etag(f'{self.etag_prefix}{self.kwargs_key()}-v{version}')
+
+    def kwargs_key(self):
+        return '-'.join(str(value) for value in self.kwargs.values())
+
+    def requested_wait(self):
+        try:
+            return max(0.0, min(float(self.request.GET.get('wait', 0)), self.max_wait))
+        except ValueError:
+            return 0.0
+
+    async def get(self, request, *args, **kwargs):
+        known = parse_etags(request.headers.get('If-None-Match', ''))
+
+        # Subscribe before reading the version so no change can slip in between
+        async with broadcaster.subscribe(self.get_channel()) as queue:
+            etag = self.make_etag(await self.get_version())
+            if etag in known:
+                loop = asyncio.get_running_loop()
+                deadline = loop.time() + self.requested_wait()
+                while etag in known and loop.time() < deadline:
+                    try:
+                        await asyncio.wait_for(queue.get(), deadline - loop.time())
+                    except asyncio.TimeoutError:
+                        break
+                    etag = self.make_etag(await self.get_version())
+                if etag in known:
+                    response = HttpResponseNotModified()
+                    response['ETag'] = etag
+                    return response
+
+        version, snapshot = await self.get_snapshot()
+        response = JsonResponse(snapshot)
+        response['ETag'] = self.make_etag(version)
+        response['Cache-Control'] = 'no-cache'
+        return response
@@ -1,7 +1,11 @@
+from datetime import datetime
 from django.contrib.auth.mixins import UserPassesTestMixin, LoginRequiredMixin
 from django.shortcuts import redirect
 from django.contrib import messages
+from django.db.models import Q
 from django.http import Http404
+from django.utils.encoding import force_str
+from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 
 class PlayerRequiredMixin(UserPassesTestMixin):
     """Mixin to restrict views to player users only"""
@@ -37,3 +41,72 @@ class OwnershipRequiredMixin(UserPassesTestMixin):
     def handle_no_permission(self):
         # Use 404 for privacy reasons instead of 403
         raise Http404("Resource not found")
+
+class KeysetPage:
+    """One page of a keyset-paginated list, with cursors to its neighbours"""
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+    
+    def has_next(self):
+        return self.next_cursor is not None
+    
+    def has_previous(self):
+        return self.previous_cursor is not None
+    
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+    
+    def __iter__(self):
+        return iter(self.object_list)
+    
+    def __len__(self):
+        return len(self.object_list)
+
+class KeysetPaginationMixin:
+    """Newest-first pagination of a ListView by ``(created_at, id)``
+    
+    Pages are fetched with ``?after=<cursor>`` (older) or ``?before=<cursor>``
+    (newer) instead of an OFFSET, so every page is one index range scan
+    however deep it is. Needs an index on the queryset's filter columns
+    followed by ``created_at`` and ``id``.
+    """
+    @staticmethod
+    def encode_cursor(obj):
+        return urlsafe_base64_encode(f'{obj.created_at.isoformat()}|{obj.pk}'.encode())
+    
+    @staticmethod
+    def decode_cursor(cursor):
+        try:
+            created_at, pk = force_str(urlsafe_base64_decode(cursor)).split('|')
+            return datetime.fromisoformat(created_at), int(pk)
+        except (TypeError, ValueError):
+            raise Http404("Invalid page cursor")
+    
+    def paginate_queryset(self, queryset, page_size):
+        after = self.request.GET.get('after')
+        before = self.request.GET.get('before')
+        
+        if before:
+            # Walk forwards from the cursor, then flip the rows back to newest first
+            created_at, pk = self.decode_cursor(before)
+            rows = list(queryset.filter(
+                Q(created_at__gt=created_at) | Q(created_at=created_at, pk__gt=pk)
+            ).order_by('created_at', 'pk')[:page_size + 1])
+            has_newer, rows = len(rows) > page_size, rows[:page_size][::-1]
+            has_older = True
+        else:
+            if after:
+                created_at, pk = self.decode_cursor(after)
+                queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk))
+            rows = list(queryset.order_by('-created_at', '-pk')[:page_size + 1])
+            has_older, rows = len(rows) > page_size, rows[:page_size]
+            has_newer = bool(after)
+        
+        page = KeysetPage(
+            rows,
+            next_cursor=self.encode_cursor(rows[-1]) if rows and has_older else None,
+            previous_cursor=self.encode_cursor(rows[0]) if rows and has_newer else None,
+        )
+        return None, page, rows, page.has_other_pages()
@@ -0,0 +1,18 @@
+class ProtectedFieldsMixin:
+    """Keeps full saves of existing rows off columns with their own write path
+
+    Columns listed in ``protected_fields`` only move through dedicated
+    queries (counters, version bumps). A ``save()`` without
+    ``update_fields`` on an existing row writes every other concrete field,
+    so an instance loaded earlier cannot write back a stale value. Inserts
+    and saves that name their fields are left alone.
+    """
+    protected_fields = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.protected_fields
+            ]
+        super().save(*args, **kwargs)
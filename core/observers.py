@@ -1,7 +1,41 @@
+import logging
+import threading
+import time
 from abc import ABC, abstractmethod
-from django.core.mail import send_mail
+from contextlib import contextmanager
+from functools import lru_cache
+from itertools import chain, islice
+from django.core.mail import EmailMessage, get_connection
 from django.conf import settings
-from django.template.loader import render_to_string
+from django.db import models
+from django.template.loader import get_template
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=None)
+def compiled_template(template_name):
+    """Load and compile an email template once per process"""
+    return get_template(template_name)
+
+
+def context_fingerprint(value):
+    """Hashable summary of a template context
+
+    Model instances count as their model and primary key, so two contexts
+    that refer to the same objects with the same flags fingerprint alike.
+    """
+    if isinstance(value, models.Model):
+        return (value._meta.label, value.pk)
+    if isinstance(value, dict):
+        return tuple(sorted((key, context_fingerprint(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple, set)):
+        return tuple(context_fingerprint(item) for item in value)
+    try:
+        hash(value)
+    except TypeError:
+        return repr(value)
+    return value
 
 class Observer(ABC):
     """Abstract observer interface"""
@@ -75,6 +109,13 @@ class TournamentNotificationSubject(Subject):
             match=match
         )
 
+    def match_results_recorded(self, matches):
+        """Notify observers about a batch of results entered together"""
+        self.notify(
+            event_type='match_results',
+            matches=matches
+        )
+
     def player_registration_needs_approval(self, tournament, player):
         """Notify observers when a player registration needs approval"""
         self.notify(
@@ -82,13 +123,63 @@ class TournamentNotificationSubject(Subject):
             tournament=tournament,
             player=player
         )
+    
+    def digest_ready(self, digest):
+        """Notify observers when a digest of held-back events is due"""
+        self.notify(
+            event_type='notification_digest',
+            digest=digest
+        )
 
 
 class EmailNotifier(Observer):
-    """Email notification observer"""
+    """Email notification observer
+    
+    The emails for one event (or one batch of results) are collected and
+    then delivered over a single SMTP connection, instead of opening a new
+    connection for every message. Within a batch each distinct template and
+    context is rendered only once.
+    """
+    
+    def __init__(self):
+        # Open batches are per thread, as the worker pool shares one notifier
+        self._batches = threading.local()
     
     def update(self, subject, **kwargs):
         """Process notification and send emails"""
+        with self.batch():
+            self._dispatch(**kwargs)
+    
+    @contextmanager
+    def batch(self):
+        """Collect every email sent inside the block, then deliver them together"""
+        messages = getattr(self._batches, 'messages', None)
+        if messages is not None:
+            # Nested in an open batch, which will deliver these too
+            yield messages
+            return
+        
+        self._batches.messages = messages = []
+        self._batches.renders = {}
+        try:
+            yield messages
+        finally:
+            self._batches.messages = None
+            self._batches.renders = None
+            self._deliver(messages)
+    
+    def _render(self, template_name, context):
+        """Render an email template, reusing the text of an identical render in this batch"""
+        renders = getattr(self._batches, 'renders', None)
+        if renders is None:
+            return compiled_template(template_name).render(context)
+        
+        key = (template_name, context_fingerprint(context))
+        if key not in renders:
+            renders[key] = compiled_template(template_name).render(context)
+        return renders[key]
+    
+    def _dispatch(self, **kwargs):
         event_type = kwargs.get('event_type')
         
         if event_type == 'tournament_status_change':
@@ -101,8 +192,13 @@ class EmailNotifier(Observer):
             self._notify_match_scheduled(kwargs.get('match'))
         elif event_type == 'match_result':
             self._notify_match_result(kwargs.get('match'))
+        elif event_type == 'match_results':
+            for match in kwargs.get('matches') or []:
+                self._notify_match_result(match)
         elif event_type == 'registration_needs_approval':
             self._notify_registration_needs_approval(kwargs.get('tournament'), kwargs.get('player'))
+        elif event_type == 'notification_digest':
+            self._notify_digest(kwargs.get('digest'))
     
     
     def _notify_tournament_status_change(self, tournament):
@@ -118,13 +214,13 @@ class EmailNotifier(Observer):
         
         # Email organizer
         if tournament.organizer and tournament.organizer.email:
-            organizer_message = render_to_string('emails/tournament_status_change_organizer.txt', context)
+            organizer_message = self._render('emails/tournament_status_change_organizer.txt', context)
             self._send_email(subject, organizer_message, [tournament.organizer.email])
         
         # Email participants
         participant_emails = list(tournament.participants.values_list('email', flat=True))
         if participant_emails:
-            participant_message = render_to_string('emails/tournament_status_change_participant.txt', context)
+            participant_message = self._render('emails/tournament_status_change_participant.txt', context)
             self._send_email(subject, participant_message, participant_emails)
     
     def _notify_tournament_created(self, tournament):
@@ -142,7 +238,7 @@ class EmailNotifier(Observer):
         from apps.accounts.models import User
         admin_emails = User.objects.filter(user_type='ADMIN').values_list('email', flat=True)
         if admin_emails:
-            message = render_to_string('emails/tournament_created.txt', context)
+            message = self._render('emails/tournament_created.txt', context)
             self._send_email(subject, message, list(admin_emails))
     
     def _notify_player_registered(self, tournament, player):
@@ -158,13 +254,13 @@ class EmailNotifier(Observer):
         }
         
         if player.email:
-            player_message = render_to_string('emails/player_registration_confirmation.txt', context)
+            player_message = self._render('emails/player_registration_confirmation.txt', context)
             self._send_email(subject, player_message, [player.email])
         
-        # Email organizer about new registration
-        if tournament.organizer and tournament.organizer.email:
+        # Email organizer about new registration, unless it goes in their digest
+        if tournament.organizer and tournament.organizer.email and not tournament.organizer.notification_digest:
             organizer_subject = f"New Player Registration: {tournament.name}"
-            organizer_message = render_to_string('emails/player_registration_organizer.txt', context)
+            organizer_message = self._render('emails/player_registration_organizer.txt', context)
             self._send_email(organizer_subject, organizer_message, [tournament.organizer.email])
     
     def _notify_match_scheduled(self, match):
@@ -186,12 +282,12 @@ class EmailNotifier(Observer):
             player_emails.append(match.player2.email)
             
         if player_emails:
-            player_message = render_to_string('emails/match_scheduled_players.txt', context)
+            player_message = self._render('emails/match_scheduled_players.txt', context)
             self._send_email(subject, player_message, player_emails)
         
         # Email referee if assigned
         if match.referee and match.referee.user and match.referee.user.email:
-            referee_message = render_to_string('emails/match_scheduled_referee.txt', context)
+            referee_message = self._render('emails/match_scheduled_referee.txt', context)
             self._send_email(subject, referee_message, [match.referee.user.email])
     
     def _notify_match_result(self, match):
@@ -211,33 +307,47 @@ class EmailNotifier(Observer):
             # Email to players
             if match.player1 and match.player1.email:
                 context['is_winner'] = (match.score.winner == match.player1)
-                player1_message = render_to_string('emails/match_result_player.txt', context)
+                player1_message = self._render('emails/match_result_player.txt', context)
                 self._send_email(subject, player1_message, [match.player1.email])
                 
             if match.player2 and match.player2.email:
                 context['is_winner'] = (match.score.winner == match.player2)
-                player2_message = render_to_string('emails/match_result_player.txt', context)
+                player2_message = self._render('emails/match_result_player.txt', context)
                 self._send_email(subject, player2_message, [match.player2.email])
             
             # Email tournament organizer
             if match.tournament.organizer and match.tournament.organizer.email:
-                organizer_message = render_to_string('emails/match_result_organizer.txt', context)
+                organizer_message = self._render('emails/match_result_organizer.txt', context)
                 self._send_email(subject, organizer_message, [match.tournament.organizer.email])
     
     def _send_email(self, subject, message, recipient_list):
-        """Helper method to send email"""
-        try:
-            send_mail(
-                subject=subject,
-                message=message,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=recipient_list,
-                fail_silently=True,
-            )
-        except Exception as e:
-            # Log the error but don't crash the application
-            import logging
-            logging.error(f"Failed to send email notification: {str(e)}")
+        """Helper method to send email, as part of the open batch if there is one"""
+        email = EmailMessage(subject, message, settings.DEFAULT_FROM_EMAIL, recipient_list)
+        messages = getattr(self._batches, 'messages', None)
+        if messages is not None:
+            messages.append(email)
+        else:
+            self._deliver([email])
+    
+    def _deliver(self, messages):
+        """Send ``messages`` over one connection and log the throughput
+
+        Failures are raised, not swallowed: the outbox dispatcher only moves
+        the email cursor past a batch once its messages have gone out.
+        """
+        if not messages:
+            return 0
+        
+        started = time.perf_counter()
+        connection = get_connection()
+        sent = connection.send_messages(messages) or 0
+        
+        elapsed = time.perf_counter() - started
+        logger.info(
+            "Sent %d of %d emails over one connection in %.0f ms (%.1f emails/s)",
+            sent, len(messages), elapsed * 1000, sent / elapsed if elapsed else 0
+        )
+        return sent
 
     def _notify_registration_needs_approval(self, tournament, player):
         """Notify organizer about a registration that needs approval"""
@@ -251,13 +361,69 @@ class EmailNotifier(Observer):
             'approval_url': f"{settings.SITE_URL}/tournaments/{tournament.id}/registrations/"
         }
         
-        if tournament.organizer.email:
-            message = render_to_string('emails/registration_approval_request.txt', context)
+        if tournament.organizer.email and not tournament.organizer.notification_digest:
+            message = self._render('emails/registration_approval_request.txt', context)
             self._send_email(subject, message, [tournament.organizer.email])
+    
+    def _notify_digest(self, digest):
+        """Send one summary email for a digest of held-back events"""
+        if not digest or not digest.user.email:
+            return
+        
+        subject = f"{len(digest.players)} new registrations: {digest.tournament.name}"
+        if digest.requires_action:
+            subject = f"Action Required: {len(digest.players)} registrations to approve for {digest.tournament.name}"
+        context = {
+            'digest': digest,
+            'tournament': digest.tournament,
+            'players': digest.players,
+            'approval_url': f"{settings.SITE_URL}/tournaments/{digest.tournament.id}/registrations/"
+        }
+        message = self._render('emails/notification_digest.txt', context)
+        self._send_email(subject, message, [digest.user.email])
+
+
+class OutboxNotifier(Observer):
+    """Records events in the notification outbox instead of delivering them
+
+    Only the event type, object ids and statuses are stored (see
+    ``apps.notifications.outbox``), in the caller's transaction, so the
+    event exists exactly when the change it describes was committed.
+    """
+    
+    def update(self, subject, **kwargs):
+        from apps.notifications.outbox import record
+        record(**kwargs)
+
+
+class DigestNotifier(Observer):
+    """Holds back registration events for organizers who receive digests
+    
+    The email and database notifiers skip these organizers, and the events
+    are delivered later as a ``notification_digest`` by ``flush_digests``.
+    """
+    
+    def update(self, subject, **kwargs):
+        from apps.notifications.digest import wants_digest, add_entry
+        
+        event_type = kwargs.get('event_type')
+        tournament = kwargs.get('tournament')
+        player = kwargs.get('player')
+        if tournament and player and wants_digest(tournament.organizer, event_type):
+            add_entry(tournament.organizer, event_type, tournament, player)
 
 
 class DatabaseNotifier(Observer):
-    """Stores notifications in the database for in-app notifications"""
+    """Stores notifications in the database for in-app notifications
+    
+    Recipients are collected as user ids and written with ``bulk_create``
+    in batches of ``batch_size``, so the number of statements does not grow
+    with the number of recipients. Rows store a message key and the few
+    values it needs rather than the formatted text, which
+    ``Notification.text`` builds when the notification is shown.
+    """
+    
+    batch_size = 1000
     
     def update(self, subject, **kwargs):
         """Store notification in database"""
@@ -269,23 +435,20 @@ class DatabaseNotifier(Observer):
         if event_type == 'tournament_status_change':
             tournament = kwargs.get('tournament')
             if tournament:
-                # Create notification for organizer
-                if tournament.organizer:
-                    Notification.objects.create(
-                        user=tournament.organizer,
-                        message=f"Tournament '{tournament.name}' status changed to {tournament.get_status_display()}",
-                        notification_type='TOURNAMENT',
-                        related_id=tournament.id
-                    )
+                # Organizer first, then the participants streamed in chunks
+                recipients = tournament.participants.values_list('id', flat=True).iterator(chunk_size=self.batch_size)
+                if tournament.organizer_id:
+                    recipients = chain([tournament.organizer_id], recipients)
                 
-                # Create notifications for participants
-                for player in tournament.participants.all():
-                    Notification.objects.create(
-                        user=player,
-                        message=f"Tournament '{tournament.name}' status changed to {tournament.get_status_display()}",
-                        notification_type='TOURNAMENT',
-                        related_id=tournament.id
-                    )
+                self._fan_out(
+                    recipients,
+                    message_key='status_changed',
+                    params={'tournament': tournament.name, 'status': tournament.get_status_display()},
+                    notification_type='TOURNAMENT',
+                    related_id=tournament.id,
+                    kind=event_type,
+                    tournament=tournament
+                )
         
         elif event_type == 'player_registered':
             tournament = kwargs.get('tournament')
@@ -293,93 +456,163 @@ class DatabaseNotifier(Observer):
             
             if tournament and player:
                 # Notify the player who registered
-                Notification.objects.create(
+                notifications = [Notification(
                     user=player,
-                    message=f"You have successfully registered for tournament '{tournament.name}'",
+                    message_key='registered',
+                    params={'tournament': tournament.name},
                     notification_type='TOURNAMENT',
-                    related_id=tournament.id
-                )
+                    related_id=tournament.id,
+                    kind=event_type,
+                    tournament=tournament,
+                    subject_user=player
+                )]
                 
-                # Notify the organizer
-                if tournament.organizer:
-                    Notification.objects.create(
-                        user=tournament.organizer,
-                        message=f"{player.get_full_name()} has registered for tournament '{tournament.name}'",
+                # Notify the organizer, unless it goes in their digest
+                if tournament.organizer_id and not tournament.organizer.notification_digest:
+                    notifications.append(Notification(
+                        user_id=tournament.organizer_id,
+                        message_key='player_registered',
+                        params={'tournament': tournament.name, 'player': player.get_full_name()},
                         notification_type='TOURNAMENT',
-                        related_id=tournament.id
-                    )
+                        related_id=tournament.id,
+                        kind=event_type,
+                        tournament=tournament,
+                        subject_user=player
+                    ))
+                Notification.objects.bulk_create(notifications)
         
         elif event_type == 'match_scheduled':
             match = kwargs.get('match')
             if match:
                 # Notify players
-                if match.player1:
-                    Notification.objects.create(
-                        user=match.player1,
-                        message=f"You have a match scheduled in '{match.tournament.name}'",
-                        notification_type='MATCH',
-                        related_id=match.id
-                    )
-                
-                if match.player2:
-                    Notification.objects.create(
-                        user=match.player2,
-                        message=f"You have a match scheduled in '{match.tournament.name}'",
-                        notification_type='MATCH',
-                        related_id=match.id
-                    )
-                
-                # Notify referee
-                if match.referee and match.referee.user:
-                    Notification.objects.create(
-                        user=match.referee.user,
-                        message=f"You are assigned to referee a match in '{match.tournament.name}'",
-                        notification_type='MATCH',
-                        related_id=match.id
-                    )
-        
-        elif event_type == 'match_result':
-            match = kwargs.get('match')
-            if match and hasattr(match, 'score') and match.score and match.score.winner:
-                winner = match.score.winner
-                loser = match.player2 if winner == match.player1 else match.player1
-                
-                # Notify winner
-                Notification.objects.create(
-                    user=winner,
-                    message=f"Congratulations! You won your match in '{match.tournament.name}'",
+                self._fan_out(
+                    [player_id for player_id in (match.player1_id, match.player2_id) if player_id],
+                    message_key='match_scheduled',
+                    params={'tournament': match.tournament.name},
                     notification_type='MATCH',
-                    related_id=match.id
+                    related_id=match.id,
+                    kind=event_type,
+                    tournament_id=match.tournament_id
                 )
                 
-                # Notify loser
-                if loser:
-                    Notification.objects.create(
-                        user=loser,
-                        message=f"Match result: You were defeated in '{match.tournament.name}'",
+                # Notify referee (referees are keyed by their user id)
+                if match.referee_id:
+                    self._fan_out(
+                        [match.referee_id],
+                        message_key='referee_assigned',
+                        params={'tournament': match.tournament.name},
                         notification_type='MATCH',
-                        related_id=match.id
+                        related_id=match.id,
+                        kind=event_type,
+                        tournament_id=match.tournament_id
                     )
         
+        elif event_type == 'match_result':
+            Notification.objects.bulk_create(self._match_result_notifications(kwargs.get('match')))
+        
+        elif event_type == 'match_results':
+            # A batch of results is written in batch_size inserts
+            notifications = []
+            for match in kwargs.get('matches') or []:
+                notifications.extend(self._match_result_notifications(match))
+            Notification.objects.bulk_create(notifications, batch_size=self.batch_size)
+        
         elif event_type == 'registration_needs_approval':
             tournament = kwargs.get('tournament')
             player = kwargs.get('player')
             
-            if tournament and player and tournament.organizer:
-                # Create notification for the organizer
-                Notification.objects.create(
-                    user=tournament.organizer,
-                    message=f"ACTION REQUIRED: {player.get_full_name()} has requested to join '{tournament.name}'",
-                    notification_type='REGISTRATION_APPROVAL',
-                    related_id=tournament.id,
-                    is_read=False,
-                    requires_action=True
-                )
-                
+            if tournament and player and tournament.organizer_id:
                 # Create a "pending approval" notification for the player
-                Notification.objects.create(
+                notifications = [Notification(
                     user=player,
-                    message=f"Your registration for '{tournament.name}' is pending approval",
+                    message_key='pending_approval',
+                    params={'tournament': tournament.name},
                     notification_type='TOURNAMENT',
-                    related_id=tournament.id
-                )
\ No newline at end of file
+                    related_id=tournament.id,
+                    kind=event_type,
+                    tournament=tournament,
+                    subject_user=player
+                )]
+                
+                # Create notification for the organizer, unless it goes in their digest
+                if not tournament.organizer.notification_digest:
+                    notifications.insert(0, Notification(
+                        user_id=tournament.organizer_id,
+                        message_key='approval_requested',
+                        params={'tournament': tournament.name, 'player': player.get_full_name()},
+                        notification_type='REGISTRATION_APPROVAL',
+                        related_id=tournament.id,
+                        is_read=False,
+                        requires_action=True,
+                        kind=event_type,
+                        tournament=tournament,
+                        subject_user=player
+                    ))
+                Notification.objects.bulk_create(notifications)
+        
+        elif event_type == 'notification_digest':
+            digest = kwargs.get('digest')
+            if digest:
+                Notification.objects.create(
+                    user=digest.user,
+                    message=digest.message[:255],
+                    notification_type='REGISTRATION_APPROVAL' if digest.requires_action else 'TOURNAMENT',
+                    related_id=digest.tournament.id,
+                    requires_action=digest.requires_action,
+                    # Covers several players, so there is no single subject
+                    kind=digest.event_type,
+                    tournament=digest.tournament
+                )
+    
+    def _fan_out(self, user_ids, **fields):
+        """Insert the same notification for every user id, ``batch_size`` rows per statement"""
+        from apps.notifications.models import Notification
+        
+        user_ids = iter(user_ids)
+        while True:
+            batch = [Notification(user_id=user_id, **fields) for user_id in islice(user_ids, self.batch_size)]
+            if not batch:
+                break
+            Notification.objects.bulk_create(batch)
+
+    def _match_result_notifications(self, match):
+        """Build (unsaved) winner and loser notifications for a match result"""
+        from apps.notifications.models import Notification
+        
+        if not match or not hasattr(match, 'score') or not match.score or not match.score.winner:
+            return []
+        
+        winner_id = match.score.winner_id
+        loser_id = match.player2_id if winner_id == match.player1_id else match.player1_id
+        
+        # Notify winner
+        notifications = [Notification(
+            user_id=winner_id,
+            message_key='match_won',
+            params={'tournament': match.tournament.name},
+            notification_type='MATCH',
+            related_id=match.id,
+            kind='match_result',
+            tournament_id=match.tournament_id,
+            subject_user_id=loser_id
+        )]
+        
+        # Notify loser
+        if loser_id:
+            notifications.append(Notification(
+                user_id=loser_id,
+                message_key='match_lost',
+                params={'tournament': match.tournament.name},
+                notification_type='MATCH',
+                related_id=match.id,
+                kind='match_result',
+                tournament_id=match.tournament_id,
+                subject_user_id=winner_id
+            ))
+        return notifications
+
+
+# The bus every view publishes on. Events go to the outbox inside the
+# caller's transaction and are delivered by the process_notifications worker.
+event_bus = TournamentNotificationSubject()
+event_bus.attach(OutboxNotifier())
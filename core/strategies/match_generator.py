@@ -1,64 +1,570 @@
+import math
 import random
 from abc import ABC, abstractmethod
-from apps.matches.models import Match
+from collections import deque
+from itertools import islice
+from django.db import transaction
+from apps.accounts.models import TennisPlayer
+from apps.matches.models import Match, MatchScore
+from apps.tournaments.models import Standing
 
 class MatchGenerationStrategy(ABC):
     @abstractmethod
     def generate_matches(self, tournament, players):
+        """Create the tournament's matches and return how many were created"""
         pass
 
 class SingleEliminationStrategy(MatchGenerationStrategy):
     def generate_matches(self, tournament, players):
+        # The whole bracket (byes and later-round slots included) is written
+        # up front, so every match knows where its winner goes
         players_list = list(players)
         random.shuffle(players_list)
+        return len(self.materialize(tournament, self.build_slots(players_list)))
 
-        import math
-        player_count = len(players_list)
-        rounds_needed = math.ceil(math.log2(player_count))
+    def build_slots(self, players_list):
+        """Lay players out over a power-of-two draw, one bye per first-round match at most"""
+        draw_size = 2 ** math.ceil(math.log2(len(players_list)))
+        byes = draw_size - len(players_list)
 
-        first_round_matches = 2 ** rounds_needed - player_count
+        slots = []
+        players_iter = iter(players_list)
+        for match_idx in range(draw_size // 2):
+            slots.append(next(players_iter))
+            slots.append(None if match_idx < byes else next(players_iter))
+        return slots
 
-        matches = []
-        round_number = 1
-        match_idx = 0
+    def materialize(self, tournament, slots):
+        """Build every match of the bracket in memory and write it in one transaction
 
-        while match_idx < first_round_matches:
-            player1 = players_list[match_idx * 2]
-            player2 = players_list[match_idx * 2 + 1]
+        ``slots`` holds the first-round draw in bracket order, with ``None``
+        marking a bye. Players may be given as ``User`` instances or ids.
+        Each match records its position in the round and the next-round slot
+        its winner moves to.
+        """
+        draw_size = len(slots)
+        rounds_needed = int(math.log2(draw_size))
 
-            match = Match.objects.create(
+        rounds = [[
+            Match(
                 tournament=tournament,
-                player1=player1,
-                player2=player2,
+                player1_id=_player_id(slots[match_idx * 2]),
+                player2_id=_player_id(slots[match_idx * 2 + 1]),
+                round_number=1,
+                bracket_position=match_idx,
+                status='COMPLETED' if slots[match_idx * 2 + 1] is None else 'SCHEDULED'
+            )
+            for match_idx in range(draw_size // 2)
+        ]]
+        for round_number in range(2, rounds_needed + 1):
+            rounds.append([
+                Match(
+                    tournament=tournament,
+                    round_number=round_number,
+                    bracket_position=match_idx,
+                    status='SCHEDULED'
+                )
+                for match_idx in range(len(rounds[-1]) // 2)
+            ])
+
+        # Match X of a round feeds slot X % 2 + 1 of match X // 2 in the next
+        routes = {}
+        for round_idx in range(rounds_needed - 1):
+            for match_idx, match in enumerate(rounds[round_idx]):
+                routes[id(match)] = {'winner': (rounds[round_idx + 1][match_idx // 2], match_idx % 2 + 1)}
+
+        all_matches = [match for round_matches in rounds for match in round_matches]
+        _write_bracket(all_matches, routes)
+        return all_matches
+
+class SeededSingleEliminationStrategy(SingleEliminationStrategy):
+    """Single elimination draw with ranked players placed at seeded positions
+
+    Players may be ``User`` instances or bare ids, so large draws can be fed
+    from ``values_list('id', flat=True)`` without loading user rows. Rankings
+    come from ``TennisPlayer.ranking`` in a single query; a ranking of 0 means
+    unranked and lower numbers are better.
+    """
+
+    def __init__(self, seed_count=None, random_seed=None):
+        self.seed_count = seed_count
+        self.rng = random.Random(random_seed)
+
+    def generate_matches(self, tournament, players):
+        player_ids = [_player_id(player) for player in players]
+        return len(self.materialize(tournament, self.seeded_slots(player_ids)))
+
+    def seeded_slots(self, player_ids):
+        """First-round draw in bracket order, ``None`` marking byes"""
+        draw_size = 2 ** math.ceil(math.log2(len(player_ids)))
+
+        rankings = dict(
+            TennisPlayer.objects.filter(user_id__in=player_ids, ranking__gt=0)
+            .values_list('user_id', 'ranking')
+        )
+        seed_count = self.seed_count if self.seed_count is not None else max(1, draw_size // 4)
+        ranked = sorted(rankings, key=lambda player_id: (rankings[player_id], player_id))
+        seeds = ranked[:seed_count]
+
+        seeded = set(seeds)
+        others = [player_id for player_id in player_ids if player_id not in seeded]
+        self.rng.shuffle(others)
+
+        # Seed number n sits at the n-th position of the draw order; numbers
+        # beyond the player count are byes, which lands them opposite the top seeds
+        by_seed_number = seeds + others
+        return [
+            by_seed_number[seed_number - 1] if seed_number <= len(by_seed_number) else None
+            for seed_number in seeding_order(draw_size)
+        ]
+
+class DoubleEliminationStrategy(SeededSingleEliminationStrategy):
+    """Seeded double elimination with winners/losers routing fixed up front
+
+    The whole graph is built in memory and written in one transaction: the
+    winners bracket, a losers bracket of 2(k-1) rounds for a 2^k draw, and a
+    grand final. Every match records the match and slot its winner and loser
+    move on to, so recording a result is a constant-time update (see
+    ``Match.advance``). Odd rounds of the losers bracket pair survivors with
+    each other. Even rounds take the losers dropping down from the winners
+    bracket, in reverse order to put off rematches. Losers-bracket matches
+    that byes would leave with one or no players are routed around, not
+    created. The grand final is a single match, with no bracket reset.
+    """
+
+    def materialize(self, tournament, slots):
+        draw_size = len(slots)
+        rounds_needed = int(math.log2(draw_size))
+
+        def new_match(bracket, round_number, bracket_position, player1_id=None, player2_id=None, status='SCHEDULED'):
+            return Match(
+                tournament=tournament,
+                bracket=bracket,
                 round_number=round_number,
-                status='SCHEDULED'
+                bracket_position=bracket_position,
+                player1_id=player1_id,
+                player2_id=player2_id,
+                status=status
             )
-            matches.append(match)
-            match_idx += 1
 
-        remaining_players = players_list[match_idx * 2:]
-        for player in remaining_players:
-            pass
+        winners = [[
+            new_match(
+                'WINNERS', 1, match_idx,
+                _player_id(slots[match_idx * 2]),
+                _player_id(slots[match_idx * 2 + 1]),
+                'COMPLETED' if slots[match_idx * 2 + 1] is None else 'SCHEDULED'
+            )
+            for match_idx in range(draw_size // 2)
+        ]]
+        for round_number in range(2, rounds_needed + 1):
+            winners.append([
+                new_match('WINNERS', round_number, match_idx)
+                for match_idx in range(len(winners[-1]) // 2)
+            ])
+
+        losers = [
+            [
+                new_match('LOSERS', round_number, match_idx)
+                for match_idx in range(draw_size // 2 ** ((round_number + 1) // 2 + 1))
+            ]
+            for round_number in range(1, 2 * (rounds_needed - 1) + 1)
+        ]
+        final = new_match('FINAL', rounds_needed + 1, 0)
+
+        # Unsaved model instances are unhashable, so the graph is keyed by id()
+        routes = {}
+        inputs = {}
+
+        def route(source, outcome, target, slot):
+            routes.setdefault(id(source), {})[outcome] = (target, slot)
+            inputs.setdefault(id(target), {})[slot] = (source, outcome)
+
+        for round_idx in range(rounds_needed - 1):
+            for match_idx, match in enumerate(winners[round_idx]):
+                route(match, 'winner', winners[round_idx + 1][match_idx // 2], match_idx % 2 + 1)
+        route(winners[-1][0], 'winner', final, 1)
 
-        return matches
+        if rounds_needed == 1:
+            route(winners[0][0], 'loser', final, 2)
+        else:
+            for match_idx, match in enumerate(winners[0]):
+                # A bye has no loser to drop down
+                if match.player2_id is not None:
+                    route(match, 'loser', losers[0][match_idx // 2], match_idx % 2 + 1)
+            for round_idx in range(1, rounds_needed):
+                drop_round = losers[2 * round_idx - 1]
+                for match_idx, match in enumerate(winners[round_idx]):
+                    route(match, 'loser', drop_round[len(drop_round) - 1 - match_idx], 2)
+            for round_idx, round_matches in enumerate(losers[:-1]):
+                for match_idx, match in enumerate(round_matches):
+                    if round_idx % 2 == 0:
+                        route(match, 'winner', losers[round_idx + 1][match_idx], 1)
+                    else:
+                        route(match, 'winner', losers[round_idx + 1][match_idx // 2], match_idx % 2 + 1)
+            route(losers[-1][0], 'winner', final, 2)
+
+        # Skip losers-bracket matches that byes leave short of two entrants,
+        # handing the surviving feed (if any) straight to the next match
+        kept_losers = []
+        for round_matches in losers:
+            for match in round_matches:
+                feeds = inputs.get(id(match), {})
+                if len(feeds) == 2:
+                    kept_losers.append(match)
+                    continue
+                target, slot = routes[id(match)]['winner']
+                del inputs[id(target)][slot]
+                for source, outcome in feeds.values():
+                    route(source, outcome, target, slot)
+
+        all_matches = [match for round_matches in winners for match in round_matches] + kept_losers + [final]
+        _write_bracket(all_matches, routes)
+        return all_matches
 
 class RoundRobinStrategy(MatchGenerationStrategy):
+    """Every player meets every other player once, spread over proper rounds
+
+    Pairings come from the circle method and are inserted in chunks of
+    ``batch_size`` as the generator produces them. A full schedule is
+    O(n²) matches, so only the current chunk is ever held in memory.
+    """
+
+    def __init__(self, batch_size=500):
+        self.batch_size = batch_size
+
     def generate_matches(self, tournament, players):
-        players_list = list(players)
-        matches = []
+        player_ids = [_player_id(player) for player in players]
+        pending = (
+            Match(
+                tournament=tournament,
+                player1_id=player1_id,
+                player2_id=player2_id,
+                round_number=round_number,
+                status='SCHEDULED'
+            )
+            for round_number, player1_id, player2_id in circle_pairings(player_ids)
+        )
 
-        for i, player1 in enumerate(players_list):
-            for player2 in players_list[i+1:]:
-                match = Match.objects.create(
-                    tournament=tournament,
-                    player1=player1,
-                    player2=player2,
-                    round_number=1,  
-                    status='SCHEDULED'
-                )
-                matches.append(match)
+        created = 0
+        with transaction.atomic():
+            # Every player starts on an empty line of the table
+            Standing.objects.bulk_create(
+                [Standing(tournament=tournament, player_id=player_id, rank=rank)
+                 for rank, player_id in enumerate(sorted(player_ids), start=1)],
+                ignore_conflicts=True
+            )
+            while True:
+                batch = list(islice(pending, self.batch_size))
+                if not batch:
+                    break
+                Match.objects.bulk_create(batch)
+                created += len(batch)
+
+        return created
+
+class SwissStrategy(MatchGenerationStrategy):
+    """Pairs the next Swiss round from the results recorded so far
+
+    Each call generates one round. Players are ordered by wins, then by
+    ranking, and paired with the closest-placed opponent they have not met.
+    With an odd field, the lowest-placed player without a bye yet gets one,
+    which counts as a win.
+    """
+
+    def generate_matches(self, tournament, players):
+        player_ids = [_player_id(player) for player in players]
+        wins = dict.fromkeys(player_ids, 0)
+        opponents = {player_id: set() for player_id in player_ids}
+        had_bye = set()
+        last_round = 0
+
+        history = Match.objects.filter(tournament=tournament).values_list(
+            'round_number', 'player1_id', 'player2_id', 'score__winner_id'
+        )
+        for round_number, player1_id, player2_id, winner_id in history:
+            last_round = max(last_round, round_number)
+            if player2_id is None:
+                had_bye.add(player1_id)
+            elif player1_id in opponents and player2_id in opponents:
+                opponents[player1_id].add(player2_id)
+                opponents[player2_id].add(player1_id)
+            if winner_id in wins:
+                wins[winner_id] += 1
+
+        rankings = dict(
+            TennisPlayer.objects.filter(user_id__in=player_ids, ranking__gt=0)
+            .values_list('user_id', 'ranking')
+        )
+        standings = sorted(player_ids, key=lambda player_id: (
+            -wins[player_id],
+            rankings.get(player_id) or math.inf,
+            player_id
+        ))
+
+        pairs, bye = pair_swiss_round(standings, opponents, had_bye)
+
+        round_number = last_round + 1
+        matches = [
+            Match(
+                tournament=tournament,
+                player1_id=player1_id,
+                player2_id=player2_id,
+                round_number=round_number,
+                status='SCHEDULED'
+            )
+            for player1_id, player2_id in pairs
+        ]
+        if bye is not None:
+            matches.append(Match(
+                tournament=tournament,
+                player1_id=bye,
+                round_number=round_number,
+                status='COMPLETED'
+            ))
+
+        with transaction.atomic():
+            Match.objects.bulk_create(matches)
+            if bye is not None:
+                MatchScore.objects.create(match=matches[-1], winner_id=bye)
+
+        return len(matches)
+
+def pair_swiss_round(standings, opponents, had_bye=()):
+    """Pair players listed best-first, avoiding rematches where possible
+
+    Returns ``(pairs, bye)``. Each player first takes the nearest player
+    below them they have not met, which settles most rounds on its own.
+    Players left over are fitted in with Edmonds' blossom algorithm, which
+    finds a chain of swaps that frees a partner for them whenever one
+    exists, trying the closest-placed players first so that only a few
+    pairs change. The result is a maximum rematch-free matching, found in
+    polynomial time whatever the history. When no rematch-free round
+    exists, the players still left are paired with each other in order,
+    which keeps rematches to the fewest possible.
+
+    The bye goes to the lowest-placed player without one whose absence still
+    lets the rest be paired without rematches, if there is such a player.
+    """
+    players = list(standings)
+    if len(players) % 2 == 0:
+        return _pair_field(players, opponents), None
+
+    candidates = [player for player in reversed(players) if player not in had_bye] or [players[-1]]
+    bye = candidates[0]
+    field = [player for player in players if player != bye]
+    mate = _match_field(field, opponents)
+    if -1 not in mate:
+        return _pairs(field, mate), bye
+
+    neighbours = _neighbours(players, opponents)
+    isolated = [player for index, player in enumerate(players) if next(neighbours(index), None) is None]
+    if len(isolated) == 1:
+        # Whoever has met everyone else can only avoid a rematch by sitting out
+        if isolated[0] in candidates:
+            bye = isolated[0]
+    elif not isolated:
+        # The players who can sit out are exactly those some maximum matching
+        # of the whole field leaves unmatched: the one it does leave out, and
+        # anyone an even-length chain of swaps reaches from them
+        mate = _match_field(players, opponents)
+        exposed = [index for index, partner in enumerate(mate) if partner == -1]
+        if len(exposed) == 1:
+            _, reached = _augment(exposed[0], mate, neighbours)
+            can_sit_out = {player for player, even in zip(players, reached) if even}
+            bye = next((player for player in candidates if player in can_sit_out), bye)
+    return _pair_field([player for player in players if player != bye], opponents), bye
+
+def _pair_field(field, opponents):
+    return _pairs(field, _match_field(field, opponents))
+
+def _pairs(field, mate):
+    """``(higher, lower)`` pairs from a matching, best-placed first
+
+    Anyone left unmatched has met everyone still free, so they are paired
+    with each other in standings order.
+    """
+    pairs = [(field[index], field[partner]) for index, partner in enumerate(mate) if index < partner]
+    left = [field[index] for index, partner in enumerate(mate) if partner == -1]
+    pairs.extend(zip(left[::2], left[1::2]))
+    return pairs
+
+def _neighbours(field, opponents):
+    """Indexes of the players each player may meet, nearest-placed first"""
+    played = [opponents.get(player, ()) for player in field]
+    size = len(field)
+
+    def neighbours(index):
+        for distance in range(1, size):
+            for other in (index - distance, index + distance):
+                if 0 <= other < size and field[other] not in played[index]:
+                    yield other
+    return neighbours
+
+def _match_field(field, opponents):
+    """Maximum rematch-free matching of ``field`` as a list of partner indexes (-1 for none)"""
+    neighbours = _neighbours(field, opponents)
+    mate = [-1] * len(field)
+    for index, player in enumerate(field):
+        if mate[index] != -1:
+            continue
+        played = opponents.get(player, ())
+        for other in range(index + 1, len(field)):
+            if mate[other] == -1 and field[other] not in played:
+                mate[index], mate[other] = other, index
+                break
+
+    # A player no chain of swaps can reach now never will be later, so one
+    # search per player left over is enough. Everyone a failed search
+    # reached is out of the running too and is not searched again.
+    done = [False] * len(field)
+    for index in range(len(field)):
+        if mate[index] == -1:
+            found, reached = _augment(index, mate, neighbours, done)
+            if not found:
+                # The tree is the even players and their partners
+                for other, even in enumerate(reached):
+                    if even:
+                        done[other] = True
+                        if mate[other] != -1:
+                            done[mate[other]] = True
+    return mate
+
+def _augment(root, mate, neighbours, done=None):
+    """One search of Edmonds' blossom algorithm from the unmatched ``root``
+
+    Grows a tree of alternating paths, shrinking odd cycles (blossoms) to
+    their base, until it reaches another unmatched player; ``mate`` is then
+    updated along the path. Players marked in ``done`` are left out.
+    Returns ``(found, even)``, where ``even`` marks the players reached by
+    an even-length alternating path from ``root``.
+    """
+    size = len(mate)
+    done = done or [False] * size
+    base = list(range(size))
+    parent = [-1] * size
+    even = [False] * size
+    even[root] = True
+    queue = deque([root])
+
+    def common_base(a, b):
+        seen = [False] * size
+        while True:
+            a = base[a]
+            seen[a] = True
+            if mate[a] == -1:
+                break
+            a = parent[mate[a]]
+        while True:
+            b = base[b]
+            if seen[b]:
+                return b
+            b = parent[mate[b]]
+
+    def mark_path(vertex, stop, child, blossom):
+        while base[vertex] != stop:
+            blossom[base[vertex]] = blossom[base[mate[vertex]]] = True
+            parent[vertex] = child
+            child = mate[vertex]
+            vertex = parent[mate[vertex]]
+
+    while queue:
+        vertex = queue.popleft()
+        for other in neighbours(vertex):
+            if done[other] or base[vertex] == base[other] or mate[vertex] == other:
+                continue
+            if other == root or (mate[other] != -1 and parent[mate[other]] != -1):
+                # An odd cycle: shrink it to its base and keep searching
+                stop = common_base(vertex, other)
+                blossom = [False] * size
+                mark_path(vertex, stop, other, blossom)
+                mark_path(other, stop, vertex, blossom)
+                for index in range(size):
+                    if blossom[base[index]]:
+                        base[index] = stop
+                        if not even[index]:
+                            even[index] = True
+                            queue.append(index)
+            elif parent[other] == -1:
+                parent[other] = vertex
+                if mate[other] == -1:
+                    # Flip every pair along the path back to the root
+                    while other != -1:
+                        previous = mate[parent[other]]
+                        mate[other], mate[parent[other]] = parent[other], other
+                        other = previous
+                    return True, even
+                even[mate[other]] = True
+                queue.append(mate[other])
+    return False, even
+
+def circle_pairings(player_ids):
+    """Yield ``(round_number, player1_id, player2_id)`` for a full round robin
+
+    One player stays fixed while the rest rotate one position per round,
+    giving n-1 rounds (n with an odd field, where the odd player out sits
+    the round) in which nobody plays twice. The fixed player alternates
+    sides so player1/player2 stay balanced, as in Berger tables.
+    """
+    lineup = list(player_ids)
+    if len(lineup) % 2:
+        lineup.append(None)
+    size = len(lineup)
+
+    fixed, rotating = lineup[0], deque(lineup[1:])
+    for round_idx in range(size - 1):
+        current = [fixed] + list(rotating)
+        for i in range(size // 2):
+            player1_id, player2_id = current[i], current[size - 1 - i]
+            if player1_id is None or player2_id is None:
+                continue
+            if i == 0 and round_idx % 2:
+                player1_id, player2_id = player2_id, player1_id
+            yield round_idx + 1, player1_id, player2_id
+        rotating.rotate(1)
+
+def seeding_order(draw_size):
+    """Seed numbers in bracket order, e.g. [1, 8, 4, 5, 2, 7, 3, 6] for 8
+
+    Each doubling pairs seed ``s`` with ``2 * len + 1 - s``, so the top two
+    seeds can only meet in the final, the top four in the semifinals, and so on.
+    """
+    order = [1]
+    while len(order) < draw_size:
+        mirror = 2 * len(order) + 1
+        order = [seed for top in order for seed in (top, mirror - top)]
+    return order
+
+def _write_bracket(matches, routes):
+    """Insert a bracket and link each match to the slots it feeds, in one transaction
+
+    ``routes`` maps ``id(match)`` to ``{'winner'|'loser': (target, slot)}``.
+    First-round byes are completed on the spot and their player is placed
+    in the next match. The whole write is a handful of statements rather
+    than one per match.
+    """
+    byes = [match for match in matches if match.status == 'COMPLETED']
+    for bye in byes:
+        target, slot = routes[id(bye)]['winner']
+        setattr(target, f'player{slot}_id', bye.player1_id)
+
+    with transaction.atomic():
+        Match.objects.bulk_create(matches)
+        for match in matches:
+            for outcome, (target, slot) in routes.get(id(match), {}).items():
+                setattr(match, f'{outcome}_next_match_id', target.pk)
+                setattr(match, f'{outcome}_next_slot', slot)
+        Match.objects.bulk_update(matches, [
+            'winner_next_match', 'winner_next_slot', 'loser_next_match', 'loser_next_slot'
+        ])
+        MatchScore.objects.bulk_create([
+            MatchScore(match=bye, winner_id=bye.player1_id, winner_side=1) for bye in byes
+        ])
 
-        return matches
+def _player_id(player):
+    """Accept either a ``User`` instance or a bare primary key"""
+    if player is None or isinstance(player, int):
+        return player
+    return player.pk
 
 class MatchGeneratorContext:
     def __init__(self, strategy=None):
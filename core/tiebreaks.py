@@ -0,0 +1,116 @@
+import numpy as np
+
+SETS = 5
+
+
+class TiebreakEngine:
+    """Orders a round-robin table, breaking ties the way tennis groups do
+
+    Players are ranked by:
+
+    1. matches won
+    2. matches won against the other players on the same number of wins
+       (head-to-head for a two-way tie, a mini-table for a multi-way one)
+    3. percentage of sets won
+    4. percentage of games won
+    5. player id, so the order is always the same for the same results
+
+    All results are held as NumPy arrays with one row per match, so each
+    rule is a handful of array operations instead of a loop over scores.
+    """
+
+    def __init__(self, player_ids, player1_ids, player2_ids, player1_games, player2_games, winner_ids):
+        self._load(player_ids, player1_ids, player2_ids, winner_ids)
+        # Unplayed sets arrive as NaN and count for nobody
+        player1_games = np.asarray(player1_games, dtype=np.float64).reshape(-1, SETS)
+        player2_games = np.asarray(player2_games, dtype=np.float64).reshape(-1, SETS)
+
+        self.wins = self._count(self.winner)
+
+        player1_sets = np.sum(player1_games > player2_games, axis=1)
+        player2_sets = np.sum(player2_games > player1_games, axis=1)
+        self.sets_won = self._count(self.player1, player1_sets) + self._count(self.player2, player2_sets)
+        self.sets_lost = self._count(self.player1, player2_sets) + self._count(self.player2, player1_sets)
+
+        player1_total = np.nansum(player1_games, axis=1)
+        player2_total = np.nansum(player2_games, axis=1)
+        self.games_won = self._count(self.player1, player1_total) + self._count(self.player2, player2_total)
+        self.games_lost = self._count(self.player1, player2_total) + self._count(self.player2, player1_total)
+
+    @classmethod
+    def from_totals(cls, player_ids, wins, sets_won, sets_lost, games_won, games_lost,
+                    player1_ids, player2_ids, winner_ids):
+        """Engine for a table whose per-player totals are already counted
+
+        Only the head-to-head rule still needs matches, and only those
+        between players on the same number of wins, so the decided matches
+        of the tied groups are all that has to be passed in.
+        """
+        engine = cls.__new__(cls)
+        engine._load(player_ids, player1_ids, player2_ids, winner_ids)
+        engine.wins = np.asarray(wins, dtype=np.float64)
+        engine.sets_won = np.asarray(sets_won, dtype=np.float64)
+        engine.sets_lost = np.asarray(sets_lost, dtype=np.float64)
+        engine.games_won = np.asarray(games_won, dtype=np.float64)
+        engine.games_lost = np.asarray(games_lost, dtype=np.float64)
+        return engine
+
+    def _load(self, player_ids, player1_ids, player2_ids, winner_ids):
+        self.player_ids = np.asarray(player_ids, dtype=np.int64)
+        order = np.argsort(self.player_ids)
+        sorted_ids = self.player_ids[order]
+
+        def index(ids):
+            ids = np.asarray(ids, dtype=np.int64)
+            return order[np.searchsorted(sorted_ids, ids)] if ids.size else ids
+
+        self.player1 = index(player1_ids)
+        self.player2 = index(player2_ids)
+        self.winner = index(winner_ids)
+
+    @classmethod
+    def for_tournament(cls, tournament_id, player_ids):
+        """Load every decided match of one tournament in a single query"""
+        from apps.matches.models import MatchScore
+
+        columns = [f'player1_set{i}' for i in range(1, SETS + 1)] + [f'player2_set{i}' for i in range(1, SETS + 1)]
+        rows = list(MatchScore.objects.filter(
+            match__tournament_id=tournament_id,
+            match__player2__isnull=False,
+            winner__isnull=False
+        ).values_list('match__player1_id', 'match__player2_id', 'winner_id', *columns))
+
+        if not rows:
+            empty = np.empty((0, SETS))
+            return cls(player_ids, [], [], empty, empty, [])
+
+        players = np.array([row[:3] for row in rows], dtype=np.int64)
+        games = np.array([row[3:] for row in rows], dtype=np.float64)
+        return cls(player_ids, players[:, 0], players[:, 1], games[:, :SETS], games[:, SETS:], players[:, 2])
+
+    def _count(self, indices, weights=None):
+        return np.bincount(indices, weights=weights, minlength=len(self.player_ids))
+
+    def _ratio(self, won, lost):
+        total = won + lost
+        return np.divide(won, total, out=np.zeros_like(won, dtype=np.float64), where=total > 0)
+
+    def keys(self):
+        """Per-player sort keys as (wins, tied wins, set ratio, game ratio)"""
+        # Only matches between players on the same number of wins count here
+        tied = self.wins[self.player1] == self.wins[self.player2]
+        tied_wins = self._count(self.winner[tied])
+
+        return (
+            self.wins,
+            tied_wins,
+            self._ratio(self.sets_won, self.sets_lost),
+            self._ratio(self.games_won, self.games_lost),
+        )
+
+    def ranking(self):
+        """Player ids from first place to last"""
+        wins, tied_wins, set_ratio, game_ratio = self.keys()
+        # lexsort uses the last key first; everything but the id sorts descending
+        order = np.lexsort((self.player_ids, -game_ratio, -set_ratio, -tied_wins, -wins))
+        return self.player_ids[order].tolist()
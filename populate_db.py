@@ -305,6 +305,17 @@ def create_matches_and_scores(tournaments, users):
     )
     
     print("Created matches and scores for all tournaments")
+def link_rounds(*rounds):
+    # Record each match's place in its round and the next-round slot its
+    # winner moves to, as the bracket generators do
+    for round_idx, round_matches in enumerate(rounds):
+        for position, match in enumerate(round_matches):
+            match.bracket_position = position
+            if round_idx + 1 < len(rounds):
+                match.winner_next_match = rounds[round_idx + 1][position // 2]
+                match.winner_next_slot = position % 2 + 1
+            match.save(update_fields=['bracket_position', 'winner_next_match', 'winner_next_slot'])
+
 # Update this function
 def create_completed_tournament_matches(tournament, players, referees, base_date):
     # Create Round 1 matches (quarterfinals)
@@ -438,6 +449,8 @@ def create_completed_tournament_matches(tournament, players, referees, base_date
                 winner=final_match.player2
             )
 
+        link_rounds(round1_matches, round2_matches, [final_match])
+
 # Also update this function
 def create_in_progress_tournament_matches(tournament, players, referees, base_date):
     # Create Round 1 matches (all completed)
@@ -532,6 +545,14 @@ def create_in_progress_tournament_matches(tournament, players, referees, base_da
             
             round2_matches.append(match)
 
+    # The final waits for both semifinal winners
+    final_match = Match.objects.create(
+        tournament=tournament,
+        round_number=3,
+        status='SCHEDULED'
+    )
+    link_rounds(round1_matches, round2_matches, [final_match])
+
 def run():
     print("Starting database population...")
     